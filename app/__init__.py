@@ -1,12 +1,15 @@
-from flask import Flask, request, url_for
-from datetime import datetime
+from flask import Flask, request
+from flask_login import current_user
 
 from app.config import CONFIG_BY_NAME
 from app.extensions import db, login_manager, migrate
 
 
 def create_app(env_name: str = "development") -> Flask:
+    from app.utils.storage import UploadRequest
+
     app = Flask(__name__, template_folder="templates", static_folder="static")
+    app.request_class = UploadRequest
 
     config_cls = CONFIG_BY_NAME.get(env_name, CONFIG_BY_NAME["development"])
     app.config.from_object(config_cls)
@@ -16,11 +19,32 @@ def create_app(env_name: str = "development") -> Flask:
     login_manager.init_app(app)
 
     from app import models  # noqa: F401
-    from app.models import User
+    from app.utils.audit import audit_writer
+    from app.utils.change_feed import change_feed
+    from app.utils.counters import counters
+    from app.utils.emergency_cards import emergency_cards
+    from app.utils import loading, query_stats
+    from app.utils.identity import load_identity
+    from app.utils.pagination import page_url
+    from app.utils.prescription_lifecycle import delivery_options, fulfillment_options
+    from app.utils.previews import previews
+    from app.utils.storage import storage
+
+    audit_writer.init_app(app)
+    storage.init_app(app)
+    previews.init_app(app)
+    change_feed.init_app(app)
+    counters.init_app(app)
+    emergency_cards.init_app(app)
+    loading.init_app(app)
+    query_stats.init_app(app)
+    app.add_template_global(page_url)
+    app.add_template_global(fulfillment_options)
+    app.add_template_global(delivery_options)
 
     @login_manager.user_loader
     def load_user(user_id: str):
-        return User.query.get(int(user_id))
+        return load_identity(int(user_id))
 
     from app.blueprints.auth.routes import auth_bp
     from app.blueprints.patient.routes import patient_bp
@@ -36,55 +60,22 @@ def create_app(env_name: str = "development") -> Flask:
     app.register_blueprint(pharmacy_bp, url_prefix="/pharmacy")
     app.register_blueprint(emergency_bp, url_prefix="/emergency")
 
+    from app.utils.page_meta import current_date_label, page_meta, register_pages
+
+    register_pages(page_meta)
+
     @app.context_processor
     def inject_page_meta():
         endpoint = request.endpoint or ""
-        role = getattr(request, "current_user", None)
-        role_name = ""
-        try:
-            from flask_login import current_user
-
-            role_name = current_user.role if current_user.is_authenticated else ""
-        except Exception:
-            role_name = ""
-
-        mappings = {
-            "patient": {
-                "patient.dashboard": ("Dashboard", [("Home", url_for("patient.dashboard")), ("Dashboard", None)]),
-                "patient.profile": ("Profile", [("Home", url_for("patient.dashboard")), ("Profile", None)]),
-                "patient.doctors": ("Doctors", [("Home", url_for("patient.dashboard")), ("Doctors", None)]),
-                "patient.doctor_detail": ("Doctor profile", [("Home", url_for("patient.dashboard")), ("Doctors", url_for("patient.doctors")), ("Doctor profile", None)]),
-                "patient.records": ("Records", [("Home", url_for("patient.dashboard")), ("Records", None)]),
-                "patient.history": ("History", [("Home", url_for("patient.dashboard")), ("History", None)]),
-                "patient.activity": ("Activity", [("Home", url_for("patient.dashboard")), ("Activity", None)]),
-                "patient.appointments": ("Appointments", [("Home", url_for("patient.dashboard")), ("Appointments", None)]),
-                "patient.consents": ("Consents", [("Home", url_for("patient.dashboard")), ("Consents", None)]),
-                "patient.prescriptions": ("Prescriptions", [("Home", url_for("patient.dashboard")), ("Prescriptions", None)]),
-                "patient.emergency_profile": ("Emergency", [("Home", url_for("patient.dashboard")), ("Emergency", None)]),
-            },
-            "doctor": {
-                "doctor.dashboard": ("Dashboard", [("Home", url_for("doctor.dashboard")), ("Dashboard", None)]),
-                "doctor.appointments": ("Appointments", [("Home", url_for("doctor.dashboard")), ("Appointments", None)]),
-                "doctor.patients": ("Patients", [("Home", url_for("doctor.dashboard")), ("Patients", None)]),
-                "doctor.patient_detail": ("Patient", [("Home", url_for("doctor.dashboard")), ("Patients", url_for("doctor.patients")), ("Patient", None)]),
-                "doctor.prescribe": ("Prescription", [("Home", url_for("doctor.dashboard")), ("Appointments", url_for("doctor.appointments")), ("Prescription", None)]),
-            },
-            "pharmacy": {
-                "pharmacy.queue": ("Queue", [("Home", url_for("pharmacy.queue")), ("Queue", None)]),
-            },
-            "emergency": {
-                "emergency.lookup": ("Lookup", [("Home", url_for("emergency.lookup")), ("Lookup", None)]),
-            },
-        }
+        role_name = current_user.role if current_user.is_authenticated else ""
 
         page_title = None
         breadcrumbs = None
 
-        now = datetime.now()
-        current_date = f"{now:%A}, {now:%B} {now.day}, {now:%Y}"
-        current_year = now.year
-        if role_name in mappings and endpoint in mappings[role_name]:
-            page_title, breadcrumbs = mappings[role_name][endpoint]
+        current_date, current_year = current_date_label()
+        meta = page_meta.lookup(endpoint, role_name)
+        if meta is not None:
+            page_title, breadcrumbs = meta
         else:
             if endpoint.endswith(".dashboard"):
                 page_title = "Dashboard"
@@ -1,67 +1,109 @@
 from __future__ import annotations
 
-from flask import redirect, render_template, request, url_for
+from flask import abort, jsonify, redirect, render_template, request, url_for
 
 from app.blueprints.admin import admin_bp
 from app.blueprints.rbac import roles_required
 from app.extensions import db
-from app.models import AuditLog, Doctor, User
-from app.utils.audit import log_action
+from app.models import AuditLog, Doctor, Organization, User
+from app.utils.counters import counters
+from app.utils.emergency_cards import emergency_cards
+from app.utils.identity import invalidate_identity
+from app.utils.pagination import keyset_paginate
+from app.utils.prescription_lifecycle import status_counts
+from app.utils.query_stats import endpoint_stats, query_budget
+from app.utils.user_directory import (
+    BULK_UPDATE_LIMIT,
+    NO_ORGANIZATION,
+    ROLES,
+    doctors_query,
+    set_roles,
+    update_doctors,
+    users_query,
+)
 
 
 @admin_bp.get("/overview")
 @roles_required("admin")
 def overview():
-    counts = {
-        "users": User.query.count(),
-        "doctors": Doctor.query.count(),
-        "audit_logs": AuditLog.query.count(),
-    }
-    return render_template("admin/overview.html", counts=counts)
+    # Precomputed and cached; nothing here counts rows of the underlying tables.
+    return render_template("admin/overview.html", counts=counters.overview(), prescription_counts=status_counts())
+
+
+def _selected_ids() -> list[int]:
+    # The bulk form sends ``ids``; a single row's form sends ``user_id``.
+    values = request.form.getlist("ids") or [request.form.get("user_id") or ""]
+    ids = sorted({int(v) for v in values if v.isdigit()})
+    if len(ids) > BULK_UPDATE_LIMIT:
+        abort(400)
+    return ids
 
 
 @admin_bp.route("/users", methods=["GET", "POST"])
 @roles_required("admin")
 def users():
     if request.method == "POST":
-        user_id = int(request.form.get("user_id") or "0")
         role = (request.form.get("role") or "").strip().lower()
+        if role not in ROLES:
+            abort(400)
 
-        u = User.query.get(user_id)
-        if u and role in {"patient", "doctor", "admin", "pharmacy", "emergency"}:
-            u.role = role
+        changed = set_roles(_selected_ids(), role)
+        if changed:
             db.session.commit()
-            log_action("admin_update_role", "user")
+            for user_id in changed:
+                invalidate_identity(user_id)
+            emergency_cards.sync_soon()
+            counters.invalidate()
 
-        return redirect(url_for("admin.users"))
+        # The forms post back to the listing's own URL, so the search and page are kept.
+        return redirect(url_for("admin.users", **request.args))
 
-    users = User.query.order_by(User.created_at.desc()).all()
-    return render_template("admin/users.html", users=users)
+    q = (request.args.get("q") or "").strip()
+    role = request.args.get("role") if request.args.get("role") in ROLES else None
+    page = keyset_paginate(users_query(q, role), (User.created_at, User.id), cursor=request.args.get("cursor"))
+    return render_template("admin/users.html", users=page.items, users_page=page, q=q, role=role, roles=ROLES)
 
 
 @admin_bp.route("/doctors", methods=["GET", "POST"])
 @roles_required("admin")
 def doctors():
     if request.method == "POST":
-        user_id = int(request.form.get("user_id") or "0")
         specialization = (request.form.get("specialization") or "").strip()
         hospital_id = (request.form.get("hospital_id") or "").strip()
 
-        d = Doctor.query.get(user_id)
-        if d:
-            d.specialization = specialization or d.specialization
-            d.hospital_id = hospital_id or d.hospital_id
+        changed = update_doctors(_selected_ids(), specialization, hospital_id)
+        if changed:
             db.session.commit()
-            log_action("admin_update_doctor", "doctor")
-
-        return redirect(url_for("admin.doctors"))
-
-    doctors = Doctor.query.all()
-    return render_template("admin/doctors.html", doctors=doctors)
+            for user_id in changed:
+                invalidate_identity(user_id)
+
+        return redirect(url_for("admin.doctors", **request.args))
+
+    q = (request.args.get("q") or "").strip()
+    organization = (request.args.get("organization") or "").strip()
+    page = keyset_paginate(
+        doctors_query(q, organization), (Doctor.user_id,), cursor=request.args.get("cursor"), descending=False
+    )
+    return render_template(
+        "admin/doctors.html",
+        doctors=page.items,
+        doctors_page=page,
+        q=q,
+        organization=organization,
+        organizations=Organization.query.order_by(Organization.name).all(),
+        no_organization=NO_ORGANIZATION,
+    )
 
 
 @admin_bp.get("/audit-logs")
+@query_budget(3)
 @roles_required("admin")
 def audit_logs():
     logs = AuditLog.query.order_by(AuditLog.timestamp.desc()).limit(200).all()
     return render_template("admin/audit_logs.html", logs=logs)
+
+
+@admin_bp.get("/query-stats")
+@roles_required("admin")
+def query_stats():
+    return jsonify(endpoint_stats())
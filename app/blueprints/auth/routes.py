@@ -7,6 +7,7 @@ from app.blueprints.auth import auth_bp
 from app.extensions import db
 from app.models import Doctor, Patient, User
 from app.utils.audit import log_action
+from app.utils.doctor_search import index_doctor
 
 
 def _redirect_for_role(role: str):
@@ -66,19 +67,19 @@ def register():
         user = User(email=email, role=role, name=name, phone=phone)
         user.set_password(password)
         db.session.add(user)
-        db.session.commit()
+        db.session.flush()
 
         if role == "patient":
             db.session.add(Patient(user_id=user.id))
-            db.session.commit()
 
         if role == "doctor":
             specialization = (request.form.get("specialization") or "General Medicine").strip()
             hospital_id = (request.form.get("hospital_id") or "HOSP-001").strip()
             db.session.add(Doctor(user_id=user.id, specialization=specialization, hospital_id=hospital_id))
-            db.session.commit()
+            index_doctor(user.id)
 
         log_action("register", "user")
+        db.session.commit()
         login_user(user)
         return _redirect_for_role(user.role)
 
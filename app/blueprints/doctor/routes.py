@@ -2,19 +2,32 @@ from __future__ import annotations
 
 from datetime import datetime
 
-import os
-
-from flask import abort, current_app, redirect, render_template, request, url_for
+from flask import abort, current_app, g, redirect, render_template, request, url_for
 from flask_login import current_user
+from werkzeug.exceptions import RequestEntityTooLarge
 
 from app.blueprints.doctor import doctor_bp
 from app.blueprints.rbac import doctor_consent_required, roles_required
 from app.extensions import db
-from app.models import Appointment, Consent, MedicalRecord, Patient, Prescription
+from app.models import Appointment, Consent, MedicalRecord, Patient, Prescription, User
 from app.utils.audit import log_action, log_event
+from app.utils.change_feed import change_feed
+from app.utils.consent import doctor_organization_id, resolve_consent
+from app.utils.loading import loading_profile
+from app.utils.pagination import keyset_paginate
+from app.utils.prescription_lifecycle import (
+    InvalidTransition,
+    edited as prescription_edited,
+    issue as issue_prescription,
+    reassign as reassign_prescription,
+)
+from app.utils.previews import previews, send_preview
+from app.utils.query_stats import query_budget
+from app.utils.storage import storage, store_upload
 
 
 @doctor_bp.get("/dashboard")
+@query_budget(5)
 @roles_required("doctor")
 def dashboard():
     upcoming = (
@@ -23,26 +36,28 @@ def dashboard():
         .limit(10)
         .all()
     )
-    org_id = getattr(getattr(current_user, "doctor", None), "organization_id", None)
+    org_id = doctor_organization_id()
     active_consents = Consent.query.filter_by(organization_id=org_id, revoked_at=None).count() if org_id else 0
     return render_template("doctor/dashboard.html", upcoming=upcoming, active_consents=active_consents)
 
 
 @doctor_bp.get("/appointments")
+@query_budget(3)
 @roles_required("doctor")
 def appointments():
-    appts = (
-        Appointment.query.filter_by(doctor_id=current_user.id)
-        .order_by(Appointment.scheduled_at.desc())
-        .all()
+    page = keyset_paginate(
+        Appointment.query.filter_by(doctor_id=current_user.id).options(*loading_profile("doctor_appointments")),
+        (Appointment.scheduled_at, Appointment.id),
+        cursor=request.args.get("cursor"),
     )
-    return render_template("doctor/appointments.html", appointments=appts)
+    return render_template("doctor/appointments.html", appointments=page.items, appointments_page=page)
 
 
 @doctor_bp.get("/patients")
+@query_budget(4)
 @roles_required("doctor")
 def patients():
-    org_id = getattr(getattr(current_user, "doctor", None), "organization_id", None)
+    org_id = doctor_organization_id()
     consents = Consent.query.filter_by(organization_id=org_id, revoked_at=None).all() if org_id else []
     patient_ids = [c.patient_id for c in consents]
     patients = Patient.query.filter(Patient.user_id.in_(patient_ids)).all() if patient_ids else []
@@ -50,36 +65,42 @@ def patients():
 
 
 @doctor_bp.get("/patients/<int:patient_id>")
+@query_budget(6)
 @doctor_consent_required("patient_id")
 def patient_detail(patient_id: int):
     patient = Patient.query.get_or_404(patient_id)
+    log_event(
+        "doctor_view_patient",
+        "patient",
+        patient_id=patient.user_id,
+        doctor_id=current_user.id,
+        organization_id=g.consent.organization_id,
+        entity_id=patient.user_id,
+    )
+    return _render_patient_detail(patient)
 
-    org_id = getattr(getattr(current_user, "doctor", None), "organization_id", None)
-    consent = Consent.query.filter_by(patient_id=patient.user_id, organization_id=org_id).first() if org_id else None
-    can_add_record = bool(consent and consent.is_active and getattr(consent, "can_add_record", False))
 
-    records = (
-        MedicalRecord.query.filter_by(patient_id=patient.user_id)
-        .order_by(MedicalRecord.uploaded_at.desc())
-        .all()
+def _render_patient_detail(patient: Patient, error: str | None = None, status: int = 200):
+    # The page lists the patient's records, so whichever view renders it needs view consent.
+    if not g.consent.active or not g.consent.can_view_history:
+        abort(403)
+    can_add_record = g.consent.can_add_record
+
+    records_page = keyset_paginate(
+        MedicalRecord.query.filter_by(patient_id=patient.user_id),
+        (MedicalRecord.uploaded_at, MedicalRecord.id),
+        cursor=request.args.get("cursor"),
     )
     appts = (
         Appointment.query.filter_by(doctor_id=current_user.id, patient_id=patient.user_id)
         .order_by(Appointment.scheduled_at.desc())
         .all()
     )
-    log_event(
-        "doctor_view_patient",
-        "patient",
-        patient_id=patient.user_id,
-        doctor_id=current_user.id,
-        organization_id=org_id,
-        entity_id=patient.user_id,
-    )
     return render_template(
         "doctor/patient_detail.html",
         patient=patient,
-        records=records,
+        records=records_page.items,
+        records_page=records_page,
         appointments=appts,
         can_add_record=can_add_record,
         page_title=f"Patient #{patient.user_id}",
@@ -88,20 +109,23 @@ def patient_detail(patient_id: int):
             ("Patients", url_for("doctor.patients")),
             (f"Patient #{patient.user_id}", None),
         ],
-    )
+        error=error,
+    ), status
 
 
 @doctor_bp.post("/patients/<int:patient_id>/records")
-@doctor_consent_required("patient_id")
+@doctor_consent_required("patient_id", scope="can_add_record")
 def add_record(patient_id: int):
-    patient = Patient.query.get_or_404(patient_id)
+    org_id = g.consent.organization_id
 
-    org_id = getattr(getattr(current_user, "doctor", None), "organization_id", None)
-    consent = Consent.query.filter_by(patient_id=patient.user_id, organization_id=org_id).first() if org_id else None
-    if consent is None or not consent.is_active or not getattr(consent, "can_add_record", False):
-        abort(403)
+    def too_large():
+        error = f"Files are limited to {current_app.config['MAX_UPLOAD_SIZE'] // (1024 * 1024)} MB."
+        return _render_patient_detail(Patient.query.get_or_404(patient_id), error=error, status=413)
 
-    f = request.files.get("file")
+    try:
+        f = request.files.get("file")
+    except RequestEntityTooLarge:
+        return too_large()
     description = (request.form.get("description") or "").strip() or None
     appointment_id_raw = (request.form.get("appointment_id") or "").strip()
 
@@ -111,38 +135,41 @@ def add_record(patient_id: int):
     appointment_id = None
     if appointment_id_raw and appointment_id_raw.isdigit():
         appointment_id = int(appointment_id_raw)
-        owned = Appointment.query.filter_by(id=appointment_id, patient_id=patient.user_id, doctor_id=current_user.id).first()
+        owned = Appointment.query.filter_by(id=appointment_id, patient_id=patient_id, doctor_id=current_user.id).first()
         if owned is None:
             appointment_id = None
 
-    upload_root = current_app.config.get("UPLOAD_FOLDER", os.path.join(current_app.root_path, "static", "uploads"))
-    os.makedirs(upload_root, exist_ok=True)
-
-    safe_name = f"doc_{current_user.id}_patient_{patient.user_id}_{int(datetime.utcnow().timestamp())}_{os.path.basename(f.filename)}"
-    rel_path = os.path.join("uploads", safe_name)
-    abs_path = os.path.join(current_app.root_path, "static", rel_path)
-    f.save(abs_path)
+    try:
+        stored = store_upload(f)
+    except RequestEntityTooLarge:
+        db.session.rollback()
+        return too_large()
 
     rec = MedicalRecord(
-        patient_id=patient.user_id,
-        file_path=rel_path,
+        patient_id=patient_id,
+        file_path=stored.file_path,
+        size_bytes=stored.size_bytes,
+        sha256=stored.sha256,
+        codec=stored.codec,
         description=description,
         appointment_id=appointment_id,
         created_by_user_id=current_user.id,
     )
     db.session.add(rec)
-    db.session.commit()
+    db.session.flush()
 
     log_action("doctor_add_medical_record", "medical_record")
     log_event(
         "record_added_by_doctor",
         "medical_record",
-        patient_id=patient.user_id,
+        patient_id=patient_id,
         doctor_id=current_user.id,
         organization_id=org_id,
         entity_id=rec.id,
     )
-    return redirect(url_for("doctor.patient_detail", patient_id=patient.user_id))
+    db.session.commit()
+    previews.schedule(stored.file_path, stored.codec)
+    return redirect(url_for("doctor.patient_detail", patient_id=patient_id))
 
 
 @doctor_bp.get("/records/<int:record_id>/view")
@@ -150,9 +177,9 @@ def add_record(patient_id: int):
 def record_view(record_id: int):
     rec = MedicalRecord.query.get_or_404(record_id)
 
-    org_id = getattr(getattr(current_user, "doctor", None), "organization_id", None)
-    consent = Consent.query.filter_by(patient_id=rec.patient_id, organization_id=org_id).first() if org_id else None
-    if consent is None or not consent.is_active or not getattr(consent, "can_view_history", True):
+    org_id = doctor_organization_id()
+    consent = resolve_consent(org_id, rec.patient_id)
+    if consent is None or not consent.active or not consent.can_view_history:
         abort(403)
 
     log_event(
@@ -163,7 +190,18 @@ def record_view(record_id: int):
         organization_id=org_id,
         entity_id=rec.id,
     )
-    return redirect(url_for("static", filename=rec.file_path))
+    return storage.send(rec.file_path, etag=rec.sha256, download_name=rec.download_name, codec=rec.codec)
+
+
+@doctor_bp.get("/records/<int:record_id>/preview")
+@roles_required("doctor")
+def record_preview(record_id: int):
+    # Thumbnails are not audited individually; rendering the list already logs the patient view.
+    rec = MedicalRecord.query.get_or_404(record_id)
+    consent = resolve_consent(doctor_organization_id(), rec.patient_id)
+    if consent is None or not consent.active or not consent.can_view_history:
+        abort(403)
+    return send_preview(rec)
 
 
 @doctor_bp.route("/appointments/<int:appointment_id>/prescribe", methods=["GET", "POST"])
@@ -173,34 +211,48 @@ def prescribe(appointment_id: int):
     if appt.doctor_id != current_user.id:
         abort(403)
 
-    org_id = getattr(getattr(current_user, "doctor", None), "organization_id", None)
-    consent = Consent.query.filter_by(patient_id=appt.patient_id, organization_id=org_id).first() if org_id else None
-    if consent is None or not consent.is_active:
+    consent = resolve_consent(doctor_organization_id(), appt.patient_id)
+    if consent is None or not consent.active:
         abort(403)
 
-    existing = Prescription.query.filter_by(appointment_id=appt.id).first()
+    query = Prescription.query.filter_by(appointment_id=appt.id)
+    if request.method == "POST":
+        # Locked so a reassignment cannot race the pharmacy starting on it.
+        query = query.with_for_update()
+    existing = query.first()
+    error = None
 
     if request.method == "POST":
         notes = (request.form.get("notes") or "").strip() or None
-        pharmacy_id = (request.form.get("pharmacy_id") or "").strip() or None
-
-        if existing is None:
-            existing = Prescription(appointment_id=appt.id, issued_at=datetime.utcnow())
-            db.session.add(existing)
-
-        existing.notes = notes
-        existing.pharmacy_id = pharmacy_id
-        existing.fulfillment_status = "pending"
-        existing.delivery_status = "not_started"
-
-        db.session.commit()
-        log_action("issue_prescription", "prescription")
-        return redirect(url_for("doctor.appointments"))
+        pharmacy_raw = (request.form.get("pharmacy_id") or "").strip()
+        pharmacy_id = int(pharmacy_raw) if pharmacy_raw.isdigit() else None
+
+        if pharmacy_raw and (pharmacy_id is None or User.query.filter_by(id=pharmacy_id, role="pharmacy").count() == 0):
+            error = "No pharmacy with that user id."
+        else:
+            try:
+                if existing is None:
+                    existing = Prescription(appointment_id=appt.id, issued_at=datetime.utcnow(), notes=notes)
+                    issue_prescription(existing, pharmacy_id)
+                else:
+                    # Saving again edits the prescription; it no longer restarts the pharmacy's work.
+                    reassign_prescription(existing, pharmacy_id)
+                    if existing.notes != notes:
+                        existing.notes = notes
+                        prescription_edited(existing)
+            except InvalidTransition as exc:
+                error = str(exc)
+            else:
+                log_action("issue_prescription", "prescription")
+                db.session.commit()
+                change_feed.publish()
+                return redirect(url_for("doctor.appointments"))
 
     return render_template(
         "doctor/prescribe.html",
         appointment=appt,
         prescription=existing,
+        error=error,
         page_title=f"Prescription · Appointment #{appt.id}",
         breadcrumbs=[
             ("Home", url_for("doctor.dashboard")),
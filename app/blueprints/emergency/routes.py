@@ -4,26 +4,28 @@ from flask import render_template, request
 
 from app.blueprints.emergency import emergency_bp
 from app.blueprints.rbac import roles_required
-from app.models import Patient, User
-from app.utils.audit import log_action
+from app.utils.audit import log_action, log_event
+from app.utils.emergency_cards import EmergencyCardsUnavailable, emergency_cards
 
 
 @emergency_bp.route("/lookup", methods=["GET", "POST"])
 @roles_required("emergency")
 def lookup():
     patient = None
+    error = None
     if request.method == "POST":
-        q = (request.form.get("query") or "").strip().lower()
+        # Served from the in-memory card index; a background thread keeps it current.
+        try:
+            patient = emergency_cards.lookup(request.form.get("query") or "")
+        except EmergencyCardsUnavailable:
+            error = "Emergency lookup is unavailable right now. Try again in a few seconds."
+            return render_template("emergency/lookup.html", patient=None, error=error), 503
+        if patient:
+            # Buffered and written by the audit writer after the response: the admin audit feed
+            # keeps every emergency access, and the patient sees it on their own timeline.
+            log_action("emergency_lookup", "patient", entity_id=patient.user_id)
+            log_event("emergency_lookup", "patient", patient_id=patient.user_id, entity_id=patient.user_id)
+        else:
+            error = "No patient matches that ID, email or phone number."
 
-        user = None
-        if q.isdigit():
-            user = User.query.get(int(q))
-        if user is None:
-            user = User.query.filter_by(email=q).first()
-
-        if user and user.role == "patient":
-            patient = Patient.query.get(user.id)
-            if patient:
-                log_action("emergency_lookup", "patient")
-
-    return render_template("emergency/lookup.html", patient=patient)
+    return render_template("emergency/lookup.html", patient=patient, error=error)
@@ -1,20 +1,30 @@
 from __future__ import annotations
 
-import os
 from datetime import datetime
 
-from flask import current_app, redirect, render_template, request, url_for
+from flask import abort, current_app, redirect, render_template, request, stream_with_context, url_for
 from flask_login import current_user
-from sqlalchemy import or_
+from werkzeug.exceptions import RequestEntityTooLarge
 
 from app.blueprints.patient import patient_bp
 from app.blueprints.rbac import roles_required
 from app.extensions import db
 from app.models import Appointment, AuditEvent, Consent, Doctor, DoctorFeedback, MedicalRecord, Organization, Patient, Prescription, User
 from app.utils.audit import log_action, log_event
+from app.utils.consent import invalidate_consent
+from app.utils.doctor_search import search_doctors
+from app.utils.emergency_cards import emergency_cards
+from app.utils.export import stream_record_bundle
+from app.utils.identity import invalidate_identity
+from app.utils.loading import loading_profile
+from app.utils.pagination import keyset_paginate
+from app.utils.previews import previews, send_preview
+from app.utils.query_stats import query_budget
+from app.utils.storage import storage, store_upload
 
 
 @patient_bp.get("/dashboard")
+@query_budget(6)
 @roles_required("patient")
 def dashboard():
     patient = Patient.query.get(current_user.id)
@@ -41,32 +51,45 @@ def dashboard():
     )
 
 
-@patient_bp.route("/records", methods=["GET", "POST"])
-@roles_required("patient")
-def records():
-    patient = Patient.query.get(current_user.id)
-
-    appts = (
+def _recent_appointments() -> list[Appointment]:
+    # For the upload form's appointment picker; an upload itself only checks the one it names.
+    return (
         Appointment.query.filter_by(patient_id=current_user.id)
         .order_by(Appointment.scheduled_at.desc())
         .limit(50)
         .all()
     )
 
+
+@patient_bp.route("/records", methods=["GET", "POST"])
+@query_budget(10)
+@roles_required("patient")
+def records():
+    patient = Patient.query.get(current_user.id)
+
     if request.method == "POST":
-        f = request.files.get("file")
-        description = (request.form.get("description") or "").strip()
-        appointment_id_raw = (request.form.get("appointment_id") or "").strip()
+        try:
+            f = request.files.get("file")
+        except RequestEntityTooLarge:
+            f = None
+            error = f"Files are limited to {current_app.config['MAX_UPLOAD_SIZE'] // (1024 * 1024)} MB."
+        else:
+            error = "Please choose a file to upload."
 
         if not f or not f.filename:
+            records_page = _patient_records()
             return render_template(
                 "patient/records.html",
                 patient=patient,
-                records=_patient_records(),
-                appointments=appts,
-                error="Please choose a file to upload.",
+                records=records_page.items,
+                records_page=records_page,
+                appointments=_recent_appointments(),
+                error=error,
             )
 
+        description = (request.form.get("description") or "").strip()
+        appointment_id_raw = (request.form.get("appointment_id") or "").strip()
+
         appointment_id = None
         if appointment_id_raw and appointment_id_raw.isdigit():
             appointment_id = int(appointment_id_raw)
@@ -74,31 +97,36 @@ def records():
             if owned is None:
                 appointment_id = None
 
-        upload_root = current_app.config.get("UPLOAD_FOLDER", os.path.join(current_app.root_path, "static", "uploads"))
-        os.makedirs(upload_root, exist_ok=True)
-
-        safe_name = f"{current_user.id}_{int(datetime.utcnow().timestamp())}_{os.path.basename(f.filename)}"
-        rel_path = os.path.join("uploads", safe_name)
-        abs_path = os.path.join(current_app.root_path, "static", rel_path)
-
-        f.save(abs_path)
+        stored = store_upload(f)
 
         rec = MedicalRecord(
             patient_id=current_user.id,
-            file_path=rel_path,
+            file_path=stored.file_path,
+            size_bytes=stored.size_bytes,
+            sha256=stored.sha256,
+            codec=stored.codec,
             description=description or None,
             appointment_id=appointment_id,
             created_by_user_id=current_user.id,
         )
         db.session.add(rec)
-        db.session.commit()
+        db.session.flush()
         log_action("upload_medical_record", "medical_record")
         log_event("record_uploaded", "medical_record", patient_id=current_user.id, doctor_id=None, entity_id=rec.id)
+        db.session.commit()
+        previews.schedule(stored.file_path, stored.codec)
 
         return redirect(url_for("patient.records"))
 
     log_event("view_records", "medical_record", patient_id=current_user.id, doctor_id=None, entity_id=None)
-    return render_template("patient/records.html", patient=patient, records=_patient_records(), appointments=appts)
+    records_page = _patient_records()
+    return render_template(
+        "patient/records.html",
+        patient=patient,
+        records=records_page.items,
+        records_page=records_page,
+        appointments=_recent_appointments(),
+    )
 
 
 @patient_bp.get("/records/<int:record_id>/view")
@@ -109,22 +137,46 @@ def record_view(record_id: int):
         return redirect(url_for("patient.records"))
 
     log_event("record_viewed", "medical_record", patient_id=current_user.id, doctor_id=None, entity_id=rec.id)
-    return redirect(url_for("static", filename=rec.file_path))
+    return storage.send(rec.file_path, etag=rec.sha256, download_name=rec.download_name, codec=rec.codec)
+
+
+@patient_bp.get("/records/<int:record_id>/preview")
+@roles_required("patient")
+def record_preview(record_id: int):
+    rec = MedicalRecord.query.get_or_404(record_id)
+    if rec.patient_id != current_user.id:
+        abort(404)
+    return send_preview(rec)
+
+
+@patient_bp.get("/records/export")
+@roles_required("patient")
+def records_export():
+    log_action("export_medical_records", "medical_record")
+    response = current_app.response_class(stream_with_context(stream_record_bundle(current_user.id)), mimetype="application/zip")
+    response.headers.set("Content-Disposition", "attachment", filename=f"medical-records-{datetime.utcnow():%Y%m%d}.zip")
+    response.cache_control.private = True
+    response.cache_control.no_store = True
+    # Let a buffering proxy pass the bundle through as it is generated.
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
 
 
 def _patient_records():
-    return (
-        MedicalRecord.query.filter_by(patient_id=current_user.id)
-        .order_by(MedicalRecord.uploaded_at.desc())
-        .all()
+    return keyset_paginate(
+        MedicalRecord.query.filter_by(patient_id=current_user.id),
+        (MedicalRecord.uploaded_at, MedicalRecord.id),
+        cursor=request.args.get("cursor"),
     )
 
 
 @patient_bp.route("/appointments", methods=["GET", "POST"])
+@query_budget(6)
 @roles_required("patient")
 def appointments():
     doctors = (
         Doctor.query.join(Doctor.user)
+        .options(*loading_profile("doctor_directory"))
         .order_by(Doctor.specialization.asc())
         .all()
     )
@@ -136,10 +188,12 @@ def appointments():
         try:
             scheduled_at = datetime.fromisoformat(scheduled_at_raw)
         except ValueError:
+            appointments_page = _patient_appointments()
             return render_template(
                 "patient/appointments.html",
                 doctors=doctors,
-                appointments=_patient_appointments(),
+                appointments=appointments_page.items,
+                appointments_page=appointments_page,
                 error="Invalid date/time.",
             )
 
@@ -153,25 +207,27 @@ def appointments():
             status="scheduled",
         )
         db.session.add(appt)
-        db.session.commit()
         log_action("book_appointment", "appointment")
+        db.session.commit()
 
         return redirect(url_for("patient.appointments"))
 
     selected_doctor_id = request.args.get("doctor_id")
+    appointments_page = _patient_appointments()
     return render_template(
         "patient/appointments.html",
         doctors=doctors,
-        appointments=_patient_appointments(),
+        appointments=appointments_page.items,
+        appointments_page=appointments_page,
         selected_doctor_id=int(selected_doctor_id) if selected_doctor_id and selected_doctor_id.isdigit() else None,
     )
 
 
 def _patient_appointments():
-    return (
-        Appointment.query.filter_by(patient_id=current_user.id)
-        .order_by(Appointment.scheduled_at.desc())
-        .all()
+    return keyset_paginate(
+        Appointment.query.filter_by(patient_id=current_user.id).options(*loading_profile("patient_appointments")),
+        (Appointment.scheduled_at, Appointment.id),
+        cursor=request.args.get("cursor"),
     )
 
 
@@ -192,8 +248,9 @@ def consents():
         if action == "revoke":
             if consent and consent.revoked_at is None:
                 consent.revoked_at = datetime.utcnow()
-                db.session.commit()
                 log_action("revoke_consent", "consent")
+                db.session.commit()
+                invalidate_consent(organization_id, current_user.id)
             return redirect(url_for("patient.consents"))
 
         if consent is None:
@@ -206,8 +263,9 @@ def consents():
         consent.can_view_history = can_view_history
         consent.can_add_record = can_add_record
 
-        db.session.commit()
         log_action("grant_consent", "consent")
+        db.session.commit()
+        invalidate_consent(organization_id, current_user.id)
         return redirect(url_for("patient.consents"))
 
     existing = Consent.query.filter_by(patient_id=current_user.id).all()
@@ -221,25 +279,20 @@ def consents():
 
 
 @patient_bp.get("/doctors")
+@query_budget(4)
 @roles_required("patient")
 def doctors():
     q = (request.args.get("q") or "").strip()
+    cursor = request.args.get("cursor")
 
-    query = Doctor.query.join(Doctor.user)
     if q:
-        like = f"%{q}%"
-        query = query.filter(
-            or_(
-                Doctor.specialization.ilike(like),
-                Doctor.hospital_id.ilike(like),
-                User.email.ilike(like),
-                User.name.ilike(like),
-            )
-        )
+        page = search_doctors(q, cursor=cursor)
+    else:
+        query = Doctor.query.join(Doctor.user).options(*loading_profile("doctor_directory"))
+        page = keyset_paginate(query, (Doctor.specialization, Doctor.user_id), cursor=cursor, descending=False)
 
-    doctors = query.order_by(Doctor.specialization.asc()).all()
     log_action("view_doctors_directory", "doctor")
-    return render_template("patient/doctors.html", doctors=doctors, q=q)
+    return render_template("patient/doctors.html", doctors=page.items, doctors_page=page, q=q)
 
 
 @patient_bp.route("/doctors/<int:doctor_id>", methods=["GET", "POST"])
@@ -269,8 +322,8 @@ def doctor_detail(doctor_id: int):
 
         my_feedback.rating = rating
         my_feedback.comment = comment
-        db.session.commit()
         log_action("submit_doctor_feedback", "doctor_feedback")
+        db.session.commit()
         return redirect(url_for("patient.doctor_detail", doctor_id=doctor.user_id))
 
     feedback = (
@@ -296,6 +349,7 @@ def doctor_detail(doctor_id: int):
 
 
 @patient_bp.get("/prescriptions")
+@query_budget(3)
 @roles_required("patient")
 def prescriptions():
     prescriptions = (
@@ -308,10 +362,12 @@ def prescriptions():
 
 
 @patient_bp.get("/activity")
+@query_budget(4)
 @roles_required("patient")
 def activity():
     events = (
         AuditEvent.query.filter_by(patient_id=current_user.id)
+        .options(*loading_profile("activity_feed"))
         .order_by(AuditEvent.timestamp.desc())
         .limit(250)
         .all()
@@ -321,37 +377,44 @@ def activity():
 
 
 @patient_bp.get("/history")
+@query_budget(6)
 @roles_required("patient")
 def history():
-    appts = (
-        Appointment.query.filter_by(patient_id=current_user.id)
-        .order_by(Appointment.scheduled_at.desc())
-        .all()
+    appointments_page = keyset_paginate(
+        Appointment.query.filter_by(patient_id=current_user.id).options(*loading_profile("patient_history")),
+        (Appointment.scheduled_at, Appointment.id),
+        cursor=request.args.get("cursor"),
     )
+    appts = appointments_page.items
 
     appt_ids = [a.id for a in appts]
     records_by_appt: dict[int, list[MedicalRecord]] = {}
     if appt_ids:
         linked = (
             MedicalRecord.query.filter(MedicalRecord.patient_id == current_user.id, MedicalRecord.appointment_id.in_(appt_ids))
+            .options(*loading_profile("records_with_author"))
             .order_by(MedicalRecord.uploaded_at.desc())
             .all()
         )
         for r in linked:
             records_by_appt.setdefault(r.appointment_id, []).append(r)
 
-    unlinked_records = (
-        MedicalRecord.query.filter_by(patient_id=current_user.id, appointment_id=None)
-        .order_by(MedicalRecord.uploaded_at.desc())
-        .all()
+    unlinked_page = keyset_paginate(
+        MedicalRecord.query.filter_by(patient_id=current_user.id, appointment_id=None).options(
+            *loading_profile("records_with_author")
+        ),
+        (MedicalRecord.uploaded_at, MedicalRecord.id),
+        cursor=request.args.get("records_cursor"),
     )
 
     log_event("view_history", "appointment", patient_id=current_user.id, doctor_id=None, entity_id=None)
     return render_template(
         "patient/history.html",
         appointments=appts,
+        appointments_page=appointments_page,
         records_by_appt=records_by_appt,
-        unlinked_records=unlinked_records,
+        unlinked_records=unlinked_page.items,
+        unlinked_page=unlinked_page,
     )
 
 
@@ -361,8 +424,10 @@ def profile():
     patient = Patient.query.get(current_user.id)
 
     if request.method == "POST":
-        current_user.name = (request.form.get("name") or "").strip() or None
-        current_user.phone = (request.form.get("phone") or "").strip() or None
+        # current_user is a cached identity, not a row; change the row itself.
+        user = db.session.get(User, current_user.id)
+        user.name = (request.form.get("name") or "").strip() or None
+        user.phone = (request.form.get("phone") or "").strip() or None
 
         patient.dob = (request.form.get("dob") or "").strip() or None
         patient.gender = (request.form.get("gender") or "").strip() or None
@@ -371,9 +436,13 @@ def profile():
         patient.allergies = (request.form.get("allergies") or "").strip() or None
         patient.chronic_conditions = (request.form.get("chronic_conditions") or "").strip() or None
         patient.emergency_contacts = (request.form.get("emergency_contacts") or "").strip() or None
+        # Email and phone live on the user row, so mark the card changed explicitly.
+        patient.updated_at = datetime.utcnow()
 
-        db.session.commit()
         log_action("update_patient_profile", "patient")
+        db.session.commit()
+        invalidate_identity(current_user.id)
+        emergency_cards.refresh(current_user.id)
         return redirect(url_for("patient.profile"))
 
     return render_template("patient/profile.html", patient=patient)
@@ -389,8 +458,10 @@ def emergency_profile():
         patient.allergies = (request.form.get("allergies") or "").strip() or None
         patient.chronic_conditions = (request.form.get("chronic_conditions") or "").strip() or None
         patient.emergency_contacts = (request.form.get("emergency_contacts") or "").strip() or None
-        db.session.commit()
         log_action("update_emergency_profile", "patient")
+        db.session.commit()
+        invalidate_identity(current_user.id)
+        emergency_cards.refresh(current_user.id)
         return redirect(url_for("patient.emergency_profile"))
 
     return render_template("patient/emergency_profile.html", patient=patient)
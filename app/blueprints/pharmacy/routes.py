@@ -1,40 +1,190 @@
 from __future__ import annotations
 
-from flask import abort, redirect, render_template, request, url_for
+import json
+import time
+
+from flask import abort, current_app, redirect, render_template, request, stream_with_context, url_for
 from flask_login import current_user
 
 from app.blueprints.pharmacy import pharmacy_bp
 from app.blueprints.rbac import roles_required
 from app.extensions import db
-from app.models import Appointment, Prescription
+from app.models import Prescription
 from app.utils.audit import log_action
+from app.utils.change_feed import change_feed
+from app.utils.pagination import keyset_paginate_union
+from app.utils.prescription_lifecycle import (
+    DELIVERY_STATUSES,
+    FULFILLMENT_STATUSES,
+    InvalidTransition,
+    bulk_transition,
+    status_counts,
+    transition,
+)
+from app.utils.query_stats import query_budget
+
+
+# Queue tab -> (label, fulfillment statuses it shows, newest first?). Open work is oldest first.
+QUEUE_TABS = {
+    "pending": ("Pending", ("pending",), False),
+    "in_progress": ("In progress", ("verified", "packed"), False),
+    "done": ("Done", ("fulfilled",), True),
+}
+
+# Upper bound on prescriptions changed by one bulk request.
+BULK_UPDATE_LIMIT = 500
+
+
+def _tab_for(status: str) -> str | None:
+    return next((tab for tab, (_label, statuses, _desc) in QUEUE_TABS.items() if status in statuses), None)
+
+
+def _status_counts(pharmacy_id: int) -> dict[str, int]:
+    # Read from the counters the lifecycle engine keeps, not counted over the prescriptions table.
+    by_status = status_counts(pharmacy_id)
+    return {tab: sum(by_status.get(s, 0) for s in statuses) for tab, (_label, statuses, _desc) in QUEUE_TABS.items()}
+
+
+def _back_to_queue(rejected: int = 0):
+    tab = request.form.get("tab")
+    return redirect(url_for("pharmacy.queue", status=tab if tab in QUEUE_TABS else None, rejected=rejected or None))
 
 
 @pharmacy_bp.get("/queue")
+@query_budget(5)
 @roles_required("pharmacy")
 def queue():
-    prescriptions = (
-        Prescription.query.join(Prescription.appointment)
-        .filter(Prescription.pharmacy_id == str(current_user.id))
-        .order_by(Prescription.issued_at.desc())
-        .all()
+    tab = request.args.get("status") if request.args.get("status") in QUEUE_TABS else "pending"
+    _label, statuses, newest_first = QUEUE_TABS[tab]
+    # Read before the queries so the live feed replays anything that lands while this page renders.
+    feed_version = change_feed.current_version()
+    rejected = request.args.get("rejected", "")
+    error = None
+    if rejected.isdigit() and int(rejected):
+        error = f"{rejected} prescription(s) were left as they were: their current status does not allow that change."
+
+    # One index range per status, (pharmacy_id, fulfillment_status, issued_at), merged a page at a time.
+    page = keyset_paginate_union(
+        [Prescription.query.filter_by(pharmacy_id=current_user.id, fulfillment_status=s) for s in statuses],
+        (Prescription.issued_at, Prescription.id),
+        cursor=request.args.get("cursor"),
+        descending=newest_first,
     )
-    return render_template("pharmacy/queue.html", prescriptions=prescriptions)
+    return render_template(
+        "pharmacy/queue.html",
+        prescriptions=page.items,
+        prescriptions_page=page,
+        tabs=QUEUE_TABS,
+        tab=tab,
+        counts=_status_counts(current_user.id),
+        feed_version=feed_version,
+        error=error,
+    )
+
+
+def _resume_version() -> int | None:
+    raw = request.headers.get("Last-Event-ID") or request.args.get("since") or ""
+    return int(raw) if raw.isdigit() else None
+
+
+def _queue_events(pharmacy_id: int, changes) -> str:
+    # One event per prescription, carrying the latest version that touched it.
+    latest = {c.prescription_id: c for c in changes}
+    rows = {p.id: p for p in Prescription.query.filter(Prescription.id.in_(latest), Prescription.pharmacy_id == pharmacy_id)}
+    counts = _status_counts(pharmacy_id)
+
+    out = []
+    for change in sorted(latest.values()):
+        p = rows.get(change.prescription_id)
+        tab = _tab_for(p.fulfillment_status) if p is not None else None
+        # A prescription that moved to another pharmacy arrives with no tab, which removes it.
+        data = {
+            "id": change.prescription_id,
+            "tab": tab,
+            "html": render_template("pharmacy/_prescription_card.html", p=p, tab=tab) if p is not None else None,
+            "counts": counts,
+        }
+        out.append(f"id: {change.version}\nevent: prescription\ndata: {json.dumps(data)}\n\n")
+    return "".join(out)
+
+
+@pharmacy_bp.get("/queue/events")
+@roles_required("pharmacy")
+def queue_events():
+    """Server-sent events for the logged-in pharmacy's queue; ``Last-Event-ID`` resumes a dropped stream."""
+    pharmacy_id = current_user.id
+    since = _resume_version()
+    heartbeat = float(current_app.config.get("QUEUE_EVENTS_HEARTBEAT", 15))
+    max_age = float(current_app.config.get("QUEUE_EVENTS_MAX_SECONDS", 300))
+
+    def stream():
+        subscription = change_feed.subscribe(pharmacy_id, change_feed.current_version() if since is None else since)
+        yield f"retry: {int(current_app.config.get('QUEUE_EVENTS_RETRY_MS', 3000))}\n\n"
+        # Streams end after a while so the browser reconnects and roles_required runs again.
+        deadline = time.monotonic() + max_age
+        while time.monotonic() < deadline:
+            changes = subscription.wait(timeout=heartbeat)
+            if changes:
+                yield _queue_events(pharmacy_id, changes)
+                # Release the connection and the read snapshot while this stream sits idle.
+                db.session.rollback()
+            # A bare id keeps the connection alive; the browser resumes from it after a reconnect.
+            yield f"id: {subscription.position}\n\n"
+
+    response = current_app.response_class(stream_with_context(stream()), mimetype="text/event-stream")
+    response.cache_control.no_store = True
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
 
 
 @pharmacy_bp.post("/prescriptions/<int:prescription_id>/update")
 @roles_required("pharmacy")
 def update(prescription_id: int):
-    p = Prescription.query.get_or_404(prescription_id)
-    if p.pharmacy_id != str(current_user.id):
+    # Locked so the transition is checked against the status it replaces.
+    p = Prescription.query.filter_by(id=prescription_id).with_for_update().first_or_404()
+    if p.pharmacy_id != current_user.id:
         abort(403)
 
-    fulfillment_status = (request.form.get("fulfillment_status") or "pending").strip()
-    delivery_status = (request.form.get("delivery_status") or "not_started").strip()
+    fulfillment_status = (request.form.get("fulfillment_status") or "").strip() or None
+    delivery_status = (request.form.get("delivery_status") or "").strip() or None
+
+    try:
+        changed = transition(p, fulfillment_status, delivery_status)
+    except InvalidTransition:
+        db.session.rollback()
+        return _back_to_queue(rejected=1)
+
+    if changed:
+        log_action("pharmacy_update_fulfillment", "prescription", entity_id=p.id)
+        db.session.commit()
+        change_feed.publish()
+    return _back_to_queue()
+
+
+@pharmacy_bp.post("/prescriptions/bulk-update")
+@roles_required("pharmacy")
+def bulk_update():
+    ids = sorted({int(v) for v in request.form.getlist("ids") if v.isdigit()})
+    if len(ids) > BULK_UPDATE_LIMIT:
+        abort(400)
+
+    # Blank leaves that field as it is on every selected prescription.
+    fulfillment_status = (request.form.get("fulfillment_status") or "").strip() or None
+    delivery_status = (request.form.get("delivery_status") or "").strip() or None
+    if fulfillment_status is not None and fulfillment_status not in FULFILLMENT_STATUSES:
+        abort(400)
+    if delivery_status is not None and delivery_status not in DELIVERY_STATUSES:
+        abort(400)
 
-    p.fulfillment_status = fulfillment_status
-    p.delivery_status = delivery_status
-    db.session.commit()
-    log_action("pharmacy_update_fulfillment", "prescription")
+    pharmacy_id = current_user.id
+    rejected: list[int] = []
+    if ids and (fulfillment_status or delivery_status):
+        updated, rejected = bulk_transition(pharmacy_id, ids, fulfillment_status, delivery_status)
+        if updated:
+            # Buffered for this request, so all of these go out as one insert inside the same commit.
+            for prescription_id in updated:
+                log_action("pharmacy_update_fulfillment", "prescription", entity_id=prescription_id)
+        db.session.commit()
+        change_feed.publish()
 
-    return redirect(url_for("pharmacy.queue"))
+    return _back_to_queue(rejected=len(rejected))
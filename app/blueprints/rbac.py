@@ -3,10 +3,10 @@ from __future__ import annotations
 from functools import wraps
 from typing import Callable, Iterable
 
-from flask import abort
+from flask import abort, g
 from flask_login import current_user, login_required
 
-from app.models import Consent, Patient
+from app.utils.consent import doctor_organization_id, resolve_consent
 
 
 def roles_required(*roles: str):
@@ -27,7 +27,7 @@ def roles_required(*roles: str):
     return decorator
 
 
-def doctor_consent_required(patient_id_arg: str = "patient_id"):
+def doctor_consent_required(patient_id_arg: str = "patient_id", scope: str | None = None):
     def decorator(fn: Callable):
         @wraps(fn)
         @roles_required("doctor")
@@ -36,24 +36,21 @@ def doctor_consent_required(patient_id_arg: str = "patient_id"):
             if patient_id is None:
                 abort(400)
 
-            patient = Patient.query.get(int(patient_id))
-            if patient is None:
-                abort(404)
-
-            org_id = None
-            try:
-                if getattr(current_user, "doctor", None) is not None:
-                    org_id = current_user.doctor.organization_id
-            except Exception:
-                org_id = None
-
+            org_id = doctor_organization_id()
             if org_id is None:
                 abort(403)
 
-            consent = Consent.query.filter_by(patient_id=patient.user_id, organization_id=org_id).first()
-            if consent is None or not consent.is_active or not getattr(consent, "can_view_history", True):
+            decision = resolve_consent(org_id, int(patient_id))
+            if decision is None:
+                abort(404)
+
+            if not decision.active or not decision.can_view_history:
+                abort(403)
+            # Any further scope is required on top of view consent, never instead of it.
+            if scope is not None and not getattr(decision, scope):
                 abort(403)
 
+            g.consent = decision
             return fn(*args, **kwargs)
 
         return wrapper
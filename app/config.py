@@ -9,10 +9,85 @@ class BaseConfig:
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = "Lax"
 
+    AUDIT_ASYNC = os.getenv("AUDIT_ASYNC", "1") == "1"
+    AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "200"))
+    AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "0.5"))
+    AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+    AUDIT_ENQUEUE_TIMEOUT = float(os.getenv("AUDIT_ENQUEUE_TIMEOUT", "1.0"))
+
+    CONSENT_CACHE_TTL = float(os.getenv("CONSENT_CACHE_TTL", "5"))
+    IDENTITY_CACHE_TTL = float(os.getenv("IDENTITY_CACHE_TTL", "30"))
+
+    LAZY_LOAD_DETECTION = os.getenv("LAZY_LOAD_DETECTION", "")
+
+    QUERY_STATS_HEADERS = False
+    QUERY_BUDGET_ENFORCE = False
+
+    PAGE_SIZE = int(os.getenv("PAGE_SIZE", "25"))
+
+    # Defaults to app/static/uploads when unset.
+    UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER") or None
+    MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(64 * 1024 * 1024)))
+    UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+    # Whole request body: one upload plus room for the other form fields.
+    MAX_CONTENT_LENGTH = MAX_UPLOAD_SIZE + 1024 * 1024
+
+    # "" streams from Python; "x-accel-redirect" (nginx) or "x-sendfile" (Apache/lighttpd) hand the
+    # bytes to the front proxy once the consent check has passed.
+    RECORD_DOWNLOAD_OFFLOAD = os.getenv("RECORD_DOWNLOAD_OFFLOAD", "")
+    # nginx: location /_protected/uploads/ { internal; alias <UPLOAD_FOLDER>/; }
+    RECORD_ACCEL_PREFIX = os.getenv("RECORD_ACCEL_PREFIX", "/_protected/uploads")
+
+    # Text-like uploads are stored gzip-compressed when that saves at least 10%.
+    RECORD_COMPRESSION = os.getenv("RECORD_COMPRESSION", "1") == "1"
+    RECORD_COMPRESSION_MIN_SIZE = int(os.getenv("RECORD_COMPRESSION_MIN_SIZE", "1024"))
+    RECORD_COMPRESSION_LEVEL = int(os.getenv("RECORD_COMPRESSION_LEVEL", "6"))
+
+    # Live pharmacy queue: how often streams look for other workers' changes, how many event ids
+    # back they re-read for late commits, and stream timing.
+    CHANGE_FEED_POLL_SECONDS = float(os.getenv("CHANGE_FEED_POLL_SECONDS", "2"))
+    CHANGE_FEED_LOOKBACK = int(os.getenv("CHANGE_FEED_LOOKBACK", "1000"))
+    QUEUE_EVENTS_HEARTBEAT = float(os.getenv("QUEUE_EVENTS_HEARTBEAT", "15"))
+    QUEUE_EVENTS_MAX_SECONDS = float(os.getenv("QUEUE_EVENTS_MAX_SECONDS", "300"))
+    QUEUE_EVENTS_RETRY_MS = int(os.getenv("QUEUE_EVENTS_RETRY_MS", "3000"))
+
+    # Admin overview counters: cache lifetime, table statistics instead of summary rows for the
+    # totals, how long audit ids skipped by the watermark are waited for, and days shown.
+    COUNTERS_CACHE_TTL = float(os.getenv("COUNTERS_CACHE_TTL", "30"))
+    COUNTERS_APPROXIMATE = os.getenv("COUNTERS_APPROXIMATE", "0") == "1"
+    COUNTERS_GAP_SECONDS = float(os.getenv("COUNTERS_GAP_SECONDS", "3600"))
+    COUNTERS_DAYS = int(os.getenv("COUNTERS_DAYS", "14"))
+
+    # In-memory emergency cards: how often each worker picks up other workers' changes, and rebuilds in full,
+    # and how long a lookup in a worker that has not loaded yet waits before answering "unavailable".
+    EMERGENCY_CARDS_SYNC_SECONDS = float(os.getenv("EMERGENCY_CARDS_SYNC_SECONDS", "30"))
+    EMERGENCY_CARDS_RELOAD_SECONDS = float(os.getenv("EMERGENCY_CARDS_RELOAD_SECONDS", "3600"))
+    EMERGENCY_CARDS_COLD_WAIT_SECONDS = float(os.getenv("EMERGENCY_CARDS_COLD_WAIT_SECONDS", "2"))
+
+    # Process pool for record thumbnails and text excerpts; 0 renders inline.
+    PREVIEW_WORKERS = int(os.getenv("PREVIEW_WORKERS", "2"))
+    PREVIEW_MAX_PX = int(os.getenv("PREVIEW_MAX_PX", "320"))
+    PREVIEW_EXCERPT_CHARS = int(os.getenv("PREVIEW_EXCERPT_CHARS", "600"))
+
 
 class DevelopmentConfig(BaseConfig):
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL", "sqlite:///healthcare_dev.sqlite3")
 
+    LAZY_LOAD_DETECTION = os.getenv("LAZY_LOAD_DETECTION", "log")
+    QUERY_STATS_HEADERS = True
+
+
+class TestingConfig(BaseConfig):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL", "sqlite://")
+
+    AUDIT_ASYNC = False
+    COUNTERS_CACHE_TTL = 0
+    PREVIEW_WORKERS = 0
+    LAZY_LOAD_DETECTION = "raise"
+    QUERY_STATS_HEADERS = True
+    QUERY_BUDGET_ENFORCE = True
+
 
 class ProductionConfig(BaseConfig):
     db_user = os.getenv("MYSQL_USER", "")
@@ -28,5 +103,6 @@ class ProductionConfig(BaseConfig):
 
 CONFIG_BY_NAME = {
     "development": DevelopmentConfig,
+    "testing": TestingConfig,
     "production": ProductionConfig,
 }
@@ -8,6 +8,10 @@ from app.models.organization import Organization
 from app.models.medical_record import MedicalRecord
 from app.models.patient import Patient
 from app.models.prescription import Prescription
+from app.models.prescription_event import PrescriptionEvent
+from app.models.prescription_status_count import PrescriptionStatusCount
+from app.models.record_blob import RecordBlob
+from app.models.summary_count import SummaryCount
 from app.models.user import User
 
 __all__ = [
@@ -17,9 +21,13 @@ __all__ = [
     "DoctorFeedback",
     "Organization",
     "MedicalRecord",
+    "RecordBlob",
     "Consent",
     "Appointment",
     "AuditEvent",
     "Prescription",
+    "PrescriptionEvent",
+    "PrescriptionStatusCount",
     "AuditLog",
+    "SummaryCount",
 ]
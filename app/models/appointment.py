@@ -47,5 +47,12 @@ class Appointment(db.Model):
         passive_deletes=True,
     )
 
+    # Per-patient and per-doctor timelines, newest or soonest first.
+    __table_args__ = (
+        db.Index("ix_appointments_patient_id_scheduled_at", "patient_id", "scheduled_at"),
+        db.Index("ix_appointments_doctor_id_scheduled_at", "doctor_id", "scheduled_at"),
+        db.Index("ix_appointments_doctor_id_patient_id_scheduled_at", "doctor_id", "patient_id", "scheduled_at"),
+    )
+
     def __repr__(self) -> str:
         return f"<Appointment id={self.id} patient_id={self.patient_id} doctor_id={self.doctor_id} status={self.status}>"
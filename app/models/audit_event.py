@@ -46,5 +46,9 @@ class AuditEvent(db.Model):
 
     actor = db.relationship("User")
 
+    __table_args__ = (
+        db.Index("ix_audit_events_patient_id_timestamp", "patient_id", "timestamp"),
+    )
+
     def __repr__(self) -> str:
         return f"<AuditEvent id={self.id} patient_id={self.patient_id} action={self.action} entity={self.entity}>"
@@ -19,9 +19,15 @@ class AuditLog(db.Model):
 
     action = db.Column(db.String(128), nullable=False, index=True)
     entity = db.Column(db.String(128), nullable=False, index=True)
+    # The row the action touched, when there is one; older rows have NULL.
+    entity_id = db.Column(db.Integer, nullable=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
 
     actor = db.relationship("User", back_populates="audit_logs")
 
+    __table_args__ = (
+        db.Index("ix_audit_logs_entity_entity_id", "entity", "entity_id"),
+    )
+
     def __repr__(self) -> str:
         return f"<AuditLog id={self.id} actor_id={self.actor_id} action={self.action} entity={self.entity}>"
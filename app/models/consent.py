@@ -34,6 +34,8 @@ class Consent(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint("patient_id", "organization_id", name="uq_consent_patient_org"),
+        # Covers the doctor-side "active patients of my organization" lookup without touching the table.
+        db.Index("ix_consents_organization_id_revoked_at_patient_id", "organization_id", "revoked_at", "patient_id"),
     )
 
     @property
@@ -15,7 +15,7 @@ class Doctor(db.Model):
         index=True,
     )
 
-    specialization = db.Column(db.String(128), nullable=False)
+    specialization = db.Column(db.String(128), nullable=False, index=True)
     hospital_id = db.Column(db.String(64), nullable=True, index=True)
 
     user = db.relationship("User", back_populates="doctor")
@@ -33,6 +33,7 @@ class DoctorFeedback(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint("doctor_id", "patient_id", name="uq_feedback_doctor_patient"),
+        db.Index("ix_doctor_feedback_doctor_id_created_at", "doctor_id", "created_at"),
     )
 
     def __repr__(self) -> str:
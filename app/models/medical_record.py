@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import os
 from datetime import datetime
 
 from app.extensions import db
@@ -34,11 +35,32 @@ class MedicalRecord(db.Model):
     file_path = db.Column(db.String(512), nullable=False)
     description = db.Column(db.String(255), nullable=True)
 
+    size_bytes = db.Column(db.BigInteger, nullable=True)
+    sha256 = db.Column(
+        db.String(64),
+        db.ForeignKey("record_blobs.sha256", ondelete="RESTRICT"),
+        nullable=True,
+        index=True,
+    )
+    # Copied from the blob so downloads need no join.
+    codec = db.Column(db.String(16), nullable=True)
+
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
 
     patient = db.relationship("Patient", back_populates="medical_records")
     appointment = db.relationship("Appointment")
     created_by = db.relationship("User")
+    blob = db.relationship("RecordBlob", back_populates="records")
+
+    __table_args__ = (
+        db.Index("ix_medical_records_patient_id_uploaded_at", "patient_id", "uploaded_at"),
+        db.Index("ix_medical_records_patient_id_appointment_id_uploaded_at", "patient_id", "appointment_id", "uploaded_at"),
+    )
+
+    @property
+    def download_name(self) -> str:
+        ext = os.path.splitext(self.file_path)[1]
+        return f"record-{self.id}{ext}"
 
     def __repr__(self) -> str:
         return f"<MedicalRecord id={self.id} patient_id={self.patient_id}>"
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from datetime import datetime
+
 from app.extensions import db
 
 
@@ -16,6 +18,9 @@ class Patient(db.Model):
     chronic_conditions = db.Column(db.Text, nullable=True)
     emergency_contacts = db.Column(db.Text, nullable=True)
 
+    # Bumped whenever the patient's emergency card may have changed, including its user's email or phone.
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False, index=True)
+
     user = db.relationship("User", back_populates="patient")
 
     medical_records = db.relationship(
@@ -21,11 +21,18 @@ class Prescription(db.Model):
     issued_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
     notes = db.Column(db.Text, nullable=True)
 
-    pharmacy_id = db.Column(db.String(64), nullable=True, index=True)
+    # The pharmacy user the prescription is routed to.
+    pharmacy_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
     fulfillment_status = db.Column(db.String(32), nullable=False, default="pending", index=True)
     delivery_status = db.Column(db.String(32), nullable=False, default="not_started", index=True)
 
     appointment = db.relationship("Appointment", back_populates="prescription")
+    pharmacy = db.relationship("User")
+
+    __table_args__ = (
+        # Pharmacy queue tabs: one pharmacy, one status, in issue order.
+        db.Index("ix_prescriptions_pharmacy_id_fulfillment_status_issued_at", "pharmacy_id", "fulfillment_status", "issued_at"),
+    )
 
     def __repr__(self) -> str:
         return f"<Prescription id={self.id} appointment_id={self.appointment_id} status={self.fulfillment_status}>"
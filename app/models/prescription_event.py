@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from app.extensions import db
+
+
+class PrescriptionEvent(db.Model):
+    """Append-only history of a prescription's lifecycle; rows are only ever inserted.
+
+    ``kind`` is ``issued``, ``fulfillment``, ``delivery``, ``reassigned`` or ``edited``. The statuses are
+    of the field that changed (the fulfillment status for the others), and ``pharmacy_id``
+    is the pharmacy the prescription belonged to after the event.
+    """
+
+    __tablename__ = "prescription_events"
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    prescription_id = db.Column(
+        db.Integer,
+        db.ForeignKey("prescriptions.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    actor_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    pharmacy_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    # Set on ``reassigned`` events only: the pharmacy the prescription was taken from.
+    previous_pharmacy_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+
+    kind = db.Column(db.String(32), nullable=False)
+    from_status = db.Column(db.String(32), nullable=True)
+    to_status = db.Column(db.String(32), nullable=False)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # A prescription's history, in order.
+        db.Index("ix_prescription_events_prescription_id_created_at", "prescription_id", "created_at"),
+        # A pharmacy's change feed: its events after a given id, including those that took work away.
+        db.Index("ix_prescription_events_pharmacy_id_id", "pharmacy_id", "id"),
+        db.Index("ix_prescription_events_previous_pharmacy_id_id", "previous_pharmacy_id", "id"),
+    )
+
+    def __repr__(self) -> str:
+        return f"<PrescriptionEvent id={self.id} prescription_id={self.prescription_id} {self.kind} {self.from_status}->{self.to_status}>"
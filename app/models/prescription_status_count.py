@@ -0,0 +1,19 @@
+from __future__ import annotations
+
+from app.extensions import db
+
+
+class PrescriptionStatusCount(db.Model):
+    """Number of prescriptions per pharmacy and fulfillment status, kept in step by the lifecycle engine.
+
+    ``pharmacy_id`` is 0 for prescriptions that are not routed to a pharmacy, so it is not a foreign key.
+    """
+
+    __tablename__ = "prescription_status_counts"
+
+    pharmacy_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    status = db.Column(db.String(32), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        return f"<PrescriptionStatusCount pharmacy_id={self.pharmacy_id} status={self.status} count={self.count}>"
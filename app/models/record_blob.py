@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from app.extensions import db
+
+
+class RecordBlob(db.Model):
+    """One stored file per distinct content; medical records point at it by hash."""
+
+    __tablename__ = "record_blobs"
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    path = db.Column(db.String(512), nullable=False, unique=True)
+    size_bytes = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0, index=True)
+    # How the file at ``path`` is encoded; NULL means stored as uploaded. ``size_bytes`` is always the original size.
+    codec = db.Column(db.String(16), nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    records = db.relationship("MedicalRecord", back_populates="blob", passive_deletes=True)
+
+    def __repr__(self) -> str:
+        return f"<RecordBlob sha256={self.sha256[:12]} refs={self.ref_count}>"
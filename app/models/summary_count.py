@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from app.extensions import db
+
+
+class SummaryCount(db.Model):
+    """Precomputed row counts for the admin overview, one row per key (see app/utils/counters.py)."""
+
+    __tablename__ = "summary_counts"
+
+    key = db.Column(db.String(128), primary_key=True)
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<SummaryCount {self.key}={self.count}>"
@@ -14,10 +14,10 @@ class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(255), unique=True, index=True, nullable=False)
     name = db.Column(db.String(128), nullable=True)
-    phone = db.Column(db.String(32), nullable=True)
+    phone = db.Column(db.String(32), nullable=True, index=True)
     password_hash = db.Column(db.String(255), nullable=False)
     role = db.Column(db.String(32), index=True, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
 
     patient = db.relationship(
         "Patient",
@@ -41,6 +41,11 @@ class User(db.Model, UserMixin):
         passive_deletes=True,
     )
 
+    __table_args__ = (
+        # Admin directory filtered to one role, newest first.
+        db.Index("ix_users_role_created_at", "role", "created_at"),
+    )
+
     def set_password(self, password: str) -> None:
         self.password_hash = generate_password_hash(password)
 
@@ -49,3 +54,7 @@ class User(db.Model, UserMixin):
 
     def __repr__(self) -> str:
         return f"<User id={self.id} email={self.email} role={self.role}>"
+
+
+# Admin directory search matches name prefixes regardless of case.
+db.Index("ix_users_name_lower", db.func.lower(User.name))
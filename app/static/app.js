@@ -105,9 +105,84 @@
     }
   }
 
+  function initPharmacyQueueFeed() {
+    const queue = document.getElementById('pharmacyQueue');
+    if (!queue || !queue.dataset.feedUrl || !window.EventSource) return;
+
+    const tab = queue.dataset.tab;
+    const newestFirst = queue.dataset.newestFirst === '1';
+    const firstPage = queue.dataset.firstPage === '1';
+    const hasMore = queue.dataset.hasMore === '1';
+    const source = new EventSource(queue.dataset.feedUrl);
+
+    source.addEventListener('prescription', (e) => {
+      const data = JSON.parse(e.data);
+      Object.entries(data.counts || {}).forEach(([key, count]) => {
+        const el = document.querySelector(`[data-queue-count="${key}"]`);
+        if (el) el.textContent = count;
+      });
+
+      const card = queue.querySelector(`[data-prescription-id="${data.id}"]`);
+      if (data.tab !== tab) {
+        if (card) card.remove();
+        return;
+      }
+      const tpl = document.createElement('template');
+      tpl.innerHTML = data.html.trim();
+      const fresh = tpl.content.firstElementChild;
+      if (card) {
+        const selected = card.querySelector('[data-bulk-select]');
+        const keep = fresh.querySelector('[data-bulk-select]');
+        if (selected && keep) keep.checked = selected.checked;
+        card.replaceWith(fresh);
+      } else if (newestFirst ? firstPage : !hasMore) {
+        // New work only belongs on this page if it is the end of the list it would sort into.
+        const empty = queue.querySelector('[data-queue-empty]');
+        if (empty) empty.remove();
+        if (newestFirst) queue.prepend(fresh);
+        else queue.append(fresh);
+      }
+    });
+  }
+
+  function initBulkSelect() {
+    const form = document.getElementById('bulkUpdate');
+    if (!form) return;
+
+    const all = form.querySelector('[data-bulk-select-all]');
+    const counter = form.querySelector('[data-bulk-selected]');
+    const submit = form.querySelector('[data-bulk-submit]');
+    const boxes = () => Array.from(document.querySelectorAll('[data-bulk-select]'));
+
+    function refresh() {
+      const checked = boxes().filter((b) => b.checked).length;
+      counter.textContent = checked;
+      submit.disabled = checked === 0;
+      all.checked = checked > 0 && checked === boxes().length;
+    }
+
+    all.addEventListener('change', () => {
+      boxes().forEach((b) => {
+        b.checked = all.checked;
+      });
+      refresh();
+    });
+    // Delegated, so cards added by the live feed take part too.
+    document.addEventListener('change', (e) => {
+      if (e.target.matches('[data-bulk-select]')) refresh();
+    });
+    new MutationObserver(refresh).observe(document.getElementById('pharmacyQueue') || form, { childList: true });
+  }
+
+  function init() {
+    initLandingEnhancements();
+    initPharmacyQueueFeed();
+    initBulkSelect();
+  }
+
   if (document.readyState === 'loading') {
-    document.addEventListener('DOMContentLoaded', initLandingEnhancements);
+    document.addEventListener('DOMContentLoaded', init);
   } else {
-    initLandingEnhancements();
+    init();
   }
 })();
@@ -1,18 +1,216 @@
 from __future__ import annotations
 
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from flask import Flask, g, has_request_context
 from flask_login import current_user
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
 
 from app.extensions import db
 from app.models import AuditEvent, AuditLog
 
 
-def log_action(action: str, entity: str) -> None:
-    actor_id = None
+class AuditWriter:
+    """Buffers audit rows in a bounded queue and bulk-inserts them from a flusher thread.
+
+    With ``AUDIT_ASYNC`` disabled every row is written and committed inline, which keeps
+    tests deterministic.
+    """
+
+    def __init__(self) -> None:
+        self.app: Flask | None = None
+        self.async_mode = False
+        self.batch_size = 200
+        self.flush_interval = 0.5
+        self.enqueue_timeout = 1.0
+        self._queue: queue.Queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app: Flask) -> None:
+        self.app = app
+        self.async_mode = bool(app.config.get("AUDIT_ASYNC", False))
+        self.batch_size = int(app.config.get("AUDIT_BATCH_SIZE", 200))
+        self.flush_interval = float(app.config.get("AUDIT_FLUSH_INTERVAL", 0.5))
+        self.enqueue_timeout = float(app.config.get("AUDIT_ENQUEUE_TIMEOUT", 1.0))
+        self._queue = queue.Queue(maxsize=int(app.config.get("AUDIT_QUEUE_SIZE", 10000)))
+        app.extensions["audit_writer"] = self
+        app.after_request(_hand_off_request_rows)
+        if not event.contains(db.session, "before_commit", _flush_request_rows):
+            event.listen(db.session, "before_commit", _flush_request_rows)
+        atexit.register(self.shutdown)
+
+    def submit(self, model: type, row: dict) -> None:
+        self.submit_many([(model, row)])
+
+    def submit_many(self, batch: list[tuple[type, dict]]) -> None:
+        if not self.async_mode:
+            self._write_inline(batch)
+            return
+
+        self._ensure_started()
+        for i, item in enumerate(batch):
+            try:
+                self._queue.put(item, timeout=self.enqueue_timeout)
+            except queue.Full:
+                # Backpressure: the flusher is behind, so the caller pays for its own write.
+                self._write_batch(batch[i:])
+                return
+
+    def flush(self) -> None:
+        """Synchronously drain everything queued so far."""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._write_batch(batch)
+                batch = []
+        if batch:
+            self._write_batch(batch)
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join(timeout=max(self.flush_interval * 4, 5.0))
+        if self.app is not None:
+            self.flush()
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            # After a fork the parent's thread is gone; start a fresh one in this process.
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._write_batch(batch)
+
+    def _write_batch(self, batch: list[tuple[type, dict]]) -> None:
+        with self.app.app_context():
+            try:
+                _insert_rows(db.session, batch)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception("Failed to write %d audit rows", len(batch))
+
+    def _write_inline(self, batch: list[tuple[type, dict]]) -> None:
+        _insert_rows(db.session, batch)
+        db.session.commit()
+
+
+def _insert_rows(session: Session, batch: list[tuple[type, dict]]) -> None:
+    rows_by_model: dict[type, list[dict]] = {}
+    for model, row in batch:
+        rows_by_model.setdefault(model, []).append(row)
+
+    for model, rows in rows_by_model.items():
+        session.execute(insert(model), rows)
+
+
+audit_writer = AuditWriter()
+
+
+def _pop_request_rows() -> list[tuple[type, dict]]:
+    rows = g.get("audit_rows") or []
+    g.audit_rows = []
+    return rows
+
+
+def _flush_request_rows(session: Session) -> None:
+    # Rows logged during a request ride along with the request's own commit.
+    if not has_request_context() or not g.get("audit_rows"):
+        return
+    session.flush()
+    _insert_rows(session, _pop_request_rows())
+
+
+def _hand_off_request_rows(response):
+    # Read-only requests never commit; their rows go through the writer instead.
+    rows = _pop_request_rows()
+    if rows:
+        audit_writer.submit_many(rows)
+    return response
+
+
+def _record(model: type, row: dict) -> None:
+    if has_request_context():
+        g.setdefault("audit_rows", []).append((model, row))
+    else:
+        audit_writer.submit(model, row)
+
+
+def _actor_id() -> int | None:
     if getattr(current_user, "is_authenticated", False):
-        actor_id = current_user.id
+        return current_user.id
+    return None
 
-    db.session.add(AuditLog(actor_id=actor_id, action=action, entity=entity))
-    db.session.commit()
+
+def log_action(action: str, entity: str, entity_id: int | None = None) -> None:
+    _record(
+        AuditLog,
+        {
+            "actor_id": _actor_id(),
+            "action": action,
+            "entity": entity,
+            "entity_id": entity_id,
+            "timestamp": datetime.utcnow(),
+        },
+    )
+
+
+def _event_row(
+    action: str,
+    entity: str,
+    patient_id: int,
+    doctor_id: int | None,
+    organization_id: int | None,
+    entity_id: int | None,
+) -> dict:
+    return {
+        "actor_id": _actor_id(),
+        "patient_id": patient_id,
+        "doctor_id": doctor_id,
+        "organization_id": organization_id,
+        "action": action,
+        "entity": entity,
+        "entity_id": entity_id,
+        "timestamp": datetime.utcnow(),
+    }
 
 
 def log_event(
@@ -23,19 +221,22 @@ def log_event(
     organization_id: int | None = None,
     entity_id: int | None = None,
 ) -> None:
-    actor_id = None
-    if getattr(current_user, "is_authenticated", False):
-        actor_id = current_user.id
-
-    db.session.add(
-        AuditEvent(
-            actor_id=actor_id,
-            patient_id=patient_id,
-            doctor_id=doctor_id,
-            organization_id=organization_id,
-            action=action,
-            entity=entity,
-            entity_id=entity_id,
+    _record(AuditEvent, _event_row(action, entity, patient_id, doctor_id, organization_id, entity_id))
+
+
+def log_events(
+    action: str,
+    entity: str,
+    patient_id: int,
+    entity_ids: list[int],
+    doctor_id: int | None = None,
+    organization_id: int | None = None,
+) -> None:
+    """Write one event per entity as a single batch, straight to the writer.
+
+    For work that outlives the request's own commit, such as a streamed response body.
+    """
+    if entity_ids:
+        audit_writer.submit_many(
+            [(AuditEvent, _event_row(action, entity, patient_id, doctor_id, organization_id, eid)) for eid in entity_ids]
         )
-    )
-    db.session.commit()
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import NamedTuple
+
+from flask import Flask
+from sqlalchemy import and_, func, or_, select
+
+from app.extensions import db
+from app.models import PrescriptionEvent
+
+
+class Change(NamedTuple):
+    version: int
+    pharmacy_id: int
+    prescription_id: int
+
+
+class ChangeFeed:
+    """Prescription changes per pharmacy, read from ``prescription_events``.
+
+    Every lifecycle change writes its events in the same transaction, so an event id is a version
+    that every worker agrees on and a stream can resume from any of them, whichever worker serves
+    it. Streams poll for other workers' changes every ``CHANGE_FEED_POLL_SECONDS``; ``publish``
+    wakes the streams in this worker at once.
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._generation = 0
+        self.poll_interval = 2.0
+        self.lookback = 1000
+
+    def init_app(self, app: Flask) -> None:
+        self.poll_interval = float(app.config.get("CHANGE_FEED_POLL_SECONDS", 2))
+        self.lookback = int(app.config.get("CHANGE_FEED_LOOKBACK", 1000))
+        app.extensions["change_feed"] = self
+
+    def current_version(self) -> int:
+        return db.session.execute(select(func.max(PrescriptionEvent.id))).scalar() or 0
+
+    def publish(self) -> None:
+        """Wake this worker's streams after a commit that wrote prescription events."""
+        with self._cond:
+            self._generation += 1
+            self._cond.notify_all()
+
+    def subscribe(self, pharmacy_id: int, since: int) -> Subscription:
+        return Subscription(self, pharmacy_id, since)
+
+    def _read(self, pharmacy_id: int, after: int) -> list[Change]:
+        e = PrescriptionEvent
+        # Spelled as two index ranges so both databases can read (pharmacy_id, id) and (previous_pharmacy_id, id).
+        rows = db.session.execute(
+            select(e.id, e.prescription_id)
+            .where(
+                or_(
+                    and_(e.pharmacy_id == pharmacy_id, e.id > after),
+                    and_(e.previous_pharmacy_id == pharmacy_id, e.id > after),
+                )
+            )
+            .order_by(e.id)
+        ).all()
+        # End the read transaction, or a repeatable-read snapshot would hide every later commit.
+        db.session.rollback()
+        return [Change(event_id, pharmacy_id, prescription_id) for event_id, prescription_id in rows]
+
+
+class Subscription:
+    """One stream's position in the feed.
+
+    Ids are handed out before commit, so a lower id can become visible after a higher one was
+    read. Each poll re-reads the last ``CHANGE_FEED_LOOKBACK`` ids and skips the ones already
+    delivered, so such late commits are still picked up.
+    """
+
+    def __init__(self, feed: ChangeFeed, pharmacy_id: int, since: int) -> None:
+        self.feed = feed
+        self.pharmacy_id = pharmacy_id
+        self.position = since
+        # Everything up to ``since`` was on the page, or in an earlier stream, already.
+        self._start = since
+        self._seen: set[int] = set()
+
+    def wait(self, timeout: float) -> list[Change]:
+        """Changes not delivered yet, blocking up to ``timeout`` seconds while there are none."""
+        feed = self.feed
+        deadline = time.monotonic() + timeout
+        while True:
+            with feed._cond:
+                generation = feed._generation
+            changes = self._poll()
+            remaining = deadline - time.monotonic()
+            if changes or remaining <= 0:
+                return changes
+            with feed._cond:
+                if feed._generation == generation:
+                    feed._cond.wait(min(remaining, feed.poll_interval))
+
+    def _poll(self) -> list[Change]:
+        floor = max(self._start, self.position - self.feed.lookback)
+        changes = [c for c in self.feed._read(self.pharmacy_id, floor) if c.version not in self._seen]
+        if changes:
+            self.position = max(self.position, changes[-1].version)
+            floor = max(self._start, self.position - self.feed.lookback)
+            self._seen = {v for v in self._seen if v > floor}
+            self._seen.update(c.version for c in changes)
+        return changes
+
+
+change_feed = ChangeFeed()
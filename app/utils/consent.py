@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from typing import NamedTuple
+
+from flask import current_app
+from flask_login import current_user
+
+from app.extensions import db
+from app.models import Consent, Patient
+from app.utils.cache import TTLCache
+
+
+class ConsentDecision(NamedTuple):
+    patient_id: int
+    organization_id: int
+    active: bool
+    can_view_history: bool
+    can_add_record: bool
+
+
+_decisions = TTLCache(ttl=5.0, maxsize=4096)
+
+
+def doctor_organization_id() -> int | None:
+    return getattr(current_user, "organization_id", None)
+
+
+def resolve_consent(organization_id: int | None, patient_id: int) -> ConsentDecision | None:
+    """Return the organization's consent decision for a patient, or None if the patient does not exist."""
+    if organization_id is None:
+        return None
+
+    key = (organization_id, patient_id)
+    decision = _decisions.get(key)
+    if decision is not None:
+        return decision
+
+    consent = Consent.query.filter_by(patient_id=patient_id, organization_id=organization_id).first()
+    if consent is None:
+        if db.session.get(Patient, patient_id) is None:
+            return None
+        decision = ConsentDecision(patient_id, organization_id, False, False, False)
+    else:
+        decision = ConsentDecision(
+            patient_id,
+            organization_id,
+            consent.is_active,
+            bool(consent.can_view_history),
+            bool(consent.can_add_record),
+        )
+
+    _decisions.set(key, decision, ttl=current_app.config.get("CONSENT_CACHE_TTL", _decisions.ttl))
+    return decision
+
+
+def invalidate_consent(organization_id: int, patient_id: int) -> None:
+    _decisions.pop((organization_id, patient_id))
@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from flask import Flask
+from sqlalchemy import delete, event, func, insert, inspect, select, text, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.extensions import db
+from app.models import AuditLog, Doctor, Organization, SummaryCount, User
+from app.utils.cache import TTLCache
+
+
+USERS = "users"
+DOCTORS = "doctors"
+AUDIT_LOGS = "audit_logs"
+# Highest audit_logs.id already folded into the per-day counts; kept in the row's ``count``.
+AUDIT_WATERMARK = "audit_logs.counted_through"
+# Ids below the watermark not visible when it passed them; keyed by the first id, ``count`` is the last.
+AUDIT_GAP_PREFIX = "audit_logs.gap:"
+
+ROLE_PREFIX = "users.role:"
+SIGNUP_DAY_PREFIX = "users.day:"
+ORG_PREFIX = "doctors.org:"
+AUDIT_DAY_PREFIX = "audit_logs.day:"
+
+
+def _day(value: date | datetime | str | None) -> str:
+    if value is None:
+        value = datetime.utcnow()
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.isoformat() if isinstance(value, date) else str(value)[:10]
+
+
+def role_key(role: str) -> str:
+    return f"{ROLE_PREFIX}{role}"
+
+
+def org_key(organization_id: int | None) -> str:
+    # Doctors without an organization are counted under 0.
+    return f"{ORG_PREFIX}{organization_id or 0}"
+
+
+def signup_day_key(day) -> str:
+    return f"{SIGNUP_DAY_PREFIX}{_day(day)}"
+
+
+def audit_day_key(day) -> str:
+    return f"{AUDIT_DAY_PREFIX}{_day(day)}"
+
+
+def audit_gap_key(first_id: int) -> str:
+    return f"{AUDIT_GAP_PREFIX}{first_id}"
+
+
+def bump(connection, deltas: Counter) -> None:
+    """Add ``deltas`` to their summary rows in the caller's transaction, creating rows as needed."""
+    table = SummaryCount.__table__
+    now = datetime.utcnow()
+    # A fixed order keeps two transactions touching the same rows from deadlocking.
+    for key, delta in sorted(deltas.items()):
+        if not delta:
+            continue
+        add = update(table).where(table.c.key == key).values(count=table.c.count + delta, updated_at=now)
+        if connection.execute(add).rowcount:
+            continue
+        try:
+            with connection.begin_nested():
+                connection.execute(insert(table).values(key=key, count=delta, updated_at=now))
+        except IntegrityError:
+            # A concurrent writer created the row first.
+            connection.execute(add)
+
+
+# Users and doctors change rarely, so their counts are kept exact as rows are written. Rows removed
+# by database-level cascades skip these hooks; scripts/reconcile_counters.py repairs that drift.
+
+
+def _load_old_value(target, value, oldvalue, initiator):
+    return value
+
+
+# Without active history, assigning to an attribute expired by a commit would record no old value.
+event.listen(User.role, "set", _load_old_value, active_history=True, retval=True)
+event.listen(Doctor.organization_id, "set", _load_old_value, active_history=True, retval=True)
+
+
+def _user_deltas(user: User, sign: int) -> Counter:
+    return Counter({USERS: sign, role_key(user.role): sign, signup_day_key(user.created_at): sign})
+
+
+@event.listens_for(User, "after_insert")
+def _user_inserted(mapper, connection, target: User) -> None:
+    bump(connection, _user_deltas(target, 1))
+
+
+@event.listens_for(User, "after_delete")
+def _user_deleted(mapper, connection, target: User) -> None:
+    bump(connection, _user_deltas(target, -1))
+
+
+@event.listens_for(User, "after_update")
+def _user_updated(mapper, connection, target: User) -> None:
+    history = inspect(target).attrs.role.history
+    if history.deleted and history.added and history.deleted[0] != history.added[0]:
+        bump(connection, Counter({role_key(history.deleted[0]): -1, role_key(history.added[0]): 1}))
+
+
+@event.listens_for(Doctor, "after_insert")
+def _doctor_inserted(mapper, connection, target: Doctor) -> None:
+    bump(connection, Counter({DOCTORS: 1, org_key(target.organization_id): 1}))
+
+
+@event.listens_for(Doctor, "after_delete")
+def _doctor_deleted(mapper, connection, target: Doctor) -> None:
+    bump(connection, Counter({DOCTORS: -1, org_key(target.organization_id): -1}))
+
+
+@event.listens_for(Doctor, "after_update")
+def _doctor_updated(mapper, connection, target: Doctor) -> None:
+    history = inspect(target).attrs.organization_id.history
+    # A new doctor flushed without an organization has no deleted value; it was NULL.
+    old = history.deleted[0] if history.deleted else None
+    if history.added and old != history.added[0]:
+        bump(connection, Counter({org_key(old): -1, org_key(history.added[0]): 1}))
+
+
+def missing_audit_ids(session: Session, first: int, last: int) -> list[tuple[int, int]]:
+    """Inclusive ranges of ids in ``first..last`` that have no visible audit row."""
+    ranges = []
+    expected = first
+    ids = session.execute(
+        select(AuditLog.id).where(AuditLog.id.between(first, last)).order_by(AuditLog.id).execution_options(yield_per=5000)
+    )
+    for (audit_id,) in ids:
+        if audit_id > expected:
+            ranges.append((expected, audit_id - 1))
+        expected = audit_id + 1
+    if expected <= last:
+        ranges.append((expected, last))
+    return ranges
+
+
+def record_audit_gaps(session: Session, ranges, noticed: datetime) -> None:
+    table = SummaryCount.__table__
+    for start, end in ranges:
+        session.execute(insert(table).values(key=audit_gap_key(start), count=end, updated_at=noticed))
+
+
+def reconcile_audit_logs(session: Session, gap_seconds: float) -> int:
+    """Fold audit rows written since the last run into the per-day counts. Returns rows counted.
+
+    Audit rows are inserted far too often to bump a shared counter on every write, so they are
+    counted afterwards by walking the primary key from a watermark. Ids are handed out before
+    commit, so a row can become visible after a higher id was counted. Ids the watermark passed
+    without seeing are kept as gap rows and rechecked on every run for ``gap_seconds``, after
+    which they are taken to be rolled back.
+    """
+    table = SummaryCount.__table__
+    now = datetime.utcnow()
+    # Locked, so concurrent runs take turns and each sees the watermark and gaps the last one left.
+    last = session.execute(select(table.c.count).where(table.c.key == AUDIT_WATERMARK).with_for_update()).scalar()
+    if last is None:
+        try:
+            with session.begin_nested():
+                session.execute(insert(table).values(key=AUDIT_WATERMARK, count=0, updated_at=now))
+        except IntegrityError:
+            # A concurrent first run created it; whatever it did not count is counted next time.
+            return 0
+        last = 0
+
+    deltas: Counter = Counter()
+    day = func.date(AuditLog.timestamp)
+
+    def count(*where) -> int:
+        rows = session.execute(select(day, func.count(AuditLog.id)).where(*where).group_by(day)).all()
+        for d, n in rows:
+            deltas[audit_day_key(d)] += n
+            deltas[AUDIT_LOGS] += n
+        return sum(n for _d, n in rows)
+
+    cutoff = now - timedelta(seconds=gap_seconds)
+    gaps = session.execute(
+        select(table.c.key, table.c.count, table.c.updated_at).where(table.c.key.like(f"{AUDIT_GAP_PREFIX}%"))
+    ).all()
+    for key, end, noticed in gaps:
+        start = int(key[len(AUDIT_GAP_PREFIX):])
+        found = count(AuditLog.id.between(start, end))
+        expired = noticed < cutoff
+        if not found and not expired:
+            continue
+        session.execute(delete(table).where(table.c.key == key))
+        if found and not expired:
+            record_audit_gaps(session, missing_audit_ids(session, start, end), noticed)
+
+    upper = session.execute(select(func.max(AuditLog.id))).scalar() or 0
+    if upper > last:
+        if count(AuditLog.id > last, AuditLog.id <= upper) < upper - last:
+            record_audit_gaps(session, missing_audit_ids(session, last + 1, upper), now)
+        session.execute(update(table).where(table.c.key == AUDIT_WATERMARK).values(count=upper, updated_at=now))
+
+    bump(session.connection(), deltas)
+    return deltas[AUDIT_LOGS]
+
+
+def approximate_count(session: Session, table_name: str) -> int | None:
+    """Row count from the database's table statistics, or None when it keeps none."""
+    dialect = session.get_bind().dialect.name
+    try:
+        if dialect == "mysql":
+            value = session.execute(
+                text("SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :t"),
+                {"t": table_name},
+            ).scalar()
+            return int(value) if value is not None else None
+        if dialect == "sqlite":
+            # Filled in by ANALYZE; the first number of each stat is the table's row count.
+            stat = session.execute(text("SELECT stat FROM sqlite_stat1 WHERE tbl = :t LIMIT 1"), {"t": table_name}).scalar()
+            return int(stat.split()[0]) if stat else None
+    except SQLAlchemyError:
+        return None
+    return None
+
+
+class Counters:
+    """Admin overview numbers, read from ``summary_counts`` and cached in-process for ``COUNTERS_CACHE_TTL``.
+
+    With ``COUNTERS_APPROXIMATE`` the table totals come from the database's statistics instead,
+    which costs nothing even when the summary rows have not been bootstrapped. Audit counts are as
+    fresh as the last ``scripts/reconcile_counters.py --audit`` run; schedule it every minute or so.
+    """
+
+    def __init__(self) -> None:
+        self.approximate = False
+        self.days = 14
+        self._cache = TTLCache(ttl=30.0, maxsize=4)
+
+    def init_app(self, app: Flask) -> None:
+        self.approximate = bool(app.config.get("COUNTERS_APPROXIMATE", False))
+        self.days = int(app.config.get("COUNTERS_DAYS", 14))
+        self._cache = TTLCache(ttl=float(app.config.get("COUNTERS_CACHE_TTL", 30)), maxsize=4)
+        app.extensions["counters"] = self
+
+    def overview(self) -> dict:
+        data = self._cache.get("overview")
+        if data is None:
+            data = self._compute()
+            self._cache.set("overview", data)
+        return data
+
+    def invalidate(self) -> None:
+        self._cache.clear()
+
+    def _compute(self) -> dict:
+        # Only reads summary rows; new audit rows are folded in by ``reconcile_counters.py --audit``.
+        with Session(db.engine) as session:
+            table = SummaryCount.__table__
+            today = datetime.utcnow().date()
+            first_day = today - timedelta(days=self.days - 1)
+            values: dict[str, int] = {}
+            for where in (
+                table.c.key.in_((USERS, DOCTORS, AUDIT_LOGS)),
+                table.c.key.like(f"{ROLE_PREFIX}%"),
+                table.c.key.like(f"{ORG_PREFIX}%"),
+                table.c.key.between(signup_day_key(first_day), signup_day_key(today)),
+                table.c.key.between(audit_day_key(first_day), audit_day_key(today)),
+            ):
+                values.update(session.execute(select(table.c.key, table.c.count).where(where)).all())
+
+            totals = {key: int(values.get(key, 0)) for key in (USERS, DOCTORS, AUDIT_LOGS)}
+            approximate = False
+            if self.approximate:
+                for key in totals:
+                    estimate = approximate_count(session, key)
+                    if estimate is not None:
+                        totals[key] = estimate
+                        approximate = True
+
+            org_counts = {
+                int(key[len(ORG_PREFIX):]): n for key, n in values.items() if key.startswith(ORG_PREFIX) and n
+            }
+            names = dict(
+                session.execute(select(Organization.id, Organization.name).where(Organization.id.in_(org_counts))).all()
+            )
+
+        days = [first_day + timedelta(days=i) for i in range(self.days)]
+        return {
+            **totals,
+            "approximate": approximate,
+            "roles": sorted(
+                ((key[len(ROLE_PREFIX):], n) for key, n in values.items() if key.startswith(ROLE_PREFIX) and n),
+                key=lambda item: -item[1],
+            ),
+            "organizations": sorted(
+                ((names.get(org_id, "No organization"), n) for org_id, n in org_counts.items()),
+                key=lambda item: -item[1],
+            ),
+            "days": [
+                (d.isoformat(), int(values.get(signup_day_key(d), 0)), int(values.get(audit_day_key(d), 0)))
+                for d in reversed(days)
+            ],
+        }
+
+
+counters = Counters()
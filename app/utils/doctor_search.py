@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import re
+
+from flask import current_app
+from sqlalchemy import bindparam, inspect, or_, text
+from sqlalchemy.orm import joinedload
+
+from app.extensions import db
+from app.models import Doctor, User
+from app.utils.pagination import Page, decode_cursor, encode_cursor
+
+
+INDEX_TABLE = "doctor_search"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_available: dict[str, bool] = {}
+
+
+def create_index_ddl(dialect: str) -> list[str]:
+    if dialect == "sqlite":
+        return [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} USING fts5("
+            "name, email, specialization, hospital_id, tokenize='unicode61 remove_diacritics 2')"
+        ]
+    if dialect == "mysql":
+        return [
+            f"CREATE TABLE IF NOT EXISTS {INDEX_TABLE} ("
+            "doctor_id INTEGER NOT NULL PRIMARY KEY, "
+            "document TEXT NOT NULL, "
+            "FULLTEXT KEY ft_doctor_search_document (document) WITH PARSER ngram"
+            ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+        ]
+    return []
+
+
+def backfill_sql(dialect: str) -> str | None:
+    if dialect == "sqlite":
+        return (
+            f"INSERT INTO {INDEX_TABLE} (rowid, name, email, specialization, hospital_id) "
+            "SELECT d.user_id, COALESCE(u.name, ''), u.email, d.specialization, COALESCE(d.hospital_id, '') "
+            "FROM doctors d JOIN users u ON u.id = d.user_id"
+        )
+    if dialect == "mysql":
+        return (
+            f"INSERT INTO {INDEX_TABLE} (doctor_id, document) "
+            "SELECT d.user_id, CONCAT_WS(' ', u.name, u.email, d.specialization, d.hospital_id) "
+            "FROM doctors d JOIN users u ON u.id = d.user_id"
+        )
+    return None
+
+
+def _dialect() -> str:
+    return db.session.get_bind().dialect.name
+
+
+def index_available() -> bool:
+    bind = db.session.get_bind()
+    key = str(bind.url)
+    if key not in _available:
+        _available[key] = bool(create_index_ddl(bind.dialect.name)) and inspect(bind).has_table(INDEX_TABLE)
+    return _available[key]
+
+
+def rebuild_index() -> None:
+    """Recreate the search index from scratch. Commits."""
+    dialect = _dialect()
+    for ddl in create_index_ddl(dialect):
+        db.session.execute(text(ddl))
+    sql = backfill_sql(dialect)
+    if sql:
+        db.session.execute(text(f"DELETE FROM {INDEX_TABLE}"))
+        db.session.execute(text(sql))
+    db.session.commit()
+    _available.clear()
+
+
+def index_doctor(doctor_id: int) -> None:
+    """Refresh one doctor's index entry inside the caller's transaction."""
+    index_doctors([doctor_id])
+
+
+def index_doctors(doctor_ids: list[int]) -> None:
+    """Refresh several doctors' index entries inside the caller's transaction, a statement per step."""
+    if not doctor_ids or not index_available():
+        return
+
+    db.session.flush()
+    rows = (
+        db.session.query(Doctor.user_id, User.name, User.email, Doctor.specialization, Doctor.hospital_id)
+        .join(Doctor.user)
+        .filter(Doctor.user_id.in_(doctor_ids))
+        .all()
+    )
+
+    if _dialect() == "sqlite":
+        db.session.execute(
+            text(f"DELETE FROM {INDEX_TABLE} WHERE rowid IN :ids").bindparams(bindparam("ids", expanding=True)),
+            {"ids": list(doctor_ids)},
+        )
+        if rows:
+            db.session.execute(
+                text(
+                    f"INSERT INTO {INDEX_TABLE} (rowid, name, email, specialization, hospital_id) "
+                    "VALUES (:id, :name, :email, :specialization, :hospital_id)"
+                ),
+                [
+                    {
+                        "id": row.user_id,
+                        "name": row.name or "",
+                        "email": row.email,
+                        "specialization": row.specialization,
+                        "hospital_id": row.hospital_id or "",
+                    }
+                    for row in rows
+                ],
+            )
+    else:
+        db.session.execute(
+            text(f"DELETE FROM {INDEX_TABLE} WHERE doctor_id IN :ids").bindparams(bindparam("ids", expanding=True)),
+            {"ids": list(doctor_ids)},
+        )
+        if rows:
+            db.session.execute(
+                text(f"INSERT INTO {INDEX_TABLE} (doctor_id, document) VALUES (:id, :document)"),
+                [
+                    {
+                        "id": row.user_id,
+                        "document": " ".join(v for v in (row.name, row.email, row.specialization, row.hospital_id) if v),
+                    }
+                    for row in rows
+                ],
+            )
+
+
+def _match_expression(q: str, dialect: str) -> str | None:
+    tokens = _TOKEN_RE.findall(q.lower())
+    if not tokens:
+        return None
+    if dialect == "sqlite":
+        # Every token must match, each as a prefix.
+        return " ".join(f'"{t}"*' for t in tokens)
+    return " ".join(f"+{t}" for t in tokens)
+
+
+def _ranked_ids(match: str, dialect: str, offset: int, limit: int) -> list[int]:
+    if dialect == "sqlite":
+        sql = (
+            f"SELECT rowid FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH :match "
+            "ORDER BY rank, rowid LIMIT :limit OFFSET :offset"
+        )
+    else:
+        sql = (
+            f"SELECT doctor_id FROM {INDEX_TABLE} "
+            "WHERE MATCH(document) AGAINST (:match IN BOOLEAN MODE) "
+            "ORDER BY MATCH(document) AGAINST (:match IN BOOLEAN MODE) DESC, doctor_id "
+            "LIMIT :limit OFFSET :offset"
+        )
+    rows = db.session.execute(text(sql), {"match": match, "limit": limit, "offset": offset})
+    return [r[0] for r in rows]
+
+
+def _like_ids(q: str, offset: int, limit: int) -> list[int]:
+    like = f"%{q}%"
+    rows = (
+        db.session.query(Doctor.user_id)
+        .join(Doctor.user)
+        .filter(
+            or_(
+                Doctor.specialization.ilike(like),
+                Doctor.hospital_id.ilike(like),
+                User.email.ilike(like),
+                User.name.ilike(like),
+            )
+        )
+        .order_by(Doctor.specialization.asc(), Doctor.user_id.asc())
+        .offset(offset)
+        .limit(limit)
+    )
+    return [r[0] for r in rows]
+
+
+def search_doctors(q: str, cursor: str | None = None, per_page: int | None = None) -> Page:
+    """Ranked doctor search; the cursor carries the result offset."""
+    per_page = per_page or int(current_app.config.get("PAGE_SIZE", 25))
+    values = decode_cursor(cursor)
+    offset = values[0] if values and isinstance(values[0], int) and values[0] > 0 else 0
+
+    dialect = _dialect()
+    if index_available():
+        match = _match_expression(q, dialect)
+        ids = _ranked_ids(match, dialect, offset, per_page + 1) if match else []
+    else:
+        ids = _like_ids(q, offset, per_page + 1)
+
+    next_cursor = None
+    if len(ids) > per_page:
+        ids = ids[:per_page]
+        next_cursor = encode_cursor([offset + per_page])
+
+    doctors = []
+    if ids:
+        by_id = {d.user_id: d for d in Doctor.query.options(joinedload(Doctor.user)).filter(Doctor.user_id.in_(ids))}
+        doctors = [by_id[i] for i in ids if i in by_id]
+
+    return Page(items=doctors, cursor=cursor if offset else None, next_cursor=next_cursor)
@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import atexit
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from flask import Flask, current_app
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.extensions import db
+from app.models import Patient, User
+
+
+# Fewer digits than this is a patient id, never a phone number.
+MIN_PHONE_DIGITS = 6
+
+_NON_DIGITS = re.compile(r"\D+")
+
+
+class EmergencyCard(NamedTuple):
+    """Only what the emergency lookup page shows."""
+
+    user_id: int
+    blood_group: str | None
+    allergies: str | None
+    chronic_conditions: str | None
+    emergency_contacts: str | None
+
+
+def normalize_email(value: str | None) -> str | None:
+    value = (value or "").strip().lower()
+    return value or None
+
+
+def normalize_phone(value: str | None) -> str | None:
+    digits = _NON_DIGITS.sub("", value or "")
+    return digits if len(digits) >= MIN_PHONE_DIGITS else None
+
+
+def card_query():
+    return (
+        select(
+            Patient.user_id,
+            User.email,
+            User.phone,
+            User.role,
+            Patient.blood_group,
+            Patient.allergies,
+            Patient.chronic_conditions,
+            Patient.emergency_contacts,
+            Patient.updated_at,
+        )
+        .join(User, User.id == Patient.user_id)
+        .execution_options(yield_per=1000)
+    )
+
+
+class _Index:
+    def __init__(self) -> None:
+        self.cards: dict[int, EmergencyCard] = {}
+        self.by_email: dict[str, int] = {}
+        # A number shared by several patients is never resolved to one of them. Tuples are replaced,
+        # never mutated, so lookups can read them without the lock.
+        self.by_phone: dict[str, tuple[int, ...]] = {}
+        self.keys: dict[int, tuple[str | None, str | None]] = {}
+        # Newest ``Patient.updated_at`` seen; the next delta starts a little before it.
+        self.watermark: datetime | None = None
+
+    def put(self, row) -> None:
+        user_id = row.user_id
+        self.drop(user_id)
+        if row.updated_at is not None and (self.watermark is None or row.updated_at > self.watermark):
+            self.watermark = row.updated_at
+        if row.role != "patient":
+            return
+
+        email, phone = normalize_email(row.email), normalize_phone(row.phone)
+        self.cards[user_id] = EmergencyCard(
+            user_id, row.blood_group, row.allergies, row.chronic_conditions, row.emergency_contacts
+        )
+        self.keys[user_id] = (email, phone)
+        if email:
+            self.by_email[email] = user_id
+        if phone:
+            self.by_phone[phone] = (*self.by_phone.get(phone, ()), user_id)
+
+    def drop(self, user_id: int) -> None:
+        self.cards.pop(user_id, None)
+        email, phone = self.keys.pop(user_id, (None, None))
+        if email and self.by_email.get(email) == user_id:
+            del self.by_email[email]
+        if phone and phone in self.by_phone:
+            rest = tuple(i for i in self.by_phone[phone] if i != user_id)
+            if rest:
+                self.by_phone[phone] = rest
+            else:
+                del self.by_phone[phone]
+
+    def find(self, query: str) -> EmergencyCard | None:
+        if "@" in query:
+            user_id = self.by_email.get(normalize_email(query) or "")
+            return self.cards.get(user_id) if user_id is not None else None
+        if query.isdigit():
+            card = self.cards.get(int(query))
+            if card is not None:
+                return card
+        ids = self.by_phone.get(normalize_phone(query) or "", ())
+        return self.cards.get(ids[0]) if len(ids) == 1 else None
+
+
+class EmergencyCardsUnavailable(RuntimeError):
+    """This worker has no cards loaded yet and the database cannot be read."""
+
+
+class EmergencyCardIndex:
+    """Emergency cards for every patient, held in memory in each worker and keyed by id, email and phone.
+
+    A lookup is a few dictionary reads and never waits on the database. A background thread in each
+    worker loads the index, applies other workers' changes from ``Patient.updated_at`` every
+    ``EMERGENCY_CARDS_SYNC_SECONDS`` and rebuilds it every ``EMERGENCY_CARDS_RELOAD_SECONDS``, which
+    also drops deleted patients. Saves in this worker refresh their card straight away. If the
+    database is unreachable the index keeps serving what it has.
+    """
+
+    def __init__(self) -> None:
+        self.sync_interval = 30.0
+        self.reload_interval = 3600.0
+        self.overlap = timedelta(seconds=5)
+        self.cold_wait = 2.0
+        self._app: Flask | None = None
+        self._index: _Index | None = None
+        self._lock = threading.Lock()
+        self._loaded_at = 0.0
+        self._loaded = threading.Event()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+
+    def init_app(self, app: Flask) -> None:
+        self.sync_interval = float(app.config.get("EMERGENCY_CARDS_SYNC_SECONDS", 30))
+        self.reload_interval = float(app.config.get("EMERGENCY_CARDS_RELOAD_SECONDS", 3600))
+        # Rows committed a little after their updated_at was stamped still land in the next delta.
+        self.overlap = timedelta(seconds=float(app.config.get("EMERGENCY_CARDS_SYNC_OVERLAP", 5)))
+        self.cold_wait = float(app.config.get("EMERGENCY_CARDS_COLD_WAIT_SECONDS", 2))
+        self._app = app
+        if app.config.get("EMERGENCY_CARDS_WARM", True):
+            # The worker's first request of any kind starts loading, ahead of the first lookup.
+            app.before_request(self.start)
+        app.extensions["emergency_cards"] = self
+        atexit.register(self.shutdown)
+
+    def lookup(self, query: str) -> EmergencyCard | None:
+        """Card for a patient id, email or phone number, or None. Answered from memory only."""
+        query = (query or "").strip()
+        if not query:
+            return None
+
+        index = self._index
+        if index is None:
+            self.start()
+            # Only a worker that has never loaded waits, and only briefly.
+            self._loaded.wait(self.cold_wait)
+            index = self._index
+            if index is None:
+                raise EmergencyCardsUnavailable()
+        return index.find(query)
+
+    def refresh(self, user_id: int) -> None:
+        """Reload one patient's card after a committed change."""
+        if self._index is None:
+            return
+        try:
+            with Session(db.engine) as session:
+                row = session.execute(card_query().where(Patient.user_id == user_id)).first()
+        except SQLAlchemyError:
+            current_app.logger.exception("Could not refresh emergency card %s", user_id)
+            return
+        with self._lock:
+            if row is None:
+                self._index.drop(user_id)
+            else:
+                self._index.put(row)
+
+    def sync_soon(self) -> None:
+        """Have the background thread apply recent changes now rather than at its next interval."""
+        self._wake.set()
+
+    def sync(self) -> bool:
+        """Apply every patient changed since the last sync. Returns False if there is no index yet."""
+        index = self._index
+        if index is None:
+            return False
+
+        query = card_query()
+        if index.watermark is not None:
+            query = query.where(Patient.updated_at >= index.watermark - self.overlap)
+        with Session(db.engine) as session:
+            rows = session.execute(query).all()
+        with self._lock:
+            for row in rows:
+                index.put(row)
+        return True
+
+    def reload(self, engine=None) -> _Index:
+        """Build the whole index from scratch and swap it in."""
+        index = _Index()
+        with Session(engine or db.engine) as session:
+            for row in session.execute(card_query()):
+                index.put(row)
+        with self._lock:
+            # Saves refreshed into the old index while this one was being built come back in the next sync.
+            self._index = index
+            self._loaded_at = time.monotonic()
+        self._loaded.set()
+        return index
+
+    def clear(self) -> None:
+        with self._lock:
+            self._index = None
+            self._loaded.clear()
+
+    def start(self) -> None:
+        """Start this worker's loader thread if it is not running."""
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            # After a fork the parent's thread is gone; start a fresh one in this process.
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="emergency-cards", daemon=True)
+            self._thread.start()
+
+    def shutdown(self) -> None:
+        """Stop this worker's loader thread, waiting for a refresh in progress to finish."""
+        self._stop.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join(timeout=5.0)
+
+    def _run(self) -> None:
+        app = self._app
+        with app.app_context():
+            while not self._stop.is_set():
+                try:
+                    if self._index is None or time.monotonic() - self._loaded_at > self.reload_interval:
+                        self.reload()
+                    else:
+                        self.sync()
+                except SQLAlchemyError:
+                    app.logger.exception("Emergency card refresh failed; serving the cards already loaded")
+                # A worker with nothing loaded retries sooner.
+                self._wake.wait(self.sync_interval if self._index is not None else min(self.sync_interval, 5.0))
+                self._wake.clear()
+
+
+emergency_cards = EmergencyCardIndex()
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import json
+import os
+import zipfile
+from collections.abc import Iterator
+from datetime import datetime
+
+from flask import current_app
+
+from app.extensions import db
+from app.models import Appointment, Consent, MedicalRecord, Organization, Prescription, User
+from app.utils.audit import log_events
+from app.utils.storage import TEXT_EXTENSIONS, open_blob, storage
+
+
+MANIFEST_NAME = "manifest.json"
+RECORDS_DIR = "records"
+
+# Rows fetched per round trip while walking a patient's history.
+_YIELD_PER = 200
+
+
+class _ZipSink:
+    """Write-only file object for ZipFile; it has no ``seek``, so zipfile streams with data descriptors."""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._offset = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _archive_name(rec: MedicalRecord) -> str:
+    return f"{RECORDS_DIR}/{rec.download_name}"
+
+
+def _iso(value: datetime | None) -> str | None:
+    return value.isoformat() if value else None
+
+
+def _record_rows(patient_id: int, missing: set[int]) -> Iterator[dict]:
+    query = (
+        MedicalRecord.query.filter_by(patient_id=patient_id)
+        .order_by(MedicalRecord.uploaded_at.asc(), MedicalRecord.id.asc())
+        .yield_per(_YIELD_PER)
+    )
+    for rec in query:
+        yield {
+            "id": rec.id,
+            "file": None if rec.id in missing else _archive_name(rec),
+            "description": rec.description,
+            "appointment_id": rec.appointment_id,
+            "uploaded_at": _iso(rec.uploaded_at),
+            "size_bytes": rec.size_bytes,
+            "sha256": rec.sha256,
+        }
+
+
+def _appointment_rows(patient_id: int) -> Iterator[dict]:
+    query = (
+        db.session.query(Appointment, Prescription, User.name)
+        .outerjoin(Prescription, Prescription.appointment_id == Appointment.id)
+        .outerjoin(User, User.id == Appointment.doctor_id)
+        .filter(Appointment.patient_id == patient_id)
+        .order_by(Appointment.scheduled_at.asc(), Appointment.id.asc())
+        .yield_per(_YIELD_PER)
+    )
+    for appt, rx, doctor_name in query:
+        yield {
+            "id": appt.id,
+            "scheduled_at": _iso(appt.scheduled_at),
+            "status": appt.status,
+            "doctor_id": appt.doctor_id,
+            "doctor_name": doctor_name,
+            "organization_id": appt.organization_id,
+            "prescription": None
+            if rx is None
+            else {
+                "id": rx.id,
+                "issued_at": _iso(rx.issued_at),
+                "notes": rx.notes,
+                "pharmacy_id": rx.pharmacy_id,
+                "fulfillment_status": rx.fulfillment_status,
+                "delivery_status": rx.delivery_status,
+            },
+        }
+
+
+def _consent_rows(patient_id: int) -> Iterator[dict]:
+    query = (
+        db.session.query(Consent, Organization.name)
+        .join(Organization, Organization.id == Consent.organization_id)
+        .filter(Consent.patient_id == patient_id)
+        .order_by(Consent.granted_at.asc(), Consent.id.asc())
+        .yield_per(_YIELD_PER)
+    )
+    for consent, org_name in query:
+        yield {
+            "organization_id": consent.organization_id,
+            "organization": org_name,
+            "granted_at": _iso(consent.granted_at),
+            "revoked_at": _iso(consent.revoked_at),
+            "can_view_history": consent.can_view_history,
+            "can_add_record": consent.can_add_record,
+        }
+
+
+def _manifest_pieces(patient_id: int, missing: set[int]) -> Iterator[str]:
+    # Written piece by piece so a long history never has to be built as one document.
+    yield json.dumps({"format": 1, "patient_id": patient_id, "generated_at": _iso(datetime.utcnow())})[:-1]
+    sections = (
+        ("records", _record_rows(patient_id, missing)),
+        ("appointments", _appointment_rows(patient_id)),
+        ("consents", _consent_rows(patient_id)),
+    )
+    for key, rows in sections:
+        yield f", {json.dumps(key)}: ["
+        for i, row in enumerate(rows):
+            yield ("," if i else "") + "\n" + json.dumps(row)
+        yield "]"
+    yield "}\n"
+
+
+def stream_record_bundle(patient_id: int) -> Iterator[bytes]:
+    """Yield a ZIP of every record file for a patient followed by a JSON manifest, as it is built.
+
+    File bytes are never held beyond one read chunk, and a slow client only slows the generator down.
+    Every record file that was started is audited in one batch when the stream ends, including
+    when the client disconnects part-way.
+    """
+    chunk_size = int(current_app.config.get("UPLOAD_CHUNK_SIZE", 64 * 1024))
+    sink = _ZipSink()
+    sent: list[int] = []
+    missing: set[int] = set()
+
+    try:
+        with zipfile.ZipFile(sink, "w") as zf:
+            records = (
+                MedicalRecord.query.filter_by(patient_id=patient_id)
+                .order_by(MedicalRecord.uploaded_at.asc(), MedicalRecord.id.asc())
+                .yield_per(_YIELD_PER)
+            )
+            for rec in records:
+                abs_path = storage.resolve(rec.file_path)
+                if not os.path.isfile(abs_path):
+                    missing.add(rec.id)
+                    continue
+
+                info = zipfile.ZipInfo(_archive_name(rec), date_time=rec.uploaded_at.timetuple()[:6])
+                # Scans and PDFs are already compressed; deflating them only costs CPU.
+                text_like = os.path.splitext(rec.file_path)[1].lower() in TEXT_EXTENSIONS
+                info.compress_type = zipfile.ZIP_DEFLATED if text_like else zipfile.ZIP_STORED
+                # A known size lets zipfile decide up front whether the entry needs zip64.
+                info.file_size = rec.size_bytes if rec.codec else os.path.getsize(abs_path)
+
+                with open_blob(abs_path, rec.codec) as src, zf.open(info, "w") as dst:
+                    # Audited as soon as any of its bytes can reach the client.
+                    sent.append(rec.id)
+                    for chunk in iter(lambda: src.read(chunk_size), b""):
+                        dst.write(chunk)
+                        data = sink.drain()
+                        if data:
+                            yield data
+
+            with zf.open(MANIFEST_NAME, "w") as dst:
+                for piece in _manifest_pieces(patient_id, missing):
+                    dst.write(piece.encode("utf-8"))
+                    data = sink.drain()
+                    if data:
+                        yield data
+        yield sink.drain()
+    finally:
+        log_events("record_exported", "medical_record", patient_id=patient_id, entity_ids=sent)
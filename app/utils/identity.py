@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import select
+
+from app.extensions import db
+from app.models import Doctor, User
+from app.utils.cache import TTLCache
+
+
+class Identity(UserMixin):
+    """The signed-in user's identity fields, as plain values detached from any session.
+
+    Only what authorization and page chrome read is kept here. Cached copies of mapped objects
+    would be served from the request's identity map in place of fresh rows, so anything that
+    changes a user or its profile loads the row itself.
+    """
+
+    def __init__(self, id: int, email: str, name: str | None, phone: str | None, role: str, organization_id: int | None) -> None:
+        self.id = id
+        self.email = email
+        self.name = name
+        self.phone = phone
+        self.role = role
+        # The doctor's organization; None for everyone else.
+        self.organization_id = organization_id
+
+    def __repr__(self) -> str:
+        return f"<Identity id={self.id} role={self.role}>"
+
+
+_identities = TTLCache(ttl=30.0, maxsize=10000)
+
+
+def _fetch_identity(user_id: int) -> Identity | None:
+    row = db.session.execute(
+        select(User.id, User.email, User.name, User.phone, User.role, Doctor.organization_id)
+        .outerjoin(Doctor, Doctor.user_id == User.id)
+        .where(User.id == user_id)
+    ).first()
+    return Identity(*row) if row is not None else None
+
+
+def load_identity(user_id: int) -> Identity | None:
+    """Return the user's identity, from the cache when it is fresh, in at most one query."""
+    identity = _identities.get(user_id)
+    if identity is None:
+        identity = _fetch_identity(user_id)
+        if identity is None:
+            return None
+        _identities.set(user_id, identity, ttl=current_app.config.get("IDENTITY_CACHE_TTL", _identities.ttl))
+    return identity
+
+
+def invalidate_identity(user_id: int) -> None:
+    _identities.pop(user_id)
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from flask import Flask, before_render_template, current_app, g, has_request_context, template_rendered
+from sqlalchemy import event
+from sqlalchemy.orm import ORMExecuteState, contains_eager, joinedload
+
+from app.extensions import db
+from app.models import Appointment, AuditEvent, Doctor, MedicalRecord, Patient
+
+
+class LazyLoadDuringRender(RuntimeError):
+    pass
+
+
+# Named loader option bundles, one per listing view. Each bundle covers every relationship
+# its template walks, so rendering never falls back to per-row lazy loads.
+LOADING_PROFILES = {
+    "patient_appointments": (joinedload(Appointment.doctor).joinedload(Doctor.user),),
+    "patient_history": (
+        joinedload(Appointment.doctor).joinedload(Doctor.user),
+        joinedload(Appointment.prescription),
+    ),
+    "doctor_appointments": (
+        joinedload(Appointment.patient).joinedload(Patient.user),
+        joinedload(Appointment.prescription),
+    ),
+    # For queries that already join Doctor.user (search, ordering).
+    "doctor_directory": (contains_eager(Doctor.user),),
+    "records_with_author": (joinedload(MedicalRecord.created_by),),
+    "activity_feed": (joinedload(AuditEvent.actor),),
+}
+
+
+def loading_profile(name: str) -> tuple:
+    return LOADING_PROFILES[name]
+
+
+def _detection_mode() -> str:
+    mode = (current_app.config.get("LAZY_LOAD_DETECTION") or "").lower()
+    return mode if mode in {"log", "raise"} else ""
+
+
+def _enter_render(sender, template, context, **extra):
+    if has_request_context():
+        g.render_depth = g.get("render_depth", 0) + 1
+
+
+def _leave_render(sender, template, context, **extra):
+    if has_request_context():
+        g.render_depth = max(g.get("render_depth", 1) - 1, 0)
+
+
+def _check_lazy_load(state: ORMExecuteState) -> None:
+    if not state.is_relationship_load or not has_request_context() or not g.get("render_depth"):
+        return
+
+    mode = _detection_mode()
+    if not mode:
+        return
+
+    instance = state.lazy_loaded_from.obj() if state.lazy_loaded_from is not None else None
+    message = f"Lazy load from {instance!r} while rendering a template"
+    if mode == "raise":
+        raise LazyLoadDuringRender(message)
+    current_app.logger.warning(message)
+
+
+def init_app(app: Flask) -> None:
+    """Report relationship lazy loads fired while a template renders.
+
+    ``LAZY_LOAD_DETECTION`` is ``"raise"`` (fail the request), ``"log"`` (warn) or empty (off).
+    """
+    if not (app.config.get("LAZY_LOAD_DETECTION") or ""):
+        return
+
+    before_render_template.connect(_enter_render, app)
+    template_rendered.connect(_leave_render, app)
+    if not event.contains(db.session, "do_orm_execute", _check_lazy_load):
+        event.listen(db.session, "do_orm_execute", _check_lazy_load)
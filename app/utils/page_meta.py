@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import threading
+from datetime import date
+from typing import NamedTuple
+
+from flask import request, url_for
+
+
+class PageMeta(NamedTuple):
+    role: str
+    title: str
+    crumbs: tuple[tuple[str, str | None], ...]
+
+
+class PageMetaRegistry:
+    """Page titles and breadcrumbs declared per endpoint; breadcrumb URLs are built on first use."""
+
+    def __init__(self) -> None:
+        self._pages: dict[str, PageMeta] = {}
+        self._resolved: dict[tuple[str, str], tuple[str, list[tuple[str, str | None]]]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, endpoint: str, title: str, *crumbs: tuple[str, str | None]) -> None:
+        self._pages[endpoint] = PageMeta(endpoint.split(".", 1)[0], title, tuple(crumbs))
+        self._resolved.clear()
+
+    def lookup(self, endpoint: str, role: str) -> tuple[str, list[tuple[str, str | None]]] | None:
+        meta = self._pages.get(endpoint)
+        if meta is None or meta.role != role:
+            return None
+
+        key = (endpoint, request.script_root)
+        resolved = self._resolved.get(key)
+        if resolved is None:
+            breadcrumbs = [(label, url_for(target) if target else None) for label, target in meta.crumbs]
+            resolved = (meta.title, breadcrumbs)
+            with self._lock:
+                self._resolved[key] = resolved
+        return resolved
+
+
+page_meta = PageMetaRegistry()
+
+
+def register_pages(registry: PageMetaRegistry) -> None:
+    for home in ("patient.dashboard", "doctor.dashboard"):
+        registry.register(home, "Dashboard", ("Home", home), ("Dashboard", None))
+
+    for endpoint, title in [
+        ("patient.profile", "Profile"),
+        ("patient.doctors", "Doctors"),
+        ("patient.records", "Records"),
+        ("patient.history", "History"),
+        ("patient.activity", "Activity"),
+        ("patient.appointments", "Appointments"),
+        ("patient.consents", "Consents"),
+        ("patient.prescriptions", "Prescriptions"),
+        ("patient.emergency_profile", "Emergency"),
+    ]:
+        registry.register(endpoint, title, ("Home", "patient.dashboard"), (title, None))
+    registry.register(
+        "patient.doctor_detail",
+        "Doctor profile",
+        ("Home", "patient.dashboard"),
+        ("Doctors", "patient.doctors"),
+        ("Doctor profile", None),
+    )
+
+    registry.register("doctor.appointments", "Appointments", ("Home", "doctor.dashboard"), ("Appointments", None))
+    registry.register("doctor.patients", "Patients", ("Home", "doctor.dashboard"), ("Patients", None))
+    registry.register(
+        "doctor.patient_detail",
+        "Patient",
+        ("Home", "doctor.dashboard"),
+        ("Patients", "doctor.patients"),
+        ("Patient", None),
+    )
+    registry.register(
+        "doctor.prescribe",
+        "Prescription",
+        ("Home", "doctor.dashboard"),
+        ("Appointments", "doctor.appointments"),
+        ("Prescription", None),
+    )
+
+    registry.register("pharmacy.queue", "Queue", ("Home", "pharmacy.queue"), ("Queue", None))
+    registry.register("emergency.lookup", "Lookup", ("Home", "emergency.lookup"), ("Lookup", None))
+
+
+_today: tuple[date, str] | None = None
+
+
+def current_date_label() -> tuple[str, int]:
+    global _today
+    today = date.today()
+    cached = _today
+    if cached is None or cached[0] != today:
+        cached = (today, f"{today:%A}, {today:%B} {today.day}, {today:%Y}")
+        _today = cached
+    return cached[1], today.year
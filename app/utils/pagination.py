@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, NamedTuple
+
+from flask import current_app, request, url_for
+from sqlalchemy import and_, or_
+
+
+class Page(NamedTuple):
+    items: list
+    cursor: str | None
+    next_cursor: str | None
+
+    @property
+    def is_first(self) -> bool:
+        return self.cursor is None
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(values: list[Any]) -> str:
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str | None) -> list[Any] | None:
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+        return [_decode_value(v) for v in values] if isinstance(values, list) else None
+    except (binascii.Error, ValueError, TypeError):
+        return None
+
+
+def _seek_condition(columns: tuple, values: list[Any], descending: bool):
+    # (a, b) < (x, y) spelled out as a < x OR (a = x AND b < y) so both SQLite and MySQL use the index.
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == values[j] for j in range(i)]
+        step = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*equal, step))
+    return or_(*clauses)
+
+
+def keyset_paginate(query, columns: tuple, cursor: str | None = None, per_page: int | None = None, descending: bool = True) -> Page:
+    """Return one page of ``query`` ordered by ``columns``; the last column must be unique (usually the id)."""
+    return keyset_paginate_union([query], columns, cursor=cursor, per_page=per_page, descending=descending)
+
+
+def keyset_paginate_union(
+    queries: list, columns: tuple, cursor: str | None = None, per_page: int | None = None, descending: bool = True
+) -> Page:
+    """Like :func:`keyset_paginate` over the union of disjoint ``queries``.
+
+    Use it instead of an ``IN (...)`` filter that would stop the database from reading the index
+    in order: each query walks its own index range for one page and the pages are merged here.
+    """
+    per_page = per_page or int(current_app.config.get("PAGE_SIZE", 25))
+
+    values = decode_cursor(cursor)
+    if values is not None and len(values) != len(columns):
+        values = None
+
+    order = [c.desc() if descending else c.asc() for c in columns]
+    rows = []
+    for query in queries:
+        if values is not None:
+            query = query.filter(_seek_condition(columns, values, descending))
+        rows.extend(query.order_by(*order).limit(per_page + 1).all())
+    if len(queries) > 1:
+        rows.sort(key=lambda row: tuple(getattr(row, c.key) for c in columns), reverse=descending)
+        rows = rows[: per_page + 1]
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, c.key) for c in columns])
+
+    return Page(items=rows, cursor=cursor if values is not None else None, next_cursor=next_cursor)
+
+
+def page_url(cursor: str | None, param: str = "cursor") -> str:
+    """URL of the current view with ``param`` replaced; other query arguments are kept."""
+    args = request.args.to_dict()
+    args.pop(param, None)
+    if cursor:
+        args[param] = cursor
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
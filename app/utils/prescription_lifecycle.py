@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+from collections import Counter
+from datetime import datetime
+
+from flask_login import current_user
+from sqlalchemy import event, func, insert, update
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db
+from app.models import Prescription, PrescriptionEvent, PrescriptionStatusCount
+
+
+# status -> statuses it may move to next. A step back is allowed until the order has left the pharmacy.
+FULFILLMENT_TRANSITIONS = {
+    "pending": ("verified",),
+    "verified": ("pending", "packed"),
+    "packed": ("verified", "fulfilled"),
+    "fulfilled": (),
+}
+DELIVERY_TRANSITIONS = {
+    "not_started": ("in_transit",),
+    "in_transit": ("not_started", "delivered"),
+    "delivered": (),
+}
+
+FULFILLMENT_STATUSES = tuple(FULFILLMENT_TRANSITIONS)
+DELIVERY_STATUSES = tuple(DELIVERY_TRANSITIONS)
+
+# Delivery can only be under way once the order is packed.
+SHIPPABLE_STATUSES = ("packed", "fulfilled")
+
+# Counter key for prescriptions that are not routed to any pharmacy.
+UNASSIGNED = 0
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+def next_state(
+    fulfillment: str,
+    delivery: str,
+    to_fulfillment: str | None = None,
+    to_delivery: str | None = None,
+) -> tuple[str, str]:
+    """The (fulfillment, delivery) pair after a change; raises InvalidTransition if it is not allowed.
+
+    ``None`` leaves a field as it is, and asking for the current status is a no-op rather than an error.
+    """
+    new_fulfillment = to_fulfillment or fulfillment
+    new_delivery = to_delivery or delivery
+    if new_fulfillment != fulfillment and new_fulfillment not in FULFILLMENT_TRANSITIONS.get(fulfillment, ()):
+        raise InvalidTransition(f"Fulfillment cannot move from {fulfillment} to {new_fulfillment}.")
+    if new_delivery != delivery and new_delivery not in DELIVERY_TRANSITIONS.get(delivery, ()):
+        raise InvalidTransition(f"Delivery cannot move from {delivery} to {new_delivery}.")
+    if new_delivery != "not_started" and new_fulfillment not in SHIPPABLE_STATUSES:
+        raise InvalidTransition("Delivery cannot be under way before the order is packed.")
+    return new_fulfillment, new_delivery
+
+
+def fulfillment_options(p: Prescription) -> tuple[str, ...]:
+    """The current fulfillment status followed by the ones it can move to, for status pickers."""
+    return (p.fulfillment_status, *FULFILLMENT_TRANSITIONS.get(p.fulfillment_status, ()))
+
+
+def delivery_options(p: Prescription) -> tuple[str, ...]:
+    return (p.delivery_status, *DELIVERY_TRANSITIONS.get(p.delivery_status, ()))
+
+
+def _actor_id() -> int | None:
+    if getattr(current_user, "is_authenticated", False):
+        return current_user.id
+    return None
+
+
+def _counter_key(pharmacy_id: int | None) -> int:
+    return UNASSIGNED if pharmacy_id is None else pharmacy_id
+
+
+def _event_row(
+    prescription_id: int,
+    pharmacy_id: int | None,
+    kind: str,
+    from_status: str | None,
+    to_status: str,
+    now: datetime,
+    previous_pharmacy_id: int | None = None,
+) -> dict:
+    return {
+        "prescription_id": prescription_id,
+        "actor_id": _actor_id(),
+        "pharmacy_id": pharmacy_id,
+        "previous_pharmacy_id": previous_pharmacy_id,
+        "kind": kind,
+        "from_status": from_status,
+        "to_status": to_status,
+        "created_at": now,
+    }
+
+
+def _adjust_counts(connection, deltas: Counter) -> None:
+    table = PrescriptionStatusCount.__table__
+    # A fixed order keeps two transactions touching the same counters from deadlocking.
+    for (pharmacy_id, status), delta in sorted(deltas.items()):
+        if not delta:
+            continue
+        key = (table.c.pharmacy_id == pharmacy_id, table.c.status == status)
+        bump = update(table).where(*key).values(count=table.c.count + delta)
+        if connection.execute(bump).rowcount:
+            continue
+        try:
+            with connection.begin_nested():
+                connection.execute(insert(table).values(pharmacy_id=pharmacy_id, status=status, count=delta))
+        except IntegrityError:
+            # A concurrent writer created the row first.
+            connection.execute(bump)
+
+
+def _record(events: list[dict], deltas: Counter) -> None:
+    """Write events and counter changes in the current transaction, alongside the status change itself."""
+    if events:
+        db.session.execute(insert(PrescriptionEvent), events)
+    _adjust_counts(db.session.connection(), deltas)
+
+
+def issue(p: Prescription, pharmacy_id: int | None) -> None:
+    """Add a new prescription at the start of its lifecycle, routed to ``pharmacy_id``."""
+    p.pharmacy_id = pharmacy_id
+    p.fulfillment_status = FULFILLMENT_STATUSES[0]
+    p.delivery_status = DELIVERY_STATUSES[0]
+    db.session.add(p)
+    db.session.flush()
+    _record(
+        [_event_row(p.id, pharmacy_id, "issued", None, p.fulfillment_status, datetime.utcnow())],
+        Counter({(_counter_key(pharmacy_id), p.fulfillment_status): 1}),
+    )
+
+
+def reassign(p: Prescription, pharmacy_id: int | None) -> bool:
+    """Route a prescription to another pharmacy; only allowed before the current one has started on it."""
+    if p.pharmacy_id == pharmacy_id:
+        return False
+    if p.fulfillment_status != FULFILLMENT_STATUSES[0]:
+        raise InvalidTransition("The pharmacy has already started on this prescription.")
+
+    status = p.fulfillment_status
+    deltas = Counter({(_counter_key(p.pharmacy_id), status): -1})
+    deltas[(_counter_key(pharmacy_id), status)] += 1
+    previous = p.pharmacy_id
+    p.pharmacy_id = pharmacy_id
+    _record([_event_row(p.id, pharmacy_id, "reassigned", status, status, datetime.utcnow(), previous)], deltas)
+    return True
+
+
+def edited(p: Prescription) -> None:
+    """Record a change to a prescription's details, so pharmacy queues pick it up like a status change."""
+    status = p.fulfillment_status
+    _record([_event_row(p.id, p.pharmacy_id, "edited", status, status, datetime.utcnow())], Counter())
+
+
+def _changes(prescription_id: int, pharmacy_id: int | None, old: tuple[str, str], new: tuple[str, str], now: datetime, events: list[dict], deltas: Counter) -> None:
+    if new[0] != old[0]:
+        events.append(_event_row(prescription_id, pharmacy_id, "fulfillment", old[0], new[0], now))
+        key = _counter_key(pharmacy_id)
+        deltas[(key, old[0])] -= 1
+        deltas[(key, new[0])] += 1
+    if new[1] != old[1]:
+        events.append(_event_row(prescription_id, pharmacy_id, "delivery", old[1], new[1], now))
+
+
+def transition(p: Prescription, fulfillment: str | None = None, delivery: str | None = None) -> bool:
+    """Move one prescription along its lifecycle. Returns False when nothing changed.
+
+    Load ``p`` with ``with_for_update()`` so the status the move is checked against is the one it replaces.
+    """
+    old = (p.fulfillment_status, p.delivery_status)
+    new = next_state(*old, fulfillment, delivery)
+    if new == old:
+        return False
+
+    events: list[dict] = []
+    deltas: Counter = Counter()
+    _changes(p.id, p.pharmacy_id, old, new, datetime.utcnow(), events, deltas)
+    p.fulfillment_status, p.delivery_status = new
+    _record(events, deltas)
+    return True
+
+
+def bulk_transition(
+    pharmacy_id: int,
+    ids: list[int],
+    fulfillment: str | None = None,
+    delivery: str | None = None,
+) -> tuple[list[int], list[int]]:
+    """Apply one change to many of a pharmacy's prescriptions with a single UPDATE.
+
+    Returns (moved ids, ids whose current status does not allow the change). Ids that are not the
+    pharmacy's, or already in the requested state, are in neither list.
+    """
+    rows = (
+        db.session.query(Prescription.id, Prescription.fulfillment_status, Prescription.delivery_status)
+        .filter(Prescription.id.in_(ids), Prescription.pharmacy_id == pharmacy_id)
+        .with_for_update()
+        .all()
+    )
+
+    now = datetime.utcnow()
+    moved: list[int] = []
+    rejected: list[int] = []
+    events: list[dict] = []
+    deltas: Counter = Counter()
+    for pid, current_fulfillment, current_delivery in rows:
+        old = (current_fulfillment, current_delivery)
+        try:
+            new = next_state(*old, fulfillment, delivery)
+        except InvalidTransition:
+            rejected.append(pid)
+            continue
+        if new != old:
+            moved.append(pid)
+            _changes(pid, pharmacy_id, old, new, now, events, deltas)
+
+    if moved:
+        # Every moved row ends in the same state for the fields being set, so one statement covers them all.
+        values = {}
+        if fulfillment:
+            values[Prescription.fulfillment_status] = fulfillment
+        if delivery:
+            values[Prescription.delivery_status] = delivery
+        db.session.execute(
+            update(Prescription).where(Prescription.id.in_(moved)).values(values).execution_options(synchronize_session=False)
+        )
+        _record(events, deltas)
+    return moved, rejected
+
+
+def status_counts(pharmacy_id: int | None = None) -> dict[str, int]:
+    """Prescriptions per fulfillment status, for one pharmacy or (``None``) across all of them."""
+    query = db.session.query(PrescriptionStatusCount.status, func.sum(PrescriptionStatusCount.count))
+    if pharmacy_id is not None:
+        query = query.filter(PrescriptionStatusCount.pharmacy_id == pharmacy_id)
+    by_status = dict(query.group_by(PrescriptionStatusCount.status).all())
+    return {status: int(by_status.get(status) or 0) for status in FULFILLMENT_STATUSES}
+
+
+@event.listens_for(Prescription, "after_delete")
+def _release_count(mapper, connection, target: Prescription) -> None:
+    # Rows removed by a database cascade skip this; scripts/rebuild_prescription_counts.py repairs those.
+    _adjust_counts(connection, Counter({(_counter_key(target.pharmacy_id), target.fulfillment_status): -1}))
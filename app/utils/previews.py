@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+from flask import Flask, abort
+
+from app.utils.storage import TEXT_EXTENSIONS, open_blob, storage
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - optional dependency
+    Image = None
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # pragma: no cover - optional dependency
+    pdfium = None
+
+
+PREVIEW_SUFFIX = ".preview.png"
+EXCERPT_SUFFIX = ".excerpt.txt"
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".webp", ".bmp", ".tif", ".tiff"}
+PDF_EXTENSIONS = {".pdf"}
+
+
+class Preview(NamedTuple):
+    kind: str
+    excerpt: str | None = None
+
+
+def preview_kind(file_path: str) -> str | None:
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in TEXT_EXTENSIONS:
+        return "text"
+    if ext in IMAGE_EXTENSIONS and Image is not None:
+        return "image"
+    if ext in PDF_EXTENSIONS and Image is not None and pdfium is not None:
+        return "pdf"
+    return None
+
+
+def preview_paths(file_path: str) -> tuple[str, ...]:
+    """Every preview file that may sit next to a stored blob."""
+    base = os.path.splitext(file_path)[0]
+    return base + PREVIEW_SUFFIX, base + EXCERPT_SUFFIX
+
+
+def preview_path(file_path: str, kind: str) -> str:
+    image, excerpt = preview_paths(file_path)
+    return excerpt if kind == "text" else image
+
+
+def generate_preview(src: str, dst: str, kind: str, max_px: int, excerpt_chars: int, codec: str | None = None) -> bool:
+    """Render one preview. Runs in a worker process, so it only touches the filesystem."""
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    try:
+        if kind == "text":
+            with open_blob(src, codec) as fh:
+                raw = fh.read(excerpt_chars * 4)
+            excerpt = raw.decode("utf-8", errors="replace")[:excerpt_chars]
+            with open(tmp, "w", encoding="utf-8") as fh:
+                fh.write(excerpt)
+        else:
+            if kind == "pdf":
+                pdf = pdfium.PdfDocument(src)
+                try:
+                    page = pdf[0]
+                    width, height = page.get_size()
+                    image = page.render(scale=max_px / max(width, height, 1)).to_pil()
+                finally:
+                    pdf.close()
+            else:
+                image = Image.open(src)
+                image.draft("RGB", (max_px, max_px))
+            image.thumbnail((max_px, max_px))
+            image.convert("RGB").save(tmp, format="PNG", optimize=True)
+        os.replace(tmp, dst)
+        return True
+    except Exception:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        return False
+
+
+class PreviewWorker:
+    """Generates record previews in a local process pool.
+
+    With ``PREVIEW_WORKERS = 0`` previews are generated inline, which keeps tests deterministic.
+    """
+
+    def __init__(self) -> None:
+        self.workers = 2
+        self.max_px = 320
+        self.excerpt_chars = 600
+        self._pool: ProcessPoolExecutor | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+        self._pending: set[str] = set()
+        self._failed: set[str] = set()
+
+    def init_app(self, app: Flask) -> None:
+        self.workers = int(app.config.get("PREVIEW_WORKERS", 2))
+        self.max_px = int(app.config.get("PREVIEW_MAX_PX", 320))
+        self.excerpt_chars = int(app.config.get("PREVIEW_EXCERPT_CHARS", 600))
+        app.extensions["previews"] = self
+        app.add_template_global(record_preview)
+        atexit.register(self.shutdown)
+
+    def schedule(self, file_path: str, codec: str | None = None) -> None:
+        """Queue preview generation for a stored file unless it exists or is already queued."""
+        kind = preview_kind(file_path)
+        if kind is None:
+            return
+
+        src = storage.resolve(file_path)
+        dst = storage.resolve(preview_path(file_path, kind))
+        with self._lock:
+            if dst in self._pending or dst in self._failed or os.path.exists(dst):
+                return
+            self._pending.add(dst)
+
+        args = (src, dst, kind, self.max_px, self.excerpt_chars, codec)
+        if self.workers <= 0:
+            self._finished(dst, generate_preview(*args))
+            return
+        future = self._executor().submit(generate_preview, *args)
+        future.add_done_callback(lambda f: self._finished(dst, not f.cancelled() and f.exception() is None and f.result()))
+
+    def shutdown(self) -> None:
+        pool = self._pool
+        if pool is not None and self._pid == os.getpid():
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+
+    def _finished(self, dst: str, ok: bool) -> None:
+        with self._lock:
+            self._pending.discard(dst)
+            if not ok:
+                # Do not retry broken files on every page view; a restart clears this.
+                self._failed.add(dst)
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is not None and self._pid == os.getpid():
+            return self._pool
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                # A forked worker inherits the parent's pool object but not its processes.
+                self._pid = os.getpid()
+                self._pending.clear()
+                # Not forked: the web worker runs threads (audit writer, emergency cards) whose
+                # locks a forked child could inherit held. The forkserver starts from a clean process.
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(method))
+            return self._pool
+
+
+previews = PreviewWorker()
+
+
+def record_preview(record) -> Preview | None:
+    """Preview for a record if it has been generated; otherwise schedule it and return None."""
+    kind = preview_kind(record.file_path)
+    if kind is None:
+        return None
+
+    path = storage.resolve(preview_path(record.file_path, kind))
+    if not os.path.exists(path):
+        if storage.exists(record.file_path):
+            previews.schedule(record.file_path, record.codec)
+        if not os.path.exists(path):
+            return None
+
+    if kind == "text":
+        with open(path, encoding="utf-8") as fh:
+            return Preview("text", fh.read())
+    return Preview("image")
+
+
+def send_preview(record):
+    kind = preview_kind(record.file_path)
+    if kind is None or kind == "text" or record_preview(record) is None:
+        abort(404)
+    etag = f"{record.sha256}-preview" if record.sha256 else None
+    return storage.send(preview_path(record.file_path, kind), etag=etag)
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable
+
+from flask import Flask, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+_stats: dict[str, dict[str, float]] = {}
+_stats_lock = threading.Lock()
+
+
+def query_budget(limit: int):
+    """Declare the maximum number of SQL statements a view may issue per request."""
+
+    def decorator(fn: Callable):
+        fn.query_budget = limit
+        return fn
+
+    return decorator
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "query_count" in g:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts or not has_request_context() or "query_count" not in g:
+        return
+    g.query_count += 1
+    g.query_time += time.perf_counter() - starts.pop()
+
+
+def _start_request() -> None:
+    g.query_count = 0
+    g.query_time = 0.0
+
+
+def _finish_request(response):
+    if "query_count" not in g or request.endpoint is None:
+        return response
+
+    count = g.query_count
+    elapsed_ms = g.query_time * 1000.0
+    _record(request.endpoint, count, elapsed_ms)
+
+    view = current_app.view_functions.get(request.endpoint)
+    budget = getattr(view, "query_budget", None)
+
+    if current_app.config.get("QUERY_STATS_HEADERS"):
+        response.headers["X-Query-Count"] = str(count)
+        response.headers["X-Query-Time-Ms"] = f"{elapsed_ms:.2f}"
+        if budget is not None:
+            response.headers["X-Query-Budget"] = str(budget)
+
+    if budget is not None and count > budget:
+        message = f"{request.endpoint} issued {count} queries (budget {budget})"
+        if current_app.config.get("QUERY_BUDGET_ENFORCE"):
+            raise QueryBudgetExceeded(message)
+        current_app.logger.warning(message)
+
+    return response
+
+
+def _record(endpoint: str, count: int, elapsed_ms: float) -> None:
+    with _stats_lock:
+        entry = _stats.get(endpoint)
+        if entry is None:
+            entry = _stats[endpoint] = {"requests": 0, "queries": 0, "db_time_ms": 0.0, "max_queries": 0}
+        entry["requests"] += 1
+        entry["queries"] += count
+        entry["db_time_ms"] += elapsed_ms
+        entry["max_queries"] = max(entry["max_queries"], count)
+
+
+def endpoint_stats() -> dict[str, dict[str, float]]:
+    with _stats_lock:
+        return {endpoint: dict(entry) for endpoint, entry in _stats.items()}
+
+
+def reset_stats() -> None:
+    with _stats_lock:
+        _stats.clear()
+
+
+def init_app(app: Flask) -> None:
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
@@ -0,0 +1,426 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+from typing import IO, NamedTuple
+
+from flask import Flask, Request, Response, abort, current_app, request
+from sqlalchemy import event, update
+from sqlalchemy.exc import IntegrityError
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import send_file
+
+from app.extensions import db
+from app.models import MedicalRecord, RecordBlob
+
+
+UPLOADS_PREFIX = "uploads"
+
+GZIP = "gzip"
+
+# Plain-text formats that routinely compress 5-10x; scans and PDFs are already compressed.
+TEXT_EXTENSIONS = {".txt", ".csv", ".tsv", ".hl7", ".json", ".xml", ".md", ".log"}
+
+_EXTENSION_RE = re.compile(r"^\.[a-z0-9]{1,10}$")
+_SHARDED_RE = re.compile(rf"^{UPLOADS_PREFIX}/([0-9a-f]{{2}})/([0-9a-f]{{2}})/\1\2[0-9a-f]{{60}}(\.[a-z0-9]{{1,10}})?$")
+
+
+class StoredUpload(NamedTuple):
+    file_path: str
+    size_bytes: int
+    sha256: str
+    codec: str | None = None
+
+
+class BlobRef(NamedTuple):
+    path: str
+    codec: str | None
+
+
+def upload_root() -> str:
+    return current_app.config.get("UPLOAD_FOLDER") or os.path.join(current_app.root_path, "static", UPLOADS_PREFIX)
+
+
+def wants_compression(file_path: str, size: int) -> bool:
+    config = current_app.config
+    return (
+        bool(config.get("RECORD_COMPRESSION", True))
+        and size >= int(config.get("RECORD_COMPRESSION_MIN_SIZE", 1024))
+        and os.path.splitext(file_path)[1].lower() in TEXT_EXTENSIONS
+    )
+
+
+def _compression_level() -> int:
+    return int(current_app.config.get("RECORD_COMPRESSION_LEVEL", 6))
+
+
+def open_blob(abs_path: str, codec: str | None = None) -> IO[bytes]:
+    """Open a stored file for reading its original bytes. Needs no app context, so workers can use it."""
+    if codec == GZIP:
+        return gzip.open(abs_path, "rb")
+    return open(abs_path, "rb")
+
+
+class LocalStorage:
+    """Record files on local disk under the upload folder.
+
+    Blobs are sharded by hash as ``uploads/ab/cd/<sha256><ext>`` so no directory grows past
+    a few thousand entries. Stored paths are always relative (``uploads/...``) and are
+    resolved against the configured upload folder.
+    """
+
+    def blob_path(self, sha256: str, filename: str | None = None) -> str:
+        # The extension only helps pick a mimetype; the hash is the identity.
+        ext = os.path.splitext(filename or "")[1].lower()
+        return f"{UPLOADS_PREFIX}/{sha256[:2]}/{sha256[2:4]}/{sha256}{ext if _EXTENSION_RE.match(ext) else ''}"
+
+    def is_sharded(self, file_path: str) -> bool:
+        return _SHARDED_RE.match(file_path) is not None
+
+    def resolve(self, file_path: str) -> str:
+        """Absolute path for a stored ``uploads/...`` file path."""
+        prefix = f"{UPLOADS_PREFIX}/"
+        relative = file_path[len(prefix):] if file_path.startswith(prefix) else file_path
+        return os.path.join(upload_root(), *relative.split("/"))
+
+    def exists(self, file_path: str) -> bool:
+        return os.path.isfile(self.resolve(file_path))
+
+    def place(self, spool: HashingSpool, file_path: str) -> None:
+        target = self.resolve(file_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        spool.place(target)
+
+    def link(self, src_path: str, file_path: str, codec: str | None = None) -> None:
+        """Make ``file_path`` another name for an existing file, leaving the source in place.
+
+        With ``codec`` set, ``file_path`` gets an encoded copy of the (plain) source instead.
+        """
+        target = self.resolve(file_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f"{target}.linking"
+        if codec == GZIP:
+            chunk_size = int(current_app.config.get("UPLOAD_CHUNK_SIZE", 64 * 1024))
+            with open(src_path, "rb") as src, open(tmp, "wb") as raw:
+                with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=_compression_level(), mtime=0) as dst:
+                    shutil.copyfileobj(src, dst, chunk_size)
+                raw.flush()
+                os.fsync(raw.fileno())
+        else:
+            try:
+                os.link(src_path, tmp)
+            except OSError:
+                shutil.copy2(src_path, tmp)
+        os.replace(tmp, target)
+
+    def remove(self, file_path: str) -> None:
+        try:
+            os.unlink(self.resolve(file_path))
+        except FileNotFoundError:
+            pass
+
+    def init_app(self, app: Flask) -> None:
+        app.extensions["storage"] = self
+        app.before_request(_hide_uploads_from_static)
+
+    def send(
+        self,
+        file_path: str,
+        etag: str | None = None,
+        download_name: str | None = None,
+        codec: str | None = None,
+    ) -> Response:
+        """Serve a stored file with Range and conditional-request support.
+
+        ``etag`` should be the content hash when known; it is a strong validator. With
+        ``RECORD_DOWNLOAD_OFFLOAD`` set, the bytes are pushed by the front proxy instead.
+        Files stored with ``codec="gzip"`` go out as-is with ``Content-Encoding: gzip`` when
+        the client accepts it, and are decoded on the fly otherwise.
+        """
+        abs_path = self.resolve(file_path)
+        if not os.path.isfile(abs_path):
+            abort(404)
+
+        mimetype = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+        offload = current_app.config.get("RECORD_DOWNLOAD_OFFLOAD") or ""
+        encoded = codec == GZIP and request.accept_encodings[GZIP] > 0
+        if encoded:
+            # A different representation of the same content needs its own strong validator.
+            etag = f"{etag}-{GZIP}" if etag else None
+
+        if codec is not None and not encoded:
+            response = _send_decoded(abs_path, codec, mimetype, etag, download_name)
+        elif offload == "x-accel-redirect":
+            if etag and etag in request.if_none_match:
+                response = current_app.response_class(status=304)
+            else:
+                prefix = current_app.config.get("RECORD_ACCEL_PREFIX", "/_protected/uploads").rstrip("/")
+                relative = file_path.split("/", 1)[1] if file_path.startswith(f"{UPLOADS_PREFIX}/") else file_path
+                # nginx serves the internal location itself, including Range requests.
+                response = current_app.response_class(mimetype=mimetype)
+                response.headers["X-Accel-Redirect"] = f"{prefix}/{relative}"
+                if download_name:
+                    response.headers.set("Content-Disposition", "inline", filename=download_name)
+            if etag:
+                response.set_etag(etag)
+        else:
+            response = send_file(
+                abs_path,
+                request.environ,
+                mimetype=mimetype,
+                download_name=download_name,
+                conditional=True,
+                etag=etag or True,
+                max_age=0,
+                use_x_sendfile=offload == "x-sendfile",
+                response_class=current_app.response_class,
+            )
+
+        if encoded:
+            response.headers["Content-Encoding"] = GZIP
+        if codec is not None:
+            response.vary.add("Accept-Encoding")
+        # Medical records: revalidate every time and never keep in shared caches.
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+
+    def walk(self):
+        """Yield ``(file_path, absolute_path)`` for every stored file, skipping in-flight uploads."""
+        root = upload_root()
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            relative = os.path.relpath(dirpath, root)
+            parts = [] if relative == "." else relative.split(os.sep)
+            for name in filenames:
+                yield "/".join([UPLOADS_PREFIX, *parts, name]), os.path.join(dirpath, name)
+
+
+storage = LocalStorage()
+
+
+def _send_decoded(abs_path: str, codec: str, mimetype: str, etag: str | None, download_name: str | None) -> Response:
+    chunk_size = int(current_app.config.get("UPLOAD_CHUNK_SIZE", 64 * 1024))
+
+    def generate():
+        with open_blob(abs_path, codec) as fh:
+            yield from iter(lambda: fh.read(chunk_size), b"")
+
+    response = current_app.response_class(generate(), mimetype=mimetype, direct_passthrough=True)
+    if download_name:
+        response.headers.set("Content-Disposition", "inline", filename=download_name)
+    if etag:
+        response.set_etag(etag)
+    # Decoded bodies are not seekable, so this only answers If-None-Match; Range gets the full body.
+    return response.make_conditional(request.environ)
+
+
+def _hide_uploads_from_static():
+    # Record files live under static/ by default, but must only be reachable through the
+    # consent-checked record views. The static route normalizes the path after this runs, so
+    # check the path it will resolve ("./uploads/x", "a/../uploads/x"), not the one requested.
+    # Lowercased for case-insensitive filesystems.
+    if request.endpoint != "static":
+        return
+    filename = (request.view_args or {}).get("filename", "").replace("\\", "/")
+    resolved = posixpath.normpath(filename).lstrip("/").lower()
+    if resolved == UPLOADS_PREFIX or resolved.startswith(f"{UPLOADS_PREFIX}/"):
+        abort(404)
+
+
+def _incoming_dir() -> str:
+    # Same filesystem as the final location so placing an upload is a rename, not a copy.
+    path = os.path.join(upload_root(), ".incoming")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class HashingSpool:
+    """Temp file that hashes and counts bytes as they are written and refuses to grow past ``max_size``."""
+
+    def __init__(self, directory: str, max_size: int | None = None) -> None:
+        fd, self.temp_path = tempfile.mkstemp(dir=directory, prefix="upload-", suffix=".part")
+        self._file: IO[bytes] = os.fdopen(fd, "w+b")
+        self._hash = hashlib.sha256()
+        self.size = 0
+        self.max_size = max_size
+        self.placed = False
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            self.close()
+            raise RequestEntityTooLarge(f"Uploads are limited to {self.max_size} bytes.")
+        self._hash.update(data)
+        return self._file.write(data)
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    def place(self, final_path: str) -> None:
+        """Durably move the spooled bytes to ``final_path`` in one atomic rename."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        os.replace(self.temp_path, final_path)
+        self.placed = True
+
+    def compress(self, level: int, max_ratio: float = 0.9) -> bool:
+        """Swap the spooled bytes for a gzip stream of them if it is at most ``max_ratio`` of the size.
+
+        ``sha256`` and ``size`` keep describing the original content.
+        """
+        fd, gz_path = tempfile.mkstemp(dir=os.path.dirname(self.temp_path), prefix="upload-", suffix=".gz.part")
+        out = os.fdopen(fd, "w+b")
+        try:
+            self._file.seek(0)
+            with gzip.GzipFile(fileobj=out, mode="wb", compresslevel=level, mtime=0) as gz:
+                shutil.copyfileobj(self._file, gz, 64 * 1024)
+        except BaseException:
+            out.close()
+            os.unlink(gz_path)
+            raise
+
+        if out.tell() > self.size * max_ratio:
+            out.close()
+            os.unlink(gz_path)
+            return False
+
+        self._file.close()
+        os.unlink(self.temp_path)
+        self._file, self.temp_path = out, gz_path
+        return True
+
+    def close(self) -> None:
+        # Werkzeug closes every uploaded file when the request ends, so anything not placed is dropped here.
+        self._file.close()
+        if not self.placed:
+            try:
+                os.unlink(self.temp_path)
+            except FileNotFoundError:
+                pass
+
+    def __getattr__(self, name: str):
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+
+class UploadRequest(Request):
+    """Request class that streams multipart file parts straight into hashing spools in the upload folder."""
+
+    def close(self) -> None:
+        # Spools of parts parsed before a later part hit the size limit never made it into
+        # ``files``, so the base class would leave their temp files behind.
+        try:
+            super().close()
+        finally:
+            for spool in self.__dict__.get("_spools", ()):
+                spool.close()
+
+    def _get_file_stream(
+        self,
+        total_content_length: int | None,
+        content_type: str | None,
+        filename: str | None = None,
+        content_length: int | None = None,
+    ) -> IO[bytes]:
+        max_size = current_app.config.get("MAX_UPLOAD_SIZE")
+        if max_size is not None and content_length is not None and content_length > max_size:
+            raise RequestEntityTooLarge(f"Uploads are limited to {max_size} bytes.")
+        spool = HashingSpool(_incoming_dir(), max_size)
+        self.__dict__.setdefault("_spools", []).append(spool)
+        return spool  # type: ignore[return-value]
+
+
+def hash_file(path: str) -> tuple[str, int]:
+    digest = hashlib.sha256()
+    size = 0
+    chunk_size = int(current_app.config.get("UPLOAD_CHUNK_SIZE", 64 * 1024))
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def acquire_blob(sha256: str) -> BlobRef | None:
+    """Take a reference on an existing blob and return where it is stored, or None if there is no such blob."""
+    result = db.session.execute(
+        update(RecordBlob).where(RecordBlob.sha256 == sha256).values(ref_count=RecordBlob.ref_count + 1)
+    )
+    if not result.rowcount:
+        return None
+    row = db.session.query(RecordBlob.path, RecordBlob.codec).filter(RecordBlob.sha256 == sha256).one()
+    return BlobRef(row.path, row.codec)
+
+
+def create_blob(sha256: str, path: str, size_bytes: int, codec: str | None = None) -> BlobRef:
+    """Insert a blob holding one reference; if a concurrent writer got there first, take a reference on theirs."""
+    try:
+        with db.session.begin_nested():
+            db.session.add(RecordBlob(sha256=sha256, path=path, size_bytes=size_bytes, codec=codec, ref_count=1))
+    except IntegrityError:
+        existing = acquire_blob(sha256)
+        if existing is None:
+            raise
+        return existing
+    return BlobRef(path, codec)
+
+
+def store_upload(f: FileStorage) -> StoredUpload:
+    """Store an upload by content hash and take a reference on its blob in the current transaction.
+
+    Identical content is kept once: a second upload only bumps the blob's ``ref_count``.
+    Text-like files are stored gzip-compressed when that pays off.
+    """
+    spool = f.stream
+    if not isinstance(spool, HashingSpool):
+        # Not parsed by UploadRequest (e.g. a FileStorage built by hand); copy it through a spool in chunks.
+        spool = HashingSpool(_incoming_dir(), current_app.config.get("MAX_UPLOAD_SIZE"))
+        try:
+            shutil.copyfileobj(f.stream, spool, int(current_app.config.get("UPLOAD_CHUNK_SIZE", 64 * 1024)))
+        except BaseException:
+            spool.close()
+            raise
+
+    try:
+        sha256 = spool.sha256
+        blob = acquire_blob(sha256)
+        if blob is None:
+            path = storage.blob_path(sha256, f.filename)
+            codec = GZIP if wants_compression(path, spool.size) and spool.compress(_compression_level()) else None
+            storage.place(spool, path)
+            blob = create_blob(sha256, path, spool.size, codec)
+        elif not storage.exists(blob.path):
+            # The row survived but the file did not; heal it from this copy, encoded the way the row says.
+            if blob.codec == GZIP:
+                spool.compress(_compression_level(), max_ratio=float("inf"))
+            storage.place(spool, blob.path)
+    finally:
+        # Unplaced spools delete themselves; werkzeug closing f again later is harmless.
+        spool.close()
+    return StoredUpload(file_path=blob.path, size_bytes=spool.size, sha256=sha256, codec=blob.codec)
+
+
+@event.listens_for(MedicalRecord, "after_delete")
+def _release_blob(mapper, connection, target: MedicalRecord) -> None:
+    # The blob itself is only removed by scripts/gc_record_blobs.py, after a grace period.
+    if target.sha256:
+        connection.execute(
+            update(RecordBlob.__table__)
+            .where(RecordBlob.__table__.c.sha256 == target.sha256)
+            .values(ref_count=RecordBlob.__table__.c.ref_count - 1)
+        )
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import contains_eager, joinedload
+
+from app.extensions import db
+from app.models import Doctor, Patient, User
+from app.utils.audit import log_action
+from app.utils.counters import bump, role_key
+from app.utils.doctor_search import index_doctors
+
+
+ROLES = ("patient", "doctor", "admin", "pharmacy", "emergency")
+
+# Most rows a single bulk update may touch; the selection comes from one page of checkboxes.
+BULK_UPDATE_LIMIT = 500
+
+# Organization filter value for doctors attached to none.
+NO_ORGANIZATION = "none"
+
+
+def _starts_with(expression, prefix: str, dialect: str):
+    # MySQL reads an index for LIKE 'ab%' as a range, and its collations do not sort by code point,
+    # so a hand-built upper bound could miss rows there. SQLite only reads an index for LIKE on
+    # NOCASE columns, but compares in code point order, so there the range is exact.
+    if dialect != "sqlite" or ord(prefix[-1]) >= 0x10FFFF:
+        return expression.startswith(prefix, autoescape=True)
+    return and_(expression >= prefix, expression < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+
+def search_condition(q: str | None):
+    """Users whose email, name or phone starts with ``q``; None for a blank query.
+
+    Each branch is a range over its own index (users.email, lower(users.name), users.phone), so the
+    database can union the matches instead of scanning every user.
+    """
+    q = (q or "").strip()
+    if not q:
+        return None
+    lowered = q.lower()
+    dialect = db.session.get_bind().dialect.name
+    terms = [_starts_with(User.email, lowered, dialect), _starts_with(func.lower(User.name), lowered, dialect)]
+    if any(c.isdigit() for c in q):
+        terms.append(_starts_with(User.phone, q, dialect))
+    return or_(*terms)
+
+
+def users_query(q: str | None = None, role: str | None = None):
+    query = User.query
+    if role in ROLES:
+        query = query.filter(User.role == role)
+    condition = search_condition(q)
+    if condition is not None:
+        query = query.filter(condition)
+    return query
+
+
+def doctors_query(q: str | None = None, organization: str | None = None):
+    # Every doctor has a user row, so the join doubles as the eager load for the listing.
+    query = (
+        Doctor.query.join(Doctor.user)
+        .options(contains_eager(Doctor.user), joinedload(Doctor.organization))
+    )
+    if organization == NO_ORGANIZATION:
+        query = query.filter(Doctor.organization_id.is_(None))
+    elif organization and organization.isdigit():
+        query = query.filter(Doctor.organization_id == int(organization))
+    condition = search_condition(q)
+    if condition is not None:
+        query = query.filter(condition)
+    return query
+
+
+def set_roles(user_ids: list[int], role: str) -> list[int]:
+    """Give every listed user ``role`` with one UPDATE in the caller's transaction. Returns the ids changed.
+
+    A core UPDATE skips the ORM hooks that keep the per-role summary counts, so they are adjusted
+    here from the roles the rows had before.
+    """
+    rows = (
+        db.session.query(User.id, User.role)
+        .filter(User.id.in_(user_ids), User.role != role)
+        .with_for_update()
+        .all()
+    )
+    if not rows:
+        return []
+
+    changed = [user_id for user_id, _old in rows]
+    db.session.execute(
+        update(User).where(User.id.in_(changed)).values(role=role).execution_options(synchronize_session=False)
+    )
+    deltas: Counter = Counter()
+    for _user_id, old in rows:
+        deltas[role_key(old)] -= 1
+        deltas[role_key(role)] += 1
+    bump(db.session.connection(), deltas)
+
+    # Only patients have emergency cards; other workers notice the role change through this.
+    Patient.query.filter(Patient.user_id.in_(changed)).update(
+        {Patient.updated_at: datetime.utcnow()}, synchronize_session=False
+    )
+    # Buffered for this request, so all of these go out as one insert inside the same commit.
+    for user_id in changed:
+        log_action("admin_update_role", "user", entity_id=user_id)
+    return changed
+
+
+def update_doctors(doctor_ids: list[int], specialization: str | None = None, hospital_id: str | None = None) -> list[int]:
+    """Set the given fields on every listed doctor with one UPDATE; blank fields are left as they are."""
+    values = {}
+    if specialization:
+        values[Doctor.specialization] = specialization
+    if hospital_id:
+        values[Doctor.hospital_id] = hospital_id
+    if not values or not doctor_ids:
+        return []
+
+    changed = list(db.session.scalars(select(Doctor.user_id).where(Doctor.user_id.in_(doctor_ids))))
+    if not changed:
+        return []
+    db.session.execute(
+        update(Doctor).where(Doctor.user_id.in_(changed)).values(values).execution_options(synchronize_session=False)
+    )
+    index_doctors(changed)
+    for doctor_id in changed:
+        log_action("admin_update_doctor", "doctor", entity_id=doctor_id)
+    return changed
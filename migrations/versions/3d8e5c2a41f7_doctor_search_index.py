@@ -0,0 +1,61 @@
+"""doctor directory full-text search index
+
+Revision ID: 3d8e5c2a41f7
+Revises: 7a2f3b1c9e10
+Create Date: 2026-02-03
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "3d8e5c2a41f7"
+down_revision = "7a2f3b1c9e10"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    dialect = bind.dialect.name
+    inspector = sa.inspect(bind)
+
+    # Other dialects keep using the LIKE fallback in search_doctors().
+    if dialect not in {"sqlite", "mysql"}:
+        return
+
+    if inspector.has_table("doctor_search"):
+        op.execute("DELETE FROM doctor_search")
+    elif dialect == "sqlite":
+        op.execute(
+            "CREATE VIRTUAL TABLE doctor_search USING fts5("
+            "name, email, specialization, hospital_id, tokenize='unicode61 remove_diacritics 2')"
+        )
+    else:
+        op.execute(
+            "CREATE TABLE doctor_search ("
+            "doctor_id INTEGER NOT NULL PRIMARY KEY, "
+            "document TEXT NOT NULL, "
+            "FULLTEXT KEY ft_doctor_search_document (document) WITH PARSER ngram"
+            ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+        )
+
+    # Backfill from the current doctors; the app keeps rows fresh via index_doctor().
+    if dialect == "sqlite":
+        op.execute(
+            "INSERT INTO doctor_search (rowid, name, email, specialization, hospital_id) "
+            "SELECT d.user_id, COALESCE(u.name, ''), u.email, d.specialization, COALESCE(d.hospital_id, '') "
+            "FROM doctors d JOIN users u ON u.id = d.user_id"
+        )
+    else:
+        op.execute(
+            "INSERT INTO doctor_search (doctor_id, document) "
+            "SELECT d.user_id, CONCAT_WS(' ', u.name, u.email, d.specialization, d.hospital_id) "
+            "FROM doctors d JOIN users u ON u.id = d.user_id"
+        )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS doctor_search")
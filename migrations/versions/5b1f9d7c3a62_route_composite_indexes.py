@@ -0,0 +1,60 @@
+"""composite indexes for route access patterns
+
+Revision ID: 5b1f9d7c3a62
+Revises: 3d8e5c2a41f7
+Create Date: 2026-02-05
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "5b1f9d7c3a62"
+down_revision = "3d8e5c2a41f7"
+branch_labels = None
+depends_on = None
+
+
+# (table, index name, columns). The primary key is implicitly the last column of every
+# secondary index on both SQLite and InnoDB, so (filter, sort) also serves (sort, id) keyset pages.
+INDEXES = [
+    ("appointments", "ix_appointments_patient_id_scheduled_at", ["patient_id", "scheduled_at"]),
+    ("appointments", "ix_appointments_doctor_id_scheduled_at", ["doctor_id", "scheduled_at"]),
+    ("appointments", "ix_appointments_doctor_id_patient_id_scheduled_at", ["doctor_id", "patient_id", "scheduled_at"]),
+    ("medical_records", "ix_medical_records_patient_id_uploaded_at", ["patient_id", "uploaded_at"]),
+    (
+        "medical_records",
+        "ix_medical_records_patient_id_appointment_id_uploaded_at",
+        ["patient_id", "appointment_id", "uploaded_at"],
+    ),
+    ("consents", "ix_consents_organization_id_revoked_at_patient_id", ["organization_id", "revoked_at", "patient_id"]),
+    ("audit_events", "ix_audit_events_patient_id_timestamp", ["patient_id", "timestamp"]),
+    ("doctor_feedback", "ix_doctor_feedback_doctor_id_created_at", ["doctor_id", "created_at"]),
+    ("doctors", "ix_doctors_specialization", ["specialization"]),
+    ("users", "ix_users_created_at", ["created_at"]),
+    ("prescriptions", "ix_prescriptions_pharmacy_id_issued_at", ["pharmacy_id", "issued_at"]),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    for table, name, columns in INDEXES:
+        if not inspector.has_table(table):
+            continue
+        existing = {ix["name"] for ix in inspector.get_indexes(table)}
+        if name not in existing:
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    for table, name, _columns in reversed(INDEXES):
+        if not inspector.has_table(table):
+            continue
+        existing = {ix["name"] for ix in inspector.get_indexes(table)}
+        if name in existing:
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,37 @@
+"""medical record size and sha256
+
+Revision ID: 8c4e2f6a9d13
+Revises: 5b1f9d7c3a62
+Create Date: 2026-02-10
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "8c4e2f6a9d13"
+down_revision = "5b1f9d7c3a62"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    cols = {c["name"] for c in inspector.get_columns("medical_records")}
+
+    # Existing rows stay NULL; only uploads made through the streaming path are measured.
+    with op.batch_alter_table("medical_records", schema=None) as batch_op:
+        if "size_bytes" not in cols:
+            batch_op.add_column(sa.Column("size_bytes", sa.BigInteger(), nullable=True))
+        if "sha256" not in cols:
+            batch_op.add_column(sa.Column("sha256", sa.String(length=64), nullable=True))
+            batch_op.create_index(batch_op.f("ix_medical_records_sha256"), ["sha256"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("medical_records", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_medical_records_sha256"))
+        batch_op.drop_column("sha256")
+        batch_op.drop_column("size_bytes")
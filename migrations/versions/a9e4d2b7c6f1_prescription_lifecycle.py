@@ -0,0 +1,66 @@
+"""prescription status events and per-pharmacy status counters
+
+Revision ID: a9e4d2b7c6f1
+Revises: f2a6c8d41e97
+Create Date: 2026-02-20
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a9e4d2b7c6f1"
+down_revision = "f2a6c8d41e97"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    if "prescription_events" not in tables:
+        op.create_table(
+            "prescription_events",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("prescription_id", sa.Integer(), nullable=False),
+            sa.Column("actor_id", sa.Integer(), nullable=True),
+            sa.Column("pharmacy_id", sa.Integer(), nullable=True),
+            sa.Column("kind", sa.String(length=32), nullable=False),
+            sa.Column("from_status", sa.String(length=32), nullable=True),
+            sa.Column("to_status", sa.String(length=32), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(["prescription_id"], ["prescriptions.id"], ondelete="CASCADE"),
+            sa.ForeignKeyConstraint(["actor_id"], ["users.id"], ondelete="SET NULL"),
+            sa.ForeignKeyConstraint(["pharmacy_id"], ["users.id"], ondelete="SET NULL"),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index(
+            "ix_prescription_events_prescription_id_created_at",
+            "prescription_events",
+            ["prescription_id", "created_at"],
+            unique=False,
+        )
+
+    if "prescription_status_counts" not in tables:
+        op.create_table(
+            "prescription_status_counts",
+            sa.Column("pharmacy_id", sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column("status", sa.String(length=32), nullable=False),
+            sa.Column("count", sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint("pharmacy_id", "status"),
+        )
+        # Unrouted prescriptions are counted under pharmacy 0.
+        op.execute(
+            "INSERT INTO prescription_status_counts (pharmacy_id, status, count) "
+            "SELECT COALESCE(pharmacy_id, 0), fulfillment_status, COUNT(*) "
+            "FROM prescriptions GROUP BY COALESCE(pharmacy_id, 0), fulfillment_status"
+        )
+
+
+def downgrade():
+    op.drop_table("prescription_status_counts")
+    op.drop_index("ix_prescription_events_prescription_id_created_at", table_name="prescription_events")
+    op.drop_table("prescription_events")
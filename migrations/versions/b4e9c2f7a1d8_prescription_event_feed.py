@@ -0,0 +1,60 @@
+"""prescription_events as the pharmacy change feed
+
+Revision ID: b4e9c2f7a1d8
+Revises: e8c1f4a7b2d3
+Create Date: 2026-02-28
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b4e9c2f7a1d8"
+down_revision = "e8c1f4a7b2d3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("prescription_events"):
+        return
+    columns = {c["name"] for c in inspector.get_columns("prescription_events")}
+    indexes = {ix["name"] for ix in inspector.get_indexes("prescription_events")}
+
+    with op.batch_alter_table("prescription_events", schema=None) as batch_op:
+        if "previous_pharmacy_id" not in columns:
+            # Earlier reassignments keep NULL here; only their new pharmacy's feed saw them.
+            batch_op.add_column(sa.Column("previous_pharmacy_id", sa.Integer(), nullable=True))
+            batch_op.create_foreign_key(
+                "fk_prescription_events_previous_pharmacy_id_users",
+                "users",
+                ["previous_pharmacy_id"],
+                ["id"],
+                ondelete="SET NULL",
+            )
+        if "ix_prescription_events_pharmacy_id_id" not in indexes:
+            batch_op.create_index("ix_prescription_events_pharmacy_id_id", ["pharmacy_id", "id"], unique=False)
+        if "ix_prescription_events_previous_pharmacy_id_id" not in indexes:
+            batch_op.create_index(
+                "ix_prescription_events_previous_pharmacy_id_id", ["previous_pharmacy_id", "id"], unique=False
+            )
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("prescription_events"):
+        return
+    columns = {c["name"] for c in inspector.get_columns("prescription_events")}
+    indexes = {ix["name"] for ix in inspector.get_indexes("prescription_events")}
+
+    with op.batch_alter_table("prescription_events", schema=None) as batch_op:
+        if "ix_prescription_events_previous_pharmacy_id_id" in indexes:
+            batch_op.drop_index("ix_prescription_events_previous_pharmacy_id_id")
+        if "ix_prescription_events_pharmacy_id_id" in indexes:
+            batch_op.drop_index("ix_prescription_events_pharmacy_id_id")
+        if "previous_pharmacy_id" in columns:
+            batch_op.drop_constraint("fk_prescription_events_previous_pharmacy_id_users", type_="foreignkey")
+            batch_op.drop_column("previous_pharmacy_id")
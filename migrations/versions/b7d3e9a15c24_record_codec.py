@@ -0,0 +1,34 @@
+"""at-rest codec for record blobs
+
+Revision ID: b7d3e9a15c24
+Revises: e41a7b9c2d58
+Create Date: 2026-02-16
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b7d3e9a15c24"
+down_revision = "e41a7b9c2d58"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    # Existing files were stored as uploaded, which is what NULL means.
+    for table in ("record_blobs", "medical_records"):
+        cols = {c["name"] for c in inspector.get_columns(table)}
+        if "codec" not in cols:
+            with op.batch_alter_table(table, schema=None) as batch_op:
+                batch_op.add_column(sa.Column("codec", sa.String(length=16), nullable=True))
+
+
+def downgrade():
+    for table in ("medical_records", "record_blobs"):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column("codec")
@@ -0,0 +1,39 @@
+"""patients.updated_at for incremental emergency card refreshes
+
+Revision ID: c3f8a1d5e2b9
+Revises: a9e4d2b7c6f1
+Create Date: 2026-02-22
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c3f8a1d5e2b9"
+down_revision = "a9e4d2b7c6f1"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    cols = {c["name"] for c in inspector.get_columns("patients")}
+    if "updated_at" in cols:
+        return
+
+    with op.batch_alter_table("patients", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("updated_at", sa.DateTime(), nullable=True))
+
+    op.execute("UPDATE patients SET updated_at = CURRENT_TIMESTAMP")
+
+    with op.batch_alter_table("patients", schema=None) as batch_op:
+        batch_op.alter_column("updated_at", existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_index(batch_op.f("ix_patients_updated_at"), ["updated_at"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("patients", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_patients_updated_at"))
+        batch_op.drop_column("updated_at")
@@ -0,0 +1,46 @@
+"""audit_logs.entity_id for the row an action touched
+
+Revision ID: c7d3a9e5f1b2
+Revises: b4e9c2f7a1d8
+Create Date: 2026-03-02
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c7d3a9e5f1b2"
+down_revision = "b4e9c2f7a1d8"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("audit_logs"):
+        return
+    columns = {c["name"] for c in inspector.get_columns("audit_logs")}
+    indexes = {ix["name"] for ix in inspector.get_indexes("audit_logs")}
+
+    with op.batch_alter_table("audit_logs", schema=None) as batch_op:
+        if "entity_id" not in columns:
+            # Earlier rows keep NULL; they only recorded the kind of entity.
+            batch_op.add_column(sa.Column("entity_id", sa.Integer(), nullable=True))
+        if "ix_audit_logs_entity_entity_id" not in indexes:
+            batch_op.create_index("ix_audit_logs_entity_entity_id", ["entity", "entity_id"], unique=False)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("audit_logs"):
+        return
+    columns = {c["name"] for c in inspector.get_columns("audit_logs")}
+    indexes = {ix["name"] for ix in inspector.get_indexes("audit_logs")}
+
+    with op.batch_alter_table("audit_logs", schema=None) as batch_op:
+        if "ix_audit_logs_entity_entity_id" in indexes:
+            batch_op.drop_index("ix_audit_logs_entity_entity_id")
+        if "entity_id" in columns:
+            batch_op.drop_column("entity_id")
@@ -0,0 +1,80 @@
+"""summary_counts for the admin overview
+
+Revision ID: d5b2e7f9a4c6
+Revises: c3f8a1d5e2b9
+Create Date: 2026-02-24
+
+"""
+
+from datetime import date, datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d5b2e7f9a4c6"
+down_revision = "c3f8a1d5e2b9"
+branch_labels = None
+depends_on = None
+
+
+summary_counts = sa.table(
+    "summary_counts",
+    sa.column("key", sa.String),
+    sa.column("count", sa.BigInteger),
+    sa.column("updated_at", sa.DateTime),
+)
+users = sa.table("users", sa.column("id", sa.Integer), sa.column("role", sa.String), sa.column("created_at", sa.DateTime))
+doctors = sa.table("doctors", sa.column("user_id", sa.Integer), sa.column("organization_id", sa.Integer))
+audit_logs = sa.table("audit_logs", sa.column("id", sa.Integer), sa.column("timestamp", sa.DateTime))
+
+
+def _day(value) -> str:
+    return value.isoformat() if isinstance(value, date) else str(value)[:10]
+
+
+def upgrade():
+    bind = op.get_bind()
+    if sa.inspect(bind).has_table("summary_counts"):
+        return
+
+    op.create_table(
+        "summary_counts",
+        sa.Column("key", sa.String(length=128), primary_key=True),
+        sa.Column("count", sa.BigInteger(), nullable=False, server_default=sa.text("0")),
+        sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.text("CURRENT_TIMESTAMP")),
+    )
+
+    # One grouped pass per table; the app keeps the rows current from here on.
+    counts: dict[str, int] = {}
+    for role, n in bind.execute(sa.select(users.c.role, sa.func.count()).group_by(users.c.role)):
+        counts[f"users.role:{role}"] = n
+    counts["users"] = sum(counts.values())
+    signup_day = sa.func.date(users.c.created_at)
+    for day, n in bind.execute(sa.select(signup_day, sa.func.count()).group_by(signup_day)):
+        counts[f"users.day:{_day(day)}"] = n
+
+    total = 0
+    for org_id, n in bind.execute(sa.select(doctors.c.organization_id, sa.func.count()).group_by(doctors.c.organization_id)):
+        counts[f"doctors.org:{org_id or 0}"] = counts.get(f"doctors.org:{org_id or 0}", 0) + n
+        total += n
+    counts["doctors"] = total
+
+    counted_through = bind.execute(sa.select(sa.func.max(audit_logs.c.id))).scalar() or 0
+    audit_day = sa.func.date(audit_logs.c.timestamp)
+    total = 0
+    for day, n in bind.execute(
+        sa.select(audit_day, sa.func.count()).where(audit_logs.c.id <= counted_through).group_by(audit_day)
+    ):
+        counts[f"audit_logs.day:{_day(day)}"] = n
+        total += n
+    counts["audit_logs"] = total
+    counts["audit_logs.counted_through"] = counted_through
+
+    now = datetime.utcnow()
+    op.bulk_insert(summary_counts, [{"key": k, "count": v, "updated_at": now} for k, v in counts.items()])
+
+
+def downgrade():
+    op.drop_table("summary_counts")
@@ -0,0 +1,54 @@
+"""content-addressed record blobs
+
+Revision ID: e41a7b9c2d58
+Revises: 8c4e2f6a9d13
+Create Date: 2026-02-12
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e41a7b9c2d58"
+down_revision = "8c4e2f6a9d13"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table("record_blobs"):
+        op.create_table(
+            "record_blobs",
+            sa.Column("sha256", sa.String(length=64), primary_key=True),
+            sa.Column("path", sa.String(length=512), nullable=False),
+            sa.Column("size_bytes", sa.BigInteger(), nullable=False),
+            sa.Column("ref_count", sa.Integer(), nullable=False, server_default=sa.text("0")),
+            sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.text("CURRENT_TIMESTAMP")),
+            sa.UniqueConstraint("path", name="uq_record_blobs_path"),
+        )
+        with op.batch_alter_table("record_blobs", schema=None) as batch_op:
+            batch_op.create_index(batch_op.f("ix_record_blobs_ref_count"), ["ref_count"], unique=False)
+
+    # Hashes recorded before the blob store have no blob row yet; scripts/backfill_record_blobs.py
+    # recomputes them while moving the files into the store.
+    op.execute("UPDATE medical_records SET sha256 = NULL WHERE sha256 NOT IN (SELECT sha256 FROM record_blobs)")
+
+    with op.batch_alter_table("medical_records", schema=None) as batch_op:
+        batch_op.create_foreign_key(
+            "fk_medical_records_sha256_record_blobs",
+            "record_blobs",
+            ["sha256"],
+            ["sha256"],
+            ondelete="RESTRICT",
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("medical_records", schema=None) as batch_op:
+        batch_op.drop_constraint("fk_medical_records_sha256_record_blobs", type_="foreignkey")
+
+    op.drop_table("record_blobs")
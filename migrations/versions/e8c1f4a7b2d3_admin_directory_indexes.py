@@ -0,0 +1,56 @@
+"""indexes for the admin user directory
+
+Revision ID: e8c1f4a7b2d3
+Revises: d5b2e7f9a4c6
+Create Date: 2026-02-26
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e8c1f4a7b2d3"
+down_revision = "d5b2e7f9a4c6"
+branch_labels = None
+depends_on = None
+
+
+# (index name, columns or expressions) on users.
+INDEXES = [
+    ("ix_users_role_created_at", ["role", "created_at"]),
+    ("ix_users_phone", ["phone"]),
+    # Functional index: SQLite 3.9+ and MySQL 8.0.13+.
+    ("ix_users_name_lower", [sa.func.lower(sa.column("name"))]),
+]
+
+
+def _existing(bind) -> set[str]:
+    names = {ix["name"] for ix in sa.inspect(bind).get_indexes("users")}
+    if bind.dialect.name == "sqlite":
+        # SQLite reflection leaves out expression indexes.
+        names |= set(bind.execute(sa.text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'users'")).scalars())
+    return names
+
+
+def upgrade():
+    bind = op.get_bind()
+    if not sa.inspect(bind).has_table("users"):
+        return
+
+    existing = _existing(bind)
+    for name, columns in INDEXES:
+        if name not in existing:
+            op.create_index(name, "users", columns, unique=False)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if not sa.inspect(bind).has_table("users"):
+        return
+
+    existing = _existing(bind)
+    for name, _columns in reversed(INDEXES):
+        if name in existing:
+            op.drop_index(name, table_name="users")
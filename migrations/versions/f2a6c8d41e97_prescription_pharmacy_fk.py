@@ -0,0 +1,64 @@
+"""prescriptions.pharmacy_id as an integer foreign key
+
+Revision ID: f2a6c8d41e97
+Revises: b7d3e9a15c24
+Create Date: 2026-02-18
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "f2a6c8d41e97"
+down_revision = "b7d3e9a15c24"
+branch_labels = None
+depends_on = None
+
+
+QUEUE_INDEX = "ix_prescriptions_pharmacy_id_fulfillment_status_issued_at"
+OLD_INDEXES = ("ix_prescriptions_pharmacy_id_issued_at", "ix_prescriptions_pharmacy_id")
+FK_NAME = "fk_prescriptions_pharmacy_id_users"
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    cols = {c["name"]: c for c in inspector.get_columns("prescriptions")}
+    if isinstance(cols["pharmacy_id"]["type"], sa.Integer):
+        return
+    existing = {ix["name"] for ix in inspector.get_indexes("prescriptions")}
+
+    # Values were typed in by hand; anything that is not a user id cannot become a foreign key.
+    op.execute(
+        "UPDATE prescriptions SET pharmacy_id = NULL "
+        "WHERE pharmacy_id IS NOT NULL AND pharmacy_id NOT IN (SELECT CAST(id AS CHAR) FROM users)"
+    )
+
+    with op.batch_alter_table("prescriptions", schema=None) as batch_op:
+        for name in OLD_INDEXES:
+            if name in existing:
+                batch_op.drop_index(name)
+        batch_op.alter_column(
+            "pharmacy_id",
+            existing_type=sa.String(length=64),
+            type_=sa.Integer(),
+            existing_nullable=True,
+            postgresql_using="pharmacy_id::integer",
+        )
+        batch_op.create_foreign_key(FK_NAME, "users", ["pharmacy_id"], ["id"], ondelete="SET NULL")
+        batch_op.create_index(QUEUE_INDEX, ["pharmacy_id", "fulfillment_status", "issued_at"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("prescriptions", schema=None) as batch_op:
+        batch_op.drop_index(QUEUE_INDEX)
+        batch_op.drop_constraint(FK_NAME, type_="foreignkey")
+        batch_op.alter_column(
+            "pharmacy_id",
+            existing_type=sa.Integer(),
+            type_=sa.String(length=64),
+            existing_nullable=True,
+        )
+        batch_op.create_index("ix_prescriptions_pharmacy_id", ["pharmacy_id"], unique=False)
+        batch_op.create_index("ix_prescriptions_pharmacy_id_issued_at", ["pharmacy_id", "issued_at"], unique=False)
@@ -0,0 +1,107 @@
+"""Move medical record files uploaded before the blob store into it.
+
+Each record's file is hashed and either becomes a new blob or takes a reference on an
+existing one with the same content. New text-like blobs are written gzip-compressed. Records are processed in id order, one committed batch
+at a time, so the script can be interrupted and re-run. Old files are only removed after the
+batch that stopped referencing them has committed.
+
+    python scripts/backfill_record_blobs.py [--batch-size 200] [--dry-run]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app import create_app
+from app.extensions import db
+from app.models import MedicalRecord, RecordBlob
+from app.utils.storage import GZIP, acquire_blob, create_blob, hash_file, storage, wants_compression
+
+
+def backfill_batch(records: list[MedicalRecord], dry_run: bool) -> tuple[int, int, list[str]]:
+    moved = missing = 0
+    stale_files: list[str] = []
+
+    for rec in records:
+        old_abs = storage.resolve(rec.file_path)
+        if not os.path.isfile(old_abs):
+            print(f"[backfill] record {rec.id}: missing file {rec.file_path}")
+            missing += 1
+            continue
+
+        sha256, size = hash_file(old_abs)
+        if dry_run:
+            print(f"[backfill] record {rec.id}: {rec.file_path} -> {storage.blob_path(sha256, rec.file_path)}")
+            moved += 1
+            continue
+
+        blob = acquire_blob(sha256)
+        if blob is None:
+            path = storage.blob_path(sha256, rec.file_path)
+            blob = create_blob(sha256, path, size, GZIP if wants_compression(path, size) else None)
+        if not storage.exists(blob.path):
+            # Keep the old name valid until the batch commits; a hard link makes that free.
+            storage.link(old_abs, blob.path, blob.codec)
+
+        if blob.path != rec.file_path:
+            stale_files.append(rec.file_path)
+        rec.file_path = blob.path
+        rec.sha256 = sha256
+        rec.size_bytes = size
+        rec.codec = blob.codec
+        moved += 1
+
+    return moved, missing, stale_files
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--env", default=os.getenv("FLASK_ENV", "development"))
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true", help="report what would move without changing anything")
+    args = parser.parse_args()
+
+    app = create_app(args.env)
+    with app.app_context():
+        last_id = 0
+        total_moved = total_missing = 0
+        while True:
+            batch = (
+                MedicalRecord.query.outerjoin(MedicalRecord.blob)
+                .filter(MedicalRecord.id > last_id)
+                .filter((MedicalRecord.sha256.is_(None)) | (RecordBlob.path != MedicalRecord.file_path))
+                .order_by(MedicalRecord.id.asc())
+                .limit(args.batch_size)
+                .all()
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            moved, missing, stale_files = backfill_batch(batch, args.dry_run)
+            total_moved += moved
+            total_missing += missing
+
+            if args.dry_run:
+                db.session.rollback()
+                continue
+
+            db.session.commit()
+            for file_path in set(stale_files):
+                still_used = MedicalRecord.query.filter(MedicalRecord.file_path == file_path).limit(1).count()
+                if not still_used:
+                    storage.remove(file_path)
+            print(f"[backfill] committed through record {last_id}: {moved} stored, {missing} missing")
+
+        print(f"[backfill] done: {total_moved} records stored, {total_missing} missing files")
+        return 1 if total_missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
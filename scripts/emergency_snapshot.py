@@ -0,0 +1,381 @@
+"""Build, update and query an offline snapshot of patients' emergency cards.
+
+The snapshot is a single read-only SQLite file holding only what the emergency lookup page
+shows, indexed by patient id, normalized email and normalized phone. Crews carry it on a
+laptop and look patients up with no database or network:
+
+    python scripts/emergency_snapshot.py build emergency.sqlite3
+    python scripts/emergency_snapshot.py delta emergency.sqlite3
+    python scripts/emergency_snapshot.py lookup emergency.sqlite3 patient1@example.com
+    python scripts/emergency_snapshot.py serve emergency.sqlite3 [--host 127.0.0.1] [--port 8099]
+    EMERGENCY_SNAPSHOT_TOKEN=... python scripts/emergency_snapshot.py serve emergency.sqlite3 --host 0.0.0.0
+
+``build`` streams every patient into a new file. ``delta`` applies patients changed since the
+snapshot's watermark (``Patient.updated_at``) and drops patients that no longer exist. Both write
+to a temporary file and swap it in, so a running ``serve`` keeps reading a complete snapshot.
+``lookup`` and ``serve`` only ever open the file read-only; ``serve`` appends every lookup to
+``<snapshot>.lookups.jsonl`` so offline access can be audited later.
+
+``serve`` answers loopback only unless ``EMERGENCY_SNAPSHOT_TOKEN`` is set. With a token every
+request must carry it, as ``Authorization: Bearer <token>`` or as the password of HTTP basic auth
+(what a browser prompts for), and it may then listen on other interfaces.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hmac
+import html
+import ipaddress
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import sys
+from base64 import b64decode
+from contextlib import closing
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app import create_app
+from app.extensions import db
+from app.models import Patient, User
+from app.utils.emergency_cards import card_query, normalize_email, normalize_phone
+
+
+SNAPSHOT_FORMAT = "1"
+CARD_FIELDS = ("blood_group", "allergies", "chronic_conditions", "emergency_contacts")
+
+SCHEMA = (
+    "CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    "CREATE TABLE cards ("
+    "user_id INTEGER PRIMARY KEY, email TEXT, phone TEXT, blood_group TEXT, allergies TEXT, "
+    "chronic_conditions TEXT, emergency_contacts TEXT, updated_at TEXT)",
+)
+# Created after the bulk load; building them once is much cheaper than maintaining them per row.
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS ix_cards_email ON cards (email)",
+    "CREATE INDEX IF NOT EXISTS ix_cards_phone ON cards (phone)",
+)
+UPSERT = (
+    "INSERT OR REPLACE INTO cards (user_id, email, phone, blood_group, allergies, chronic_conditions, "
+    "emergency_contacts, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+# SQLite stores at most a signed 64-bit integer; longer digit strings can only be phone numbers.
+MAX_ID_DIGITS = 18
+
+
+def _card_row(row) -> tuple:
+    return (
+        row.user_id,
+        normalize_email(row.email),
+        normalize_phone(row.phone),
+        *(getattr(row, f) for f in CARD_FIELDS),
+        row.updated_at.isoformat() if row.updated_at else None,
+    )
+
+
+def _open_for_write(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    # The file is private until it is swapped in, so a crash only loses the temporary copy.
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    return conn
+
+
+def open_snapshot(path: str) -> sqlite3.Connection:
+    """Read-only connection; the snapshot is replaced, never modified, while readers have it open."""
+    if not os.path.isfile(path):
+        raise SystemExit(f"[snapshot] no snapshot at {path}")
+    conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA query_only = ON")
+    conn.execute("PRAGMA mmap_size = 268435456")
+    return conn
+
+
+def _stream_cards(conn: sqlite3.Connection, query, batch_size: int) -> tuple[int, datetime | None]:
+    """Upsert patients from ``query`` in batches; other roles are removed. Returns (rows, newest updated_at)."""
+    written = 0
+    watermark = None
+    upserts: list[tuple] = []
+    removals: list[tuple] = []
+
+    def flush() -> None:
+        conn.executemany(UPSERT, upserts)
+        conn.executemany("DELETE FROM cards WHERE user_id = ?", removals)
+        upserts.clear()
+        removals.clear()
+
+    for row in db.session.execute(query.execution_options(yield_per=batch_size)):
+        if row.updated_at is not None and (watermark is None or row.updated_at > watermark):
+            watermark = row.updated_at
+        if row.role == "patient":
+            upserts.append(_card_row(row))
+            written += 1
+        else:
+            removals.append((row.user_id,))
+        if len(upserts) + len(removals) >= batch_size:
+            flush()
+    flush()
+    return written, watermark
+
+
+def _prune(conn: sqlite3.Connection, batch_size: int) -> int:
+    """Delete cards whose patient is gone by walking both id lists in order, a batch at a time."""
+    live = (
+        db.session.query(Patient.user_id)
+        .join(User, User.id == Patient.user_id)
+        .filter(User.role == "patient")
+        .order_by(Patient.user_id.asc())
+        .yield_per(batch_size)
+    )
+    live_ids = (user_id for (user_id,) in live)
+    stale: list[tuple] = []
+    current = next(live_ids, None)
+    for (user_id,) in conn.execute("SELECT user_id FROM cards ORDER BY user_id"):
+        while current is not None and current < user_id:
+            current = next(live_ids, None)
+        if current != user_id:
+            stale.append((user_id,))
+    conn.executemany("DELETE FROM cards WHERE user_id = ?", stale)
+    return len(stale)
+
+
+def _write_meta(conn: sqlite3.Connection, watermark: datetime | None) -> None:
+    values = {
+        "format": SNAPSHOT_FORMAT,
+        "built_at": datetime.utcnow().isoformat(),
+        "watermark": watermark.isoformat() if watermark else "",
+        "patients": str(conn.execute("SELECT COUNT(*) FROM cards").fetchone()[0]),
+    }
+    conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", values.items())
+
+
+def _swap_in(tmp_path: str, path: str) -> None:
+    os.replace(tmp_path, path)
+    print(f"[snapshot] wrote {path} ({os.path.getsize(path) // 1024} KiB)")
+
+
+def build(path: str, batch_size: int) -> int:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.unlink(tmp_path)
+    conn = _open_for_write(tmp_path)
+    try:
+        for ddl in SCHEMA:
+            conn.execute(ddl)
+        written, watermark = _stream_cards(conn, card_query(), batch_size)
+        for ddl in INDEXES:
+            conn.execute(ddl)
+        _write_meta(conn, watermark)
+        conn.execute("ANALYZE")
+        conn.commit()
+    except BaseException:
+        conn.close()
+        os.unlink(tmp_path)
+        raise
+    conn.close()
+    print(f"[snapshot] {written} patients")
+    _swap_in(tmp_path, path)
+    return 0
+
+
+def delta(path: str, batch_size: int, overlap: float) -> int:
+    with closing(open_snapshot(path)) as current:
+        meta = dict(current.execute("SELECT key, value FROM meta").fetchall())
+    if meta.get("format") != SNAPSHOT_FORMAT or not meta.get("watermark"):
+        print(f"[snapshot] {path} has no usable watermark; run build instead")
+        return 1
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    shutil.copyfile(path, tmp_path)
+    conn = _open_for_write(tmp_path)
+    try:
+        # Rows committed a little after their updated_at was stamped are picked up by the overlap.
+        since = datetime.fromisoformat(meta["watermark"]) - timedelta(seconds=overlap)
+        written, watermark = _stream_cards(conn, card_query().where(Patient.updated_at >= since), batch_size)
+        pruned = _prune(conn, batch_size)
+        previous = datetime.fromisoformat(meta["watermark"])
+        _write_meta(conn, max(watermark, previous) if watermark else previous)
+        conn.commit()
+    except BaseException:
+        conn.close()
+        os.unlink(tmp_path)
+        raise
+    conn.close()
+    print(f"[snapshot] {written} patients changed since {since.isoformat()}, {pruned} removed")
+    _swap_in(tmp_path, path)
+    return 0
+
+
+def find(conn: sqlite3.Connection, query: str) -> dict | None:
+    """Same keys as the live lookup: an email, a patient id, or a phone number that only one patient has."""
+    query = (query or "").strip()
+    rows: list = []
+    if "@" in query:
+        rows = conn.execute("SELECT * FROM cards WHERE email = ? LIMIT 2", (normalize_email(query),)).fetchall()
+    else:
+        if query.isdigit() and len(query) <= MAX_ID_DIGITS:
+            rows = conn.execute("SELECT * FROM cards WHERE user_id = ?", (int(query),)).fetchall()
+        phone = normalize_phone(query)
+        if not rows and phone:
+            rows = conn.execute("SELECT * FROM cards WHERE phone = ? LIMIT 2", (phone,)).fetchall()
+    if len(rows) != 1:
+        return None
+    card = rows[0]
+    return {"user_id": card["user_id"], **{f: card[f] for f in CARD_FIELDS}}
+
+
+def _render_page(query: str, card: dict | None, built_at: str) -> str:
+    rows = ""
+    if card is not None:
+        rows = "".join(
+            f"<tr><th>{html.escape(f.replace('_', ' ').capitalize())}</th><td>{html.escape(card[f] or 'Not set')}</td></tr>"
+            for f in CARD_FIELDS
+        )
+        rows = f"<h2>Emergency profile for patient #{card['user_id']}</h2><table>{rows}</table>"
+    elif query:
+        rows = "<p>No patient matches that id, email or phone.</p>"
+    return (
+        "<!doctype html><meta charset=utf-8><title>Emergency lookup (offline)</title>"
+        f"<h1>Emergency lookup</h1><p>Offline snapshot built {html.escape(built_at)} UTC.</p>"
+        f"<form><input name=q value=\"{html.escape(query)}\" placeholder=\"Patient ID, email or phone\" autofocus>"
+        f"<button>Lookup</button></form>{rows}"
+    )
+
+
+def _is_loopback(host: str) -> bool:
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None)}
+    except socket.gaierror:
+        return False
+    return bool(addresses) and all(ipaddress.ip_address(a.split("%")[0]).is_loopback for a in addresses)
+
+
+def _presented_token(authorization: str | None) -> str:
+    scheme, _, value = (authorization or "").partition(" ")
+    if scheme.lower() == "bearer":
+        return value.strip()
+    if scheme.lower() == "basic":
+        try:
+            return b64decode(value.strip(), validate=True).decode("utf-8").partition(":")[2]
+        except (ValueError, UnicodeDecodeError):
+            return ""
+    return ""
+
+
+def make_server(path: str, host: str, port: int, token: str | None = None) -> ThreadingHTTPServer:
+    """HTTP server for ``serve``; refuses to listen beyond loopback without a token."""
+    if not token and not _is_loopback(host):
+        raise SystemExit(
+            f"[snapshot] refusing to serve cards on {host} without a token; "
+            "set EMERGENCY_SNAPSHOT_TOKEN or bind to 127.0.0.1"
+        )
+    audit_path = f"{path}.lookups.jsonl"
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if token and not hmac.compare_digest(
+                _presented_token(self.headers.get("Authorization")).encode("utf-8"), token.encode("utf-8")
+            ):
+                self.send_response(401)
+                self.send_header("WWW-Authenticate", 'Basic realm="Emergency lookup"')
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            url = urlparse(self.path)
+            if url.path not in ("/", "/lookup"):
+                self.send_error(404)
+                return
+            query = (parse_qs(url.query).get("q") or [""])[0]
+            # Reopened per request so a delta swapped in underneath is picked up straight away.
+            with closing(open_snapshot(path)) as conn:
+                card = find(conn, query) if query else None
+                built_at = (conn.execute("SELECT value FROM meta WHERE key = 'built_at'").fetchone() or [""])[0]
+            if query:
+                with open(audit_path, "a", encoding="utf-8") as fh:
+                    fh.write(json.dumps({"at": datetime.utcnow().isoformat(), "client": self.client_address[0], "patient_id": card and card["user_id"]}) + "\n")
+
+            if url.path == "/lookup":
+                body, content_type = json.dumps({"card": card, "built_at": built_at}), "application/json"
+            else:
+                body, content_type = _render_page(query, card, built_at), "text/html; charset=utf-8"
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format: str, *args) -> None:
+            # The default access log would print search terms (emails, phone numbers) to the console.
+            pass
+
+    open_snapshot(path).close()
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def serve(path: str, host: str, port: int, token: str | None = None) -> int:
+    server = make_server(path, host, port, token)
+    print(
+        f"[snapshot] serving {path} on http://{host}:{port}/ "
+        f"({'token required' if token else 'loopback only'}; lookups logged to {path}.lookups.jsonl)"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--env", default=os.getenv("FLASK_ENV", "development"))
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="write a new snapshot of every patient")
+    p_delta = sub.add_parser("delta", help="apply changes since the snapshot was built or last updated")
+    for p in (p_build, p_delta):
+        p.add_argument("snapshot")
+        p.add_argument("--batch-size", type=int, default=5000)
+    p_delta.add_argument("--overlap", type=float, default=5.0, help="seconds re-read before the watermark")
+
+    p_lookup = sub.add_parser("lookup", help="print one patient's card from the snapshot")
+    p_lookup.add_argument("snapshot")
+    p_lookup.add_argument("query")
+
+    p_serve = sub.add_parser("serve", help="serve lookups from the snapshot over local HTTP")
+    p_serve.add_argument("snapshot")
+    p_serve.add_argument("--host", default="127.0.0.1")
+    p_serve.add_argument("--port", type=int, default=8099)
+
+    args = parser.parse_args()
+
+    if args.command == "lookup":
+        with closing(open_snapshot(args.snapshot)) as conn:
+            card = find(conn, args.query)
+        print(json.dumps(card, indent=2) if card else "[snapshot] no match")
+        return 0 if card else 1
+    if args.command == "serve":
+        return serve(args.snapshot, args.host, args.port, os.getenv("EMERGENCY_SNAPSHOT_TOKEN") or None)
+
+    app = create_app(args.env)
+    with app.app_context():
+        if args.command == "build":
+            return build(args.snapshot, args.batch_size)
+        return delta(args.snapshot, args.batch_size, args.overlap)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""Run EXPLAIN for the hot route queries and flag full scans and filesorts.
+
+Works against whatever database the app is configured for, so run it once with the
+SQLite dev database and once with ``DATABASE_URL`` pointing at MySQL:
+
+    python scripts/explain_queries.py
+    DATABASE_URL=mysql+pymysql://... FLASK_ENV=production python scripts/explain_queries.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import sys
+from datetime import datetime
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from sqlalchemy import Integer, func, inspect, text
+
+from app import create_app
+from app.extensions import db
+from app.models import Appointment, AuditEvent, AuditLog, Consent, Doctor, DoctorFeedback, MedicalRecord, Prescription, PrescriptionStatusCount, User
+from app.utils.pagination import _seek_condition
+
+
+def _first(column, default: int = 1):
+    value = db.session.query(column).order_by(column.asc()).limit(1).scalar()
+    return value if value is not None else default
+
+
+def _keyset(query, columns: tuple, seek: list | None, descending: bool = True):
+    if seek is not None:
+        query = query.filter(_seek_condition(columns, seek, descending))
+    order = [c.desc() if descending else c.asc() for c in columns]
+    return query.order_by(*order).limit(26)
+
+
+def route_queries() -> list[tuple[str, object]]:
+    """(label, query) pairs mirroring what the views run; each keyset list also gets its page-two variant."""
+    patient_id = _first(Appointment.patient_id)
+    doctor_id = _first(Appointment.doctor_id)
+    org_id = _first(Consent.organization_id)
+    pharmacy_id = db.session.query(Prescription.pharmacy_id).filter(Prescription.pharmacy_id.isnot(None)).limit(1).scalar() or 2
+    now = datetime.utcnow()
+
+    appt_cols = (Appointment.scheduled_at, Appointment.id)
+    record_cols = (MedicalRecord.uploaded_at, MedicalRecord.id)
+
+    queries = [
+        ("patient.dashboard appointments", Appointment.query.filter_by(patient_id=patient_id).order_by(Appointment.scheduled_at.desc()).limit(5)),
+        ("patient.dashboard records", MedicalRecord.query.filter_by(patient_id=patient_id).order_by(MedicalRecord.uploaded_at.desc()).limit(5)),
+        ("patient.dashboard consents", Consent.query.filter_by(patient_id=patient_id, revoked_at=None)),
+        ("patient.activity", AuditEvent.query.filter_by(patient_id=patient_id).order_by(AuditEvent.timestamp.desc()).limit(100)),
+        ("patient.doctor_detail feedback", DoctorFeedback.query.filter_by(doctor_id=doctor_id).order_by(DoctorFeedback.created_at.desc())),
+        (
+            "patient.history linked records",
+            MedicalRecord.query.filter(MedicalRecord.patient_id == patient_id, MedicalRecord.appointment_id.in_([1, 2, 3])).order_by(
+                MedicalRecord.uploaded_at.desc()
+            ),
+        ),
+        ("doctor.dashboard upcoming", Appointment.query.filter_by(doctor_id=doctor_id).order_by(Appointment.scheduled_at.asc()).limit(10)),
+        ("doctor.patients consents", db.session.query(Consent.patient_id).filter_by(organization_id=org_id, revoked_at=None)),
+        (
+            "doctor.patient_detail appointments",
+            Appointment.query.filter_by(doctor_id=doctor_id, patient_id=patient_id).order_by(Appointment.scheduled_at.desc()),
+        ),
+        ("admin.audit_logs", AuditLog.query.order_by(AuditLog.timestamp.desc()).limit(200)),
+        (
+            "pharmacy.queue counts",
+            db.session.query(PrescriptionStatusCount.status, func.sum(PrescriptionStatusCount.count))
+            .filter(PrescriptionStatusCount.pharmacy_id == pharmacy_id)
+            .group_by(PrescriptionStatusCount.status),
+        ),
+    ]
+
+    keyset_lists = [
+        ("patient.records", MedicalRecord.query.filter_by(patient_id=patient_id), record_cols, True, [now, 1 << 30]),
+        ("patient.appointments", Appointment.query.filter_by(patient_id=patient_id), appt_cols, True, [now, 1 << 30]),
+        (
+            "patient.history unlinked records",
+            MedicalRecord.query.filter_by(patient_id=patient_id, appointment_id=None),
+            record_cols,
+            True,
+            [now, 1 << 30],
+        ),
+        ("doctor.appointments", Appointment.query.filter_by(doctor_id=doctor_id), appt_cols, True, [now, 1 << 30]),
+        ("doctor.patient_detail records", MedicalRecord.query.filter_by(patient_id=patient_id), record_cols, True, [now, 1 << 30]),
+        (
+            "pharmacy.queue pending",
+            Prescription.query.filter_by(pharmacy_id=pharmacy_id, fulfillment_status="pending"),
+            (Prescription.issued_at, Prescription.id),
+            False,
+            [datetime(1970, 1, 1), 0],
+        ),
+        (
+            "pharmacy.queue done",
+            Prescription.query.filter_by(pharmacy_id=pharmacy_id, fulfillment_status="fulfilled"),
+            (Prescription.issued_at, Prescription.id),
+            True,
+            [now, 1 << 30],
+        ),
+        ("patient.doctors", Doctor.query.join(Doctor.user), (Doctor.specialization, Doctor.user_id), False, ["", 0]),
+        ("admin.users", User.query, (User.created_at, User.id), True, [now, 1 << 30]),
+        ("admin.doctors", Doctor.query, (Doctor.user_id,), False, [0]),
+    ]
+    for label, query, columns, descending, seek in keyset_lists:
+        queries.append((label, _keyset(query, columns, None, descending)))
+        queries.append((f"{label} (page 2)", _keyset(query, columns, seek, descending)))
+
+    return queries
+
+
+def _compile(query) -> str:
+    return str(query.statement.compile(dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}))
+
+
+def _order_columns(query) -> list[tuple[str, str]]:
+    """(table, column) for each ORDER BY term; empty when there is none or a term is an expression."""
+    columns = []
+    for clause in query.statement._order_by_clauses:
+        column = getattr(clause, "element", clause)
+        if getattr(column, "table", None) is None:
+            return []
+        columns.append((column.table.name, column.name))
+    return columns
+
+
+def _in_order(table: str, index_columns: list[str | None], order: list[tuple[str, str]]) -> bool:
+    """Whether walking ``index_columns`` of ``table`` already yields rows in ``order``."""
+    return bool(order) and all(t == table for t, _c in order) and [c for _t, c in order] == index_columns[: len(order)]
+
+
+def _sqlite_rowid(table: str) -> list[str]:
+    # An INTEGER PRIMARY KEY is the rowid: the table's own order, and the tail of every index on it.
+    pk = list(db.metadata.tables[table].primary_key.columns) if table in db.metadata.tables else []
+    return [pk[0].name] if len(pk) == 1 and pk[0].type._type_affinity is Integer else []
+
+
+def explain_sqlite(sql: str, order: list[tuple[str, str]]) -> tuple[list[str], list[str]]:
+    rows = db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+    plan = [row[-1] for row in rows]
+    sorts = [detail for detail in plan if "TEMP B-TREE" in detail]
+    # A scan that walks the ORDER BY index (or rowid) under a LIMIT with no sort stops after one
+    # page; any other scan reads the whole table or index.
+    streamed = [] if sorts or " LIMIT " not in sql else order
+    scans = []
+    for detail in plan:
+        if not detail.startswith("SCAN "):
+            continue
+        match = re.fullmatch(r"SCAN (\w+)(?: USING (?:COVERING )?INDEX (\w+))?", detail)
+        if match:
+            table, index = match.groups()
+            columns = [row[2] for row in db.session.execute(text(f'PRAGMA index_info("{index}")'))] if index else []
+            if _in_order(table, columns + _sqlite_rowid(table), streamed):
+                continue
+        scans.append(detail)
+    return plan, scans + sorts
+
+
+def explain_mysql(sql: str, order: list[tuple[str, str]]) -> tuple[list[str], list[str]]:
+    result = db.session.execute(text(f"EXPLAIN {sql}"))
+    keys = list(result.keys())
+    streamed = order if " LIMIT " in sql else []
+    inspector = inspect(db.engine)
+    plan, problems = [], []
+    for row in result:
+        info = dict(zip(keys, row))
+        extra = info.get("Extra") or ""
+        line = f"{info.get('table')}: type={info.get('type')} key={info.get('key')} rows={info.get('rows')} extra={extra}"
+        plan.append(line)
+        if info.get("type") == "ALL" or "filesort" in extra or "temporary" in extra:
+            problems.append(line)
+        elif info.get("type") == "index":
+            # A full index scan is only cheap when it walks the ORDER BY index and the LIMIT stops it.
+            table, key = info.get("table"), info.get("key")
+            # InnoDB secondary indexes end with the primary key.
+            columns = inspector.get_pk_constraint(table)["constrained_columns"]
+            if key != "PRIMARY":
+                columns = next((ix["column_names"] for ix in inspector.get_indexes(table) if ix["name"] == key), []) + columns
+            if not _in_order(table, columns, streamed):
+                problems.append(line)
+    return plan, problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--env", default=os.getenv("FLASK_ENV", "development"))
+    parser.add_argument("--verbose", "-v", action="store_true", help="print the SQL and the full plan for every query")
+    args = parser.parse_args()
+
+    app = create_app(args.env)
+    with app.app_context():
+        dialect = db.engine.dialect.name
+        if dialect == "sqlite":
+            explain = explain_sqlite
+        elif dialect == "mysql":
+            explain = explain_mysql
+        else:
+            print(f"[explain] unsupported dialect: {dialect}")
+            return 2
+
+        failures = 0
+        for label, query in route_queries():
+            sql = _compile(query)
+            plan, problems = explain(sql, _order_columns(query))
+            status = "FAIL" if problems else "ok"
+            failures += bool(problems)
+            print(f"[{status:4}] {label}")
+            if args.verbose:
+                print("       " + " ".join(sql.split()))
+            for line in plan if args.verbose else problems:
+                print(f"       {line}")
+
+        print(f"[explain] {dialect}: {failures} quer{'y' if failures == 1 else 'ies'} with full scans or filesorts")
+        return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""Garbage-collect record blobs that no medical record references any more.
+
+1. Reconcile every blob's ref_count with the records that actually point at it; rows removed
+   by database-level cascades never went through the ORM delete hook.
+2. Delete unreferenced blob rows older than the grace period, then their files and previews.
+3. Sweep files in the upload folder that look like blobs or previews but have no row, and
+   abandoned partial uploads, once they are older than the grace period.
+
+The grace period protects uploads that have placed their file but not committed yet.
+
+    python scripts/gc_record_blobs.py [--grace-minutes 60] [--batch-size 500] [--dry-run]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from sqlalchemy import func, select
+
+from app import create_app
+from app.extensions import db
+from app.models import MedicalRecord, RecordBlob
+from app.utils.previews import EXCERPT_SUFFIX, PREVIEW_SUFFIX, preview_paths
+from app.utils.storage import storage, upload_root
+
+
+BLOB_NAME_RE = re.compile(r"^[0-9a-f]{64}(\.[a-z0-9]{1,10})?$")
+PREVIEW_NAME_RE = re.compile(rf"^([0-9a-f]{{64}})({re.escape(PREVIEW_SUFFIX)}|{re.escape(EXCERPT_SUFFIX)})$")
+
+
+def _older_than(path: str, cutoff: float) -> bool:
+    try:
+        return os.stat(path).st_mtime < cutoff
+    except FileNotFoundError:
+        return False
+
+
+def reconcile_ref_counts(dry_run: bool) -> int:
+    actual = (
+        select(func.count(MedicalRecord.id))
+        .where(MedicalRecord.sha256 == RecordBlob.sha256)
+        .correlate(RecordBlob)
+        .scalar_subquery()
+    )
+    drifted = RecordBlob.query.filter(RecordBlob.ref_count != actual).count()
+    if drifted and not dry_run:
+        RecordBlob.query.filter(RecordBlob.ref_count != actual).update({RecordBlob.ref_count: actual}, synchronize_session=False)
+        db.session.commit()
+    return drifted
+
+
+def collect_blobs(grace: timedelta, batch_size: int, dry_run: bool) -> int:
+    cutoff = datetime.utcnow() - grace
+    file_cutoff = time.time() - grace.total_seconds()
+    removed = 0
+    last_sha = ""
+
+    while True:
+        batch = (
+            RecordBlob.query.filter(RecordBlob.ref_count <= 0, RecordBlob.created_at < cutoff, RecordBlob.sha256 > last_sha)
+            .order_by(RecordBlob.sha256.asc())
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            return removed
+        last_sha = batch[-1].sha256
+
+        paths = {b.sha256: b.path for b in batch}
+        if dry_run:
+            for sha256, path in paths.items():
+                print(f"[gc] would remove blob {sha256[:12]} {path}")
+            removed += len(paths)
+            continue
+
+        # Re-check the count in the DELETE itself so a reference taken since the SELECT wins.
+        deleted = (
+            RecordBlob.query.filter(RecordBlob.sha256.in_(list(paths)), RecordBlob.ref_count <= 0)
+            .delete(synchronize_session=False)
+        )
+        db.session.commit()
+        removed += deleted
+
+        still_present = {sha for (sha,) in db.session.query(RecordBlob.sha256).filter(RecordBlob.sha256.in_(list(paths)))}
+        for sha256, path in paths.items():
+            abs_path = storage.resolve(path)
+            if sha256 not in still_present and _older_than(abs_path, file_cutoff):
+                os.unlink(abs_path)
+                for preview in preview_paths(path):
+                    storage.remove(preview)
+
+
+def sweep_orphan_files(grace: timedelta, dry_run: bool) -> int:
+    root = upload_root()
+    if not os.path.isdir(root):
+        return 0
+    cutoff = time.time() - grace.total_seconds()
+    known = {path for (path,) in db.session.query(RecordBlob.path)}
+    known_bases = {os.path.splitext(path)[0] for path in known}
+    swept = 0
+
+    candidates = []
+    for file_path, abs_path in storage.walk():
+        name = os.path.basename(file_path)
+        preview = PREVIEW_NAME_RE.match(name)
+        if preview:
+            orphaned = file_path[: -len(preview.group(2))] not in known_bases
+        else:
+            orphaned = BLOB_NAME_RE.match(name) is not None and file_path not in known
+        if orphaned:
+            candidates.append(abs_path)
+
+    incoming = os.path.join(root, ".incoming")
+    if os.path.isdir(incoming):
+        candidates.extend(entry.path for entry in os.scandir(incoming) if entry.is_file())
+
+    for path in candidates:
+        if not _older_than(path, cutoff):
+            continue
+        swept += 1
+        if dry_run:
+            print(f"[gc] would remove orphan file {path}")
+        else:
+            os.unlink(path)
+    return swept
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--env", default=os.getenv("FLASK_ENV", "development"))
+    parser.add_argument("--grace-minutes", type=int, default=60)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="report what would be removed without changing anything")
+    args = parser.parse_args()
+
+    grace = timedelta(minutes=args.grace_minutes)
+    app = create_app(args.env)
+    with app.app_context():
+        drifted = reconcile_ref_counts(args.dry_run)
+        removed = collect_blobs(grace, args.batch_size, args.dry_run)
+        swept = sweep_orphan_files(grace, args.dry_run)
+        print(f"[gc] {drifted} ref counts reconciled, {removed} blobs removed, {swept} orphan files swept")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
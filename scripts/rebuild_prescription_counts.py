@@ -0,0 +1,64 @@
+"""Rebuild the per-pharmacy prescription status counters from the prescriptions table.
+
+The counters are kept in step by the lifecycle engine, but rows removed by database-level
+cascades, or a pharmacy user deleted out from under its prescriptions, never went through it.
+The rebuild replaces every counter in one transaction and reports which ones had drifted.
+
+    python scripts/rebuild_prescription_counts.py [--dry-run]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from sqlalchemy import delete, func, insert, select
+
+from app import create_app
+from app.extensions import db
+from app.models import Prescription, PrescriptionStatusCount
+from app.utils.prescription_lifecycle import UNASSIGNED
+
+
+def actual_counts():
+    pharmacy_key = func.coalesce(Prescription.pharmacy_id, UNASSIGNED)
+    return select(pharmacy_key, Prescription.fulfillment_status, func.count(Prescription.id)).group_by(
+        pharmacy_key, Prescription.fulfillment_status
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--env", default=os.getenv("FLASK_ENV", "development"))
+    parser.add_argument("--dry-run", action="store_true", help="report drifted counters without changing anything")
+    args = parser.parse_args()
+
+    app = create_app(args.env)
+    with app.app_context():
+        stored = {(c.pharmacy_id, c.status): c.count for c in PrescriptionStatusCount.query}
+        actual = {(pharmacy_id, status): count for pharmacy_id, status, count in db.session.execute(actual_counts())}
+
+        drifted = 0
+        for key in sorted(stored.keys() | actual.keys()):
+            if stored.get(key, 0) != actual.get(key, 0):
+                drifted += 1
+                print(f"[counts] pharmacy {key[0]} {key[1]}: {stored.get(key, 0)} -> {actual.get(key, 0)}")
+
+        if drifted and not args.dry_run:
+            table = PrescriptionStatusCount.__table__
+            db.session.execute(delete(table))
+            db.session.execute(
+                insert(table).from_select(["pharmacy_id", "status", "count"], actual_counts())
+            )
+            db.session.commit()
+        print(f"[counts] {drifted} counters {'would be ' if args.dry_run else ''}rebuilt")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
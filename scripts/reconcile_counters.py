@@ -0,0 +1,128 @@
+"""Recount every admin overview summary row from the underlying tables.
+
+The app keeps user and doctor counts current as rows are written, but rows removed by
+database-level cascades or bulk statements never went through those hooks. This recount
+replaces all summary rows in one transaction and reports which ones had drifted. It scans
+each table once, so run it off-peak.
+
+Audit rows are written too often to count as they go. ``--audit`` only folds the rows written
+since the last run into the per-day counts, walking the primary key from a watermark; it is
+cheap, and the admin overview shows audit counts as of its last run, so schedule it every
+minute or so:
+
+    python scripts/reconcile_counters.py [--dry-run]
+    python scripts/reconcile_counters.py --audit
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from collections import Counter
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from datetime import datetime
+
+from sqlalchemy import delete, func, insert, select
+
+from app import create_app
+from app.extensions import db
+from app.models import AuditLog, Doctor, SummaryCount, User
+from app.utils.counters import (
+    AUDIT_GAP_PREFIX,
+    AUDIT_LOGS,
+    AUDIT_WATERMARK,
+    DOCTORS,
+    USERS,
+    audit_day_key,
+    missing_audit_ids,
+    org_key,
+    reconcile_audit_logs,
+    record_audit_gaps,
+    role_key,
+    signup_day_key,
+)
+
+
+def actual_counts() -> Counter:
+    counts: Counter = Counter()
+    for role, n in db.session.execute(select(User.role, func.count(User.id)).group_by(User.role)):
+        counts[role_key(role)] += n
+        counts[USERS] += n
+    signup_day = func.date(User.created_at)
+    for day, n in db.session.execute(select(signup_day, func.count(User.id)).group_by(signup_day)):
+        counts[signup_day_key(day)] += n
+
+    for org_id, n in db.session.execute(select(Doctor.organization_id, func.count(Doctor.user_id)).group_by(Doctor.organization_id)):
+        counts[org_key(org_id)] += n
+        counts[DOCTORS] += n
+
+    counted_through = db.session.execute(select(func.max(AuditLog.id))).scalar() or 0
+    audit_day = func.date(AuditLog.timestamp)
+    for day, n in db.session.execute(
+        select(audit_day, func.count(AuditLog.id)).where(AuditLog.id <= counted_through).group_by(audit_day)
+    ):
+        counts[audit_day_key(day)] += n
+        counts[AUDIT_LOGS] += n
+    counts[AUDIT_WATERMARK] = counted_through
+    return counts
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--env", default=os.getenv("FLASK_ENV", "development"))
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--dry-run", action="store_true", help="report drifted rows without changing anything")
+    mode.add_argument("--audit", action="store_true", help="only fold new audit rows into the counts")
+    args = parser.parse_args()
+
+    app = create_app(args.env)
+    with app.app_context():
+        if args.audit:
+            counted = reconcile_audit_logs(db.session, float(app.config.get("COUNTERS_GAP_SECONDS", 3600)))
+            db.session.commit()
+            print(f"[counters] {counted} audit rows counted")
+            return 0
+
+        table = SummaryCount.__table__
+        stored_gaps = db.session.execute(
+            select(table.c.key, table.c.count, table.c.updated_at).where(table.c.key.like(f"{AUDIT_GAP_PREFIX}%"))
+        ).all()
+        stored = {row.key: row.count for row in SummaryCount.query if not row.key.startswith(AUDIT_GAP_PREFIX)}
+        actual = actual_counts()
+
+        # Audit rows past the stored watermark, or in its gaps, are simply not folded in yet; that is not drift.
+        expected = Counter(stored)
+        audit_day = func.date(AuditLog.timestamp)
+        not_folded = [(AuditLog.id > stored.get(AUDIT_WATERMARK, 0), AuditLog.id <= actual[AUDIT_WATERMARK])]
+        not_folded += [(AuditLog.id.between(int(key[len(AUDIT_GAP_PREFIX):]), end),) for key, end, _noticed in stored_gaps]
+        for where in not_folded:
+            for day, n in db.session.execute(select(audit_day, func.count(AuditLog.id)).where(*where).group_by(audit_day)):
+                expected[audit_day_key(day)] += n
+                expected[AUDIT_LOGS] += n
+
+        drifted = 0
+        for key in sorted(expected.keys() | actual.keys()):
+            if key != AUDIT_WATERMARK and expected.get(key, 0) != actual.get(key, 0):
+                drifted += 1
+                print(f"[counters] {key}: {expected.get(key, 0)} -> {actual.get(key, 0)}")
+
+        if not args.dry_run:
+            db.session.execute(delete(table))
+            db.session.execute(insert(table), [{"key": k, "count": v} for k, v in actual.items() if v or k == AUDIT_WATERMARK])
+            # Ids still invisible may yet commit; keep waiting for them as the app would have.
+            for key, end, noticed in stored_gaps:
+                record_audit_gaps(db.session, missing_audit_ids(db.session, int(key[len(AUDIT_GAP_PREFIX):]), end), noticed)
+            first_new = stored.get(AUDIT_WATERMARK, 0) + 1
+            record_audit_gaps(db.session, missing_audit_ids(db.session, first_new, actual[AUDIT_WATERMARK]), datetime.utcnow())
+            db.session.commit()
+        print(f"[counters] {drifted} rows drifted{'' if args.dry_run else '; all rows recounted'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""Move record blobs from the flat ``uploads/`` layout into ``uploads/ab/cd/`` shards while the app runs.
+
+Each batch hard-links every blob to its sharded path, points the blob row and all of its
+records at the new path in one transaction, and only then removes the old names. A reader
+that fetched a record just before the commit still finds the file under the old name for
+``--pause`` seconds. Re-running the script picks up where it stopped.
+
+Records that are not in the blob store yet are left alone; run
+scripts/backfill_record_blobs.py first (it writes sharded paths directly).
+
+    python scripts/reshard_uploads.py [--batch-size 500] [--pause 2] [--dry-run]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app import create_app
+from app.extensions import db
+from app.models import MedicalRecord, RecordBlob
+from app.utils.previews import preview_paths
+from app.utils.storage import UPLOADS_PREFIX, storage
+
+
+def reshard_batch(blobs: list[RecordBlob], dry_run: bool) -> tuple[int, int, list[str]]:
+    moved = missing = 0
+    old_paths: list[str] = []
+
+    for blob in blobs:
+        new_path = storage.blob_path(blob.sha256, blob.path)
+        if dry_run:
+            print(f"[reshard] {blob.path} -> {new_path}")
+            moved += 1
+            continue
+
+        if storage.exists(blob.path):
+            storage.link(storage.resolve(blob.path), new_path)
+            old_paths.append(blob.path)
+            # Previews are derived from the blob, so they move with it rather than being rebuilt.
+            for old_preview, new_preview in zip(preview_paths(blob.path), preview_paths(new_path)):
+                if storage.exists(old_preview):
+                    storage.link(storage.resolve(old_preview), new_preview)
+                    old_paths.append(old_preview)
+        elif not storage.exists(new_path):
+            print(f"[reshard] blob {blob.sha256[:12]}: missing file {blob.path}")
+            missing += 1
+            continue
+
+        MedicalRecord.query.filter(MedicalRecord.sha256 == blob.sha256).update(
+            {MedicalRecord.file_path: new_path}, synchronize_session=False
+        )
+        blob.path = new_path
+        moved += 1
+
+    return moved, missing, old_paths
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--env", default=os.getenv("FLASK_ENV", "development"))
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=2.0, help="seconds between a batch's commit and removing its old files")
+    parser.add_argument("--dry-run", action="store_true", help="report what would move without changing anything")
+    args = parser.parse_args()
+
+    app = create_app(args.env)
+    with app.app_context():
+        unmanaged = MedicalRecord.query.filter(MedicalRecord.sha256.is_(None)).count()
+        if unmanaged:
+            print(f"[reshard] {unmanaged} records are not in the blob store yet; run scripts/backfill_record_blobs.py")
+
+        last_sha = ""
+        total_moved = total_missing = 0
+        while True:
+            batch = (
+                RecordBlob.query.filter(RecordBlob.sha256 > last_sha, ~RecordBlob.path.like(f"{UPLOADS_PREFIX}/__/__/%"))
+                .order_by(RecordBlob.sha256.asc())
+                .limit(args.batch_size)
+                .all()
+            )
+            if not batch:
+                break
+            last_sha = batch[-1].sha256
+
+            moved, missing, old_paths = reshard_batch([b for b in batch if not storage.is_sharded(b.path)], args.dry_run)
+            total_moved += moved
+            total_missing += missing
+
+            if args.dry_run:
+                db.session.rollback()
+                continue
+
+            db.session.commit()
+            if old_paths:
+                time.sleep(args.pause)
+                for path in old_paths:
+                    storage.remove(path)
+            print(f"[reshard] committed through {last_sha[:12]}: {moved} moved, {missing} missing")
+
+        print(f"[reshard] done: {total_moved} blobs moved, {total_missing} missing files")
+        return 1 if total_missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
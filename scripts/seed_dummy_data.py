@@ -11,6 +11,8 @@ if PROJECT_ROOT not in sys.path:
 from app import create_app
 from app.extensions import db
 from app.models import Appointment, AuditEvent, Consent, Doctor, MedicalRecord, Organization, Patient, Prescription, User
+from app.utils.doctor_search import rebuild_index
+from app.utils.prescription_lifecycle import issue as issue_prescription, reassign as reassign_prescription
 
 
 def get_or_create_user(email: str, role: str, password: str) -> User:
@@ -109,12 +111,11 @@ def ensure_prescription(appointment_id: int, pharmacy_user_id: int, notes: str)
     p = Prescription.query.filter_by(appointment_id=appointment_id).first()
     if p is None:
         p = Prescription(appointment_id=appointment_id)
-        db.session.add(p)
+        issue_prescription(p, pharmacy_user_id)
+    elif p.fulfillment_status == "pending":
+        reassign_prescription(p, pharmacy_user_id)
 
     p.notes = notes
-    p.pharmacy_id = str(pharmacy_user_id)
-    p.fulfillment_status = "pending"
-    p.delivery_status = "not_started"
     db.session.commit()
     return p
 
@@ -259,6 +260,9 @@ def main() -> None:
                 with open(abs_path, "w", encoding="utf-8") as f:
                     f.write(content)
 
+        print("[seed] Rebuilding doctor search index...")
+        rebuild_index()
+
         print("[seed] Done.")
         print("[seed] Accounts:")
         print("  admin@example.com / adminpass")
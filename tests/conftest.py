@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+for path in (PROJECT_ROOT, os.path.join(PROJECT_ROOT, "scripts")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# Config classes read the environment at import time, so this has to come before any app import.
+_TMP = tempfile.mkdtemp(prefix="healthcare-tests-")
+os.environ["FLASK_ENV"] = "testing"
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP, 'test.sqlite3')}"
+os.environ["UPLOAD_FOLDER"] = os.path.join(_TMP, "uploads")
+
+from app import create_app  # noqa: E402
+from app.utils.emergency_cards import emergency_cards  # noqa: E402
+
+PASSWORDS = {
+    "patient": ("patient1@example.com", "patientpass"),
+    "doctor": ("doctor1@example.com", "doctorpass"),
+    "admin": ("admin@example.com", "adminpass"),
+    "pharmacy": ("pharmacy@example.com", "pharmacypass"),
+    "emergency": ("emergency@example.com", "emergencypass"),
+}
+
+
+@pytest.fixture(scope="session")
+def app():
+    import seed_dummy_data
+
+    seed_dummy_data.main()
+    app = create_app("testing")
+    yield app
+    # Before the database goes away, or a refresh in flight would log a failure at exit.
+    emergency_cards.shutdown()
+    shutil.rmtree(_TMP, ignore_errors=True)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login(app):
+    def login(role: str):
+        client = app.test_client()
+        email, password = PASSWORDS[role]
+        response = client.post("/login", data={"email": email, "password": password})
+        assert response.status_code == 302, f"login as {role} failed"
+        return client
+
+    return login
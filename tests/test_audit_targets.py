@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from sqlalchemy import select
+
+from app.extensions import db
+from app.models import AuditLog, Doctor, Prescription, User
+
+
+def _logged_ids(app, action: str, after: int) -> list[int]:
+    with app.app_context():
+        return sorted(db.session.scalars(select(AuditLog.entity_id).where(AuditLog.action == action, AuditLog.id > after)))
+
+
+def _last_log_id(app) -> int:
+    with app.app_context():
+        return db.session.scalar(select(AuditLog.id).order_by(AuditLog.id.desc()).limit(1)) or 0
+
+
+def test_bulk_doctor_update_logs_each_doctor(app, login):
+    with app.app_context():
+        doctor_ids = sorted(db.session.scalars(select(Doctor.user_id)))[:2]
+    after = _last_log_id(app)
+    response = login("admin").post(
+        "/admin/doctors", data={"ids": [str(i) for i in doctor_ids], "hospital_id": "H-AUDIT"}
+    )
+    assert response.status_code == 302
+    assert _logged_ids(app, "admin_update_doctor", after) == doctor_ids
+
+
+def test_bulk_prescription_update_logs_each_prescription(app, login):
+    with app.app_context():
+        pharmacy_id = db.session.scalar(select(User.id).where(User.email == "pharmacy@example.com"))
+        pending = sorted(
+            db.session.scalars(
+                select(Prescription.id).where(
+                    Prescription.pharmacy_id == pharmacy_id, Prescription.fulfillment_status == "pending"
+                )
+            )
+        )[:2]
+    assert pending
+    client = login("pharmacy")
+    after = _last_log_id(app)
+    for status in ("verified", "pending"):
+        # Moved back afterwards, so other tests still find the seed's pending prescriptions.
+        response = client.post(
+            "/pharmacy/prescriptions/bulk-update", data={"ids": [str(i) for i in pending], "fulfillment_status": status}
+        )
+        assert response.status_code == 302
+        assert _logged_ids(app, "pharmacy_update_fulfillment", after) == pending
+        after = _last_log_id(app)
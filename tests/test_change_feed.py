@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import re
+
+import pytest
+
+from app.extensions import db
+from app.models import Prescription, User
+from app.utils.change_feed import ChangeFeed
+from app.utils.prescription_lifecycle import reassign, transition
+
+
+def _worker(app) -> ChangeFeed:
+    # Each worker process has its own feed object; nothing is shared between them but the database.
+    feed = ChangeFeed()
+    feed.init_app(app)
+    return feed
+
+
+@pytest.fixture
+def pharmacy_id(app):
+    with app.app_context():
+        return User.query.filter_by(email="pharmacy@example.com").one().id
+
+
+def _pending(pharmacy_id: int) -> Prescription:
+    p = Prescription.query.filter_by(pharmacy_id=pharmacy_id, fulfillment_status="pending").first()
+    assert p is not None, "the seed routes a pending prescription to the pharmacy"
+    return p
+
+
+def test_a_version_from_one_worker_resumes_on_another(app, pharmacy_id):
+    with app.test_request_context():
+        since = _worker(app).current_version()
+        p = _pending(pharmacy_id)
+        transition(p, "verified")
+        db.session.commit()
+
+        changes = _worker(app).subscribe(pharmacy_id, since).wait(timeout=0)
+        assert [c.prescription_id for c in changes] == [p.id]
+
+        transition(p, "pending")
+        db.session.commit()
+
+
+def test_reassignment_reaches_the_pharmacy_it_left(app, pharmacy_id):
+    with app.test_request_context():
+        feed = _worker(app)
+        p = _pending(pharmacy_id)
+        subscription = feed.subscribe(pharmacy_id, feed.current_version())
+        reassign(p, None)
+        db.session.commit()
+        try:
+            assert [c.prescription_id for c in subscription.wait(timeout=0)] == [p.id]
+            # Delivered once; the next poll re-reads the id but does not repeat it.
+            assert subscription.wait(timeout=0) == []
+        finally:
+            reassign(p, pharmacy_id)
+            db.session.commit()
+
+
+def test_stream_resumes_from_an_id_issued_elsewhere(app, login, pharmacy_id):
+    app.config.update(QUEUE_EVENTS_HEARTBEAT=0.05, QUEUE_EVENTS_MAX_SECONDS=0.2)
+    client = login("pharmacy")
+    html = client.get("/pharmacy/queue").get_data(as_text=True)
+    since = int(re.search(r"since=(\d+)", html).group(1))
+    with app.test_request_context():
+        p = _pending(pharmacy_id)
+        prescription_id = p.id
+        transition(p, "verified")
+        db.session.commit()
+
+    response = client.get(f"/pharmacy/queue/events?since={since}")
+    body = response.get_data(as_text=True)
+    assert "event: reset" not in body
+    assert f'"id": {prescription_id}' in body
+
+    with app.test_request_context():
+        transition(db.session.get(Prescription, prescription_id), "pending")
+        db.session.commit()
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import io
+
+import pytest
+
+from app.extensions import db
+from app.models import Consent, Doctor, User
+from app.utils.consent import invalidate_consent
+
+
+@pytest.fixture
+def add_only_patient(app):
+    """patient5, whose consent lets doctor1's organization add records but not view history."""
+    with app.app_context():
+        org_id = Doctor.query.join(Doctor.user).filter(User.email == "doctor1@example.com").one().organization_id
+        patient_id = User.query.filter_by(email="patient5@example.com").one().id
+        consent = Consent(patient_id=patient_id, organization_id=org_id, can_view_history=False, can_add_record=True)
+        db.session.add(consent)
+        db.session.commit()
+        invalidate_consent(org_id, patient_id)
+    yield patient_id
+    with app.app_context():
+        Consent.query.filter_by(patient_id=patient_id, organization_id=org_id).delete()
+        db.session.commit()
+        invalidate_consent(org_id, patient_id)
+
+
+def test_adding_a_record_also_needs_view_consent(login, add_only_patient):
+    client = login("doctor")
+    assert client.get(f"/doctor/patients/{add_only_patient}").status_code == 403
+    data = {"file": (io.BytesIO(b"note"), "note.txt")}
+    response = client.post(f"/doctor/patients/{add_only_patient}/records", data=data, content_type="multipart/form-data")
+    assert response.status_code == 403
+
+
+def test_an_oversized_upload_without_view_consent_shows_no_records(app, login, add_only_patient, monkeypatch):
+    monkeypatch.setitem(app.config, "MAX_UPLOAD_SIZE", 1024)
+    data = {"file": (io.BytesIO(b"x" * 4096), "large.txt")}
+    response = login("doctor").post(
+        f"/doctor/patients/{add_only_patient}/records", data=data, content_type="multipart/form-data"
+    )
+    assert response.status_code == 403
+    assert b"/doctor/records/" not in response.data
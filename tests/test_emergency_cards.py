@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import time
+
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+from app.extensions import db
+from app.models import AuditEvent, AuditLog, Patient, User
+from app.utils.emergency_cards import EmergencyCardIndex, EmergencyCardsUnavailable, emergency_cards
+
+
+def _wait_for(predicate, timeout: float = 3.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_lookups_never_query_the_database(app, login):
+    client = login("emergency")
+    with app.app_context():
+        patient_id = User.query.filter_by(email="patient1@example.com").one().id
+        engine = db.engine
+    client.post("/emergency/lookup", data={"query": str(patient_id)})
+    assert _wait_for(lambda: emergency_cards.lookup(str(patient_id)) is not None)
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        for query in (str(patient_id), "patient1@example.com", "no-such-patient@example.com", "999999"):
+            emergency_cards.lookup(query)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert statements == []
+
+
+def test_changes_from_other_workers_arrive_in_the_background(app):
+    with app.app_context():
+        emergency_cards.start()
+        assert _wait_for(lambda: emergency_cards._index is not None)
+        user = User(email="late-patient@example.com", role="patient")
+        user.set_password("x")
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Patient(user_id=user.id, blood_group="B-"))
+        db.session.commit()
+
+        assert emergency_cards.lookup("late-patient@example.com") is None
+        emergency_cards.sync_soon()
+        assert _wait_for(lambda: emergency_cards.lookup("late-patient@example.com") is not None)
+
+        db.session.delete(user)
+        db.session.commit()
+
+
+def test_a_lookup_is_in_the_admin_feed_and_on_the_patient_timeline(app, login):
+    client = login("emergency")
+    with app.app_context():
+        patient_id = User.query.filter_by(email="patient1@example.com").one().id
+    assert _wait_for(lambda: emergency_cards.lookup(str(patient_id)) is not None)
+    with app.app_context():
+        logs, events = AuditLog.query.count(), AuditEvent.query.count()
+    client.post("/emergency/lookup", data={"query": str(patient_id)})
+    with app.app_context():
+        log = AuditLog.query.order_by(AuditLog.id.desc()).first()
+        audit_event = AuditEvent.query.order_by(AuditEvent.id.desc()).first()
+        assert AuditLog.query.count() == logs + 1 and AuditEvent.query.count() == events + 1
+        assert (log.action, log.entity_id) == ("emergency_lookup", patient_id)
+        assert (audit_event.action, audit_event.patient_id) == ("emergency_lookup", patient_id)
+
+
+def test_a_cold_worker_without_a_database_reports_unavailable():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:////nonexistent-directory/db.sqlite3"
+    app.config["EMERGENCY_CARDS_COLD_WAIT_SECONDS"] = 0.2
+    db.init_app(app)
+    cards = EmergencyCardIndex()
+    cards.init_app(app)
+    with app.app_context(), pytest.raises(EmergencyCardsUnavailable):
+        cards.lookup("patient1@example.com")
+
+
+def test_lookup_page_answers_503_while_unavailable(login, monkeypatch):
+    client = login("emergency")
+
+    def unavailable(query):
+        raise EmergencyCardsUnavailable()
+
+    monkeypatch.setattr(emergency_cards, "lookup", unavailable)
+    response = client.post("/emergency/lookup", data={"query": "1"})
+    assert response.status_code == 503
+    assert b"unavailable" in response.data
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import emergency_snapshot
+
+
+@pytest.fixture
+def snapshot(app, tmp_path):
+    path = str(tmp_path / "emergency.sqlite3")
+    with app.app_context():
+        emergency_snapshot.build(path, batch_size=100)
+    return path
+
+
+@pytest.fixture
+def serving(snapshot):
+    servers = []
+
+    def serving(token=None):
+        server = emergency_snapshot.make_server(snapshot, "127.0.0.1", 0, token)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}/lookup?q=patient1@example.com"
+
+    yield serving
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _get(url, authorization=None):
+    request = urllib.request.Request(url, headers={"Authorization": authorization} if authorization else {})
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return response.status, json.loads(response.read())
+
+
+@pytest.mark.parametrize("host", ["0.0.0.0", "::", "192.0.2.1"])
+def test_refuses_to_listen_beyond_loopback_without_a_token(snapshot, host):
+    with pytest.raises(SystemExit, match="without a token"):
+        emergency_snapshot.make_server(snapshot, host, 0)
+
+
+def test_loopback_without_a_token_serves_cards(serving):
+    status, body = _get(serving())
+    assert status == 200
+    assert body["card"] is not None
+
+
+def test_token_is_required_on_every_request(serving):
+    url = serving(token="s3cret")
+    for authorization in (None, "Bearer wrong", "Basic OndvcnRo"):
+        with pytest.raises(urllib.error.HTTPError) as excinfo:
+            _get(url, authorization)
+        assert excinfo.value.code == 401
+    assert _get(url, "Bearer s3cret")[1]["card"] is not None
+    # Browsers send the token as the basic auth password (":s3cret").
+    assert _get(url, "Basic OnMzY3JldA==")[1]["card"] is not None
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from sqlalchemy import select, update
+
+from app.extensions import db
+from app.models import Patient, User
+
+
+def _patient_id(app) -> int:
+    with app.app_context():
+        return db.session.execute(select(User.id).where(User.email == "patient1@example.com")).scalar_one()
+
+
+def _set_blood_group_elsewhere(app, patient_id: int, value: str) -> None:
+    # Another worker's write: a separate connection, leaving this process's identity cache alone.
+    with db.engine.begin() as connection:
+        connection.execute(update(Patient).where(Patient.user_id == patient_id).values(blood_group=value))
+
+
+def _blood_group(app, patient_id: int) -> str:
+    with app.app_context():
+        return db.session.get(Patient, patient_id).blood_group
+
+
+def test_cached_identity_does_not_serve_stale_profile_rows(app, login):
+    patient_id = _patient_id(app)
+    client = login("patient")
+    with app.app_context():
+        _set_blood_group_elsewhere(app, patient_id, "O+")
+    # Warms the identity cache for this patient.
+    assert b'value="O+"' in client.get("/patient/emergency-profile").data
+
+    with app.app_context():
+        _set_blood_group_elsewhere(app, patient_id, "AB-")
+    assert b'value="AB-"' in client.get("/patient/emergency-profile").data
+
+    # Writing the value the cached graph held must still reach the database.
+    client.post(
+        "/patient/emergency-profile",
+        data={"blood_group": "O+", "allergies": "", "chronic_conditions": "", "emergency_contacts": ""},
+    )
+    assert _blood_group(app, patient_id) == "O+"
+
+
+def test_profile_update_changes_the_user_row(app, login):
+    patient_id = _patient_id(app)
+    client = login("patient")
+    client.post("/patient/profile", data={"name": "Pat Renamed", "phone": "+1 555 0199"})
+    with app.app_context():
+        user = db.session.get(User, patient_id)
+        assert (user.name, user.phone) == ("Pat Renamed", "+1 555 0199")
+    assert b"Pat Renamed" in client.get("/patient/dashboard").data
@@ -0,0 +1,90 @@
+"""Every budgeted view stays within its ``query_budget`` and renders without lazy loads.
+
+The testing config sets ``QUERY_BUDGET_ENFORCE`` and ``LAZY_LOAD_DETECTION = "raise"``, so an N+1
+regression fails the request, and with it this module.
+"""
+
+from __future__ import annotations
+
+import io
+
+import pytest
+from flask import render_template_string
+
+from app.models import Appointment, User
+from app.utils import identity
+from app.utils.loading import LazyLoadDuringRender
+
+PAGES = [
+    ("patient", "/patient/dashboard"),
+    ("patient", "/patient/records"),
+    ("patient", "/patient/appointments"),
+    ("patient", "/patient/doctors"),
+    ("patient", "/patient/doctors?q=card"),
+    ("patient", "/patient/prescriptions"),
+    ("patient", "/patient/activity"),
+    ("patient", "/patient/history"),
+    ("doctor", "/doctor/dashboard"),
+    ("doctor", "/doctor/appointments"),
+    ("doctor", "/doctor/patients"),
+    ("admin", "/admin/overview"),
+    ("admin", "/admin/users"),
+    ("admin", "/admin/doctors"),
+    ("admin", "/admin/audit-logs"),
+    ("pharmacy", "/pharmacy/queue"),
+    ("pharmacy", "/pharmacy/queue?status=in_progress"),
+    ("pharmacy", "/pharmacy/queue?status=done"),
+    ("emergency", "/emergency/lookup"),
+]
+
+
+def _assert_within_budget(response) -> None:
+    budget = response.headers.get("X-Query-Budget")
+    if budget is not None:
+        assert int(response.headers["X-Query-Count"]) <= int(budget)
+
+
+@pytest.mark.parametrize("role,url", PAGES)
+def test_page_stays_within_its_query_budget(login, role, url):
+    client = login(role)
+    for cold in (False, True):
+        if cold:
+            # The worst case: the identity has to be loaded as part of the request.
+            identity._identities.clear()
+        response = client.get(url)
+        assert response.status_code == 200
+        _assert_within_budget(response)
+
+
+def test_doctor_patient_detail_stays_within_its_query_budget(app, login):
+    client = login("doctor")
+    response = client.get("/doctor/patients")
+    assert response.status_code == 200
+    with app.app_context():
+        patient_id = User.query.filter_by(email="patient1@example.com").one().id
+    response = client.get(f"/doctor/patients/{patient_id}")
+    assert response.status_code == 200
+    assert response.headers["X-Query-Budget"]
+    _assert_within_budget(response)
+
+
+@pytest.mark.parametrize("with_appointment", [False, True])
+def test_record_upload_stays_within_its_query_budget(app, login, with_appointment):
+    client = login("patient")
+    data = {"file": (io.BytesIO(f"budget check {with_appointment}".encode()), "note.txt"), "description": "budget"}
+    if with_appointment:
+        with app.app_context():
+            patient_id = User.query.filter_by(email="patient1@example.com").one().id
+            data["appointment_id"] = str(Appointment.query.filter_by(patient_id=patient_id).first().id)
+    identity._identities.clear()
+    response = client.post("/patient/records", data=data, content_type="multipart/form-data")
+    assert response.status_code == 302
+    _assert_within_budget(response)
+
+
+def test_lazy_loads_while_rendering_raise(app):
+    assert app.config["LAZY_LOAD_DETECTION"] == "raise"
+    with app.test_request_context():
+        appointment = Appointment.query.first()
+        with pytest.raises(LazyLoadDuringRender):
+            render_template_string("{{ a.doctor.specialization }}", a=appointment)
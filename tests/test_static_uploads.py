@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import os
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def static_record(app):
+    # A record file where the default UPLOAD_FOLDER puts them, under static/.
+    directory = os.path.join(app.static_folder, "uploads")
+    os.makedirs(directory, exist_ok=True)
+    name = f"test-{uuid.uuid4().hex}.txt"
+    path = os.path.join(directory, name)
+    with open(path, "w") as fh:
+        fh.write("confidential")
+    yield name
+    os.remove(path)
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "/static/uploads/{name}",
+        "/static/./uploads/{name}",
+        "/static/x/../uploads/{name}",
+        "/static/UPLOADS/{name}",
+    ],
+)
+def test_record_files_are_not_served_as_static(client, static_record, url):
+    response = client.get(url.format(name=static_record))
+    assert response.status_code == 404
+    assert b"confidential" not in response.data
+
+
+def test_other_static_files_are_still_served(client):
+    assert client.get("/static/app.js").status_code == 200
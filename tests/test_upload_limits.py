@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import io
+import os
+
+import pytest
+
+from app.models import User
+
+
+@pytest.fixture
+def small_uploads(app, monkeypatch):
+    monkeypatch.setitem(app.config, "MAX_UPLOAD_SIZE", 1024)
+    incoming = os.path.join(app.config["UPLOAD_FOLDER"], ".incoming")
+    before = set(os.listdir(incoming)) if os.path.isdir(incoming) else set()
+    yield
+    assert set(os.listdir(incoming)) - before == set(), "spooled parts were left behind"
+
+
+def test_doctor_upload_over_the_limit_re_renders_with_an_error(app, login, small_uploads):
+    with app.app_context():
+        patient_id = User.query.filter_by(email="patient1@example.com").one().id
+    client = login("doctor")
+    # The first part fits; the second trips the limit after the first was already spooled.
+    data = {
+        "extra": (io.BytesIO(b"x" * 100), "small.txt"),
+        "file": (io.BytesIO(b"x" * 4096), "large.txt"),
+    }
+    response = client.post(f"/doctor/patients/{patient_id}/records", data=data, content_type="multipart/form-data")
+    assert response.status_code == 413
+    assert b"Files are limited to" in response.data
+    assert b"Medical records" in response.data
+
+
+def test_patient_upload_over_the_limit_leaves_no_spools(login, small_uploads):
+    client = login("patient")
+    data = {
+        "extra": (io.BytesIO(b"x" * 100), "small.txt"),
+        "file": (io.BytesIO(b"x" * 4096), "large.txt"),
+    }
+    response = client.post("/patient/records", data=data, content_type="multipart/form-data")
+    assert response.status_code == 200
+    assert b"Files are limited to" in response.data
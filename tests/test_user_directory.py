@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy.dialects import mysql
+
+from app.models import User
+from app.utils.user_directory import _starts_with
+
+
+@pytest.mark.parametrize("prefix", ["liz", "+1 555 0199", "a_b%"])
+def test_mysql_prefix_search_is_a_like_not_a_code_point_range(prefix):
+    # MySQL's default collation sorts punctuation before digits and letters, so 'liz' < 'li{' is empty there.
+    sql = str(_starts_with(User.name, prefix, "mysql").compile(dialect=mysql.dialect(), compile_kwargs={"literal_binds": True}))
+    assert " LIKE " in sql
+    assert "<" not in sql
+